@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_ops_author_tensor.py — NK-Ops cross-author comparison
+
+Purpose:
+    Align all meals on (sure, ayet) into one authors x ayets x operators tensor and
+    compare every author pair at once.
+
+How it works:
+    - (sure, ayet) keys are hash-joined (pandas Index.get_indexer) onto the sorted
+      union of keys; several segments of the same ayet are summed.
+    - Per (author, ayet) the operator vector is L2-normalised (as MSV similarity);
+      for every pair the per-ayet cosine similarity and the Jaccard agreement of
+      operator presence are computed with vectorised reductions (one broadcast per
+      author, no per-pair Python loop).
+    - Only ayets present for both authors of a pair are compared.
+      Two empty operator vectors count as identical (cos = 1, Jaccard = 1);
+      one empty vector against a non-empty one counts as cos = 0, Jaccard = 0.
+
+Inputs:
+    CSV with author, sure, ayet and operator count columns (e.g. nk_ops_tagger output)
+
+Outputs (under --outdir):
+    author_distance.csv     (1 - mean cosine over common ayets, authors x authors)
+    author_agreement.csv    (mean presence Jaccard over common ayets, authors x authors)
+    author_neighbors.csv    (k nearest authors per author)
+    ayet_disagreement.csv   (per ayet: authors present, 1 - mean pairwise cosine / Jaccard)
+    author_pair_ayet.npz    (optional, --pair_ayet: full per-pair per-ayet cosine array)
+
+Run:
+    python scripts/nk_ops_author_tensor.py --csv tags_all.csv --outdir results/cross_author
+
+Notes:
+    - Deterministic outputs (authors sorted; neighbour ties broken by author order)
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from nk_ops_corpus import detect_author_col, load_corpus, sniff_format
+from nk_ops_utils import OP_KEYS, ensure_dir
+
+AYET_KEY_BASE = 1000  # key = sure * 1000 + ayet
+
+
+@dataclass
+class AuthorTensor:
+    authors: List[str]
+    ayet_keys: np.ndarray   # (V,) int64, sorted
+    ops: List[str]
+    X: np.ndarray           # (A, V, O) float32 operator counts
+    present: np.ndarray     # (A, V) bool
+
+    @property
+    def sure(self) -> np.ndarray:
+        return self.ayet_keys // AYET_KEY_BASE
+
+    @property
+    def ayet(self) -> np.ndarray:
+        return self.ayet_keys % AYET_KEY_BASE
+
+
+def ayet_keys_of(sure: pd.Series, ayet: pd.Series) -> np.ndarray:
+    return sure.astype("int64").to_numpy() * AYET_KEY_BASE + ayet.astype("int64").to_numpy()
+
+
+def build_tensor(df: pd.DataFrame, author_col: str, ops: Sequence[str]) -> AuthorTensor:
+    df = df.dropna(subset=[author_col, "sure", "ayet"])
+    authors = sorted(str(a) for a in df[author_col].astype(str).unique() if str(a).strip())
+    keys = ayet_keys_of(df["sure"], df["ayet"])
+    ayet_index = pd.Index(np.unique(keys))
+    author_index = pd.Index(authors)
+
+    a_pos = author_index.get_indexer(df[author_col].astype(str))
+    v_pos = ayet_index.get_indexer(keys)
+    ok = a_pos >= 0
+    a_pos, v_pos = a_pos[ok], v_pos[ok]
+    vals = df.loc[ok, list(ops)].to_numpy(dtype=np.float32)
+
+    X = np.zeros((len(authors), len(ayet_index), len(ops)), dtype=np.float32)
+    np.add.at(X, (a_pos, v_pos), vals)
+    present = np.zeros((len(authors), len(ayet_index)), dtype=bool)
+    present[a_pos, v_pos] = True
+    return AuthorTensor(authors=authors, ayet_keys=ayet_index.to_numpy(), ops=list(ops), X=X, present=present)
+
+
+@dataclass
+class PairwiseResult:
+    cos: np.ndarray          # (A, A, V) float32 per-ayet cosine
+    jac: np.ndarray          # (A, A, V) float32 per-ayet presence Jaccard
+    both: np.ndarray         # (A, A, V) bool, ayet present for both authors
+    distance: np.ndarray     # (A, A)
+    agreement: np.ndarray    # (A, A)
+    common: np.ndarray       # (A, A) int, common ayets
+
+
+def pairwise(t: AuthorTensor) -> PairwiseResult:
+    A, V, _ = t.X.shape
+    norm = np.linalg.norm(t.X, axis=2, keepdims=True)
+    empty = norm[..., 0] == 0
+    U = np.divide(t.X, norm, out=np.zeros_like(t.X), where=norm > 0)
+    P = t.X > 0
+    n_ops = P.sum(axis=2)
+
+    cos = np.empty((A, A, V), dtype=np.float32)
+    jac = np.empty((A, A, V), dtype=np.float32)
+    for a in range(A):
+        c = np.einsum("vo,bvo->bv", U[a], U)
+        c[empty[a][None, :] & empty] = 1.0
+        cos[a] = c
+        inter = (P[a][None, :, :] & P).sum(axis=2)
+        union = n_ops[a][None, :] + n_ops - inter
+        jac[a] = np.divide(inter, union, out=np.ones((A, V), dtype=np.float32), where=union > 0)
+
+    both = t.present[:, None, :] & t.present[None, :, :]
+    common = both.sum(axis=2)
+    sim = np.where(both, cos, 0.0).sum(axis=2) / np.maximum(common, 1)
+    agreement = np.where(both, jac, 0.0).sum(axis=2) / np.maximum(common, 1)
+    distance = np.where(common > 0, 1.0 - sim, np.nan)
+    agreement = np.where(common > 0, agreement, np.nan)
+    return PairwiseResult(cos=cos, jac=jac, both=both, distance=distance, agreement=agreement, common=common)
+
+
+def ayet_disagreement(t: AuthorTensor, pr: PairwiseResult) -> pd.DataFrame:
+    A = len(t.authors)
+    upper = np.triu(np.ones((A, A), dtype=bool), k=1)[:, :, None]
+    pairs = pr.both & upper
+    n_pairs = pairs.sum(axis=(0, 1))
+    cos_mean = np.where(pairs, pr.cos, 0.0).sum(axis=(0, 1)) / np.maximum(n_pairs, 1)
+    jac_mean = np.where(pairs, pr.jac, 0.0).sum(axis=(0, 1)) / np.maximum(n_pairs, 1)
+    return pd.DataFrame({
+        "sure": t.sure,
+        "ayet": t.ayet,
+        "n_authors": t.present.sum(axis=0),
+        "n_pairs": n_pairs,
+        "cos_disagreement": np.where(n_pairs > 0, 1.0 - cos_mean, np.nan),
+        "jaccard_disagreement": np.where(n_pairs > 0, 1.0 - jac_mean, np.nan),
+    })
+
+
+def nearest_neighbors(authors: Sequence[str], distance: np.ndarray, k: int = 3) -> pd.DataFrame:
+    d = distance.astype(np.float64).copy()
+    np.fill_diagonal(d, np.inf)
+    d = np.where(np.isnan(d), np.inf, d)
+    # stable sort: ties keep author order
+    order = np.argsort(d, axis=1, kind="stable")[:, :k]
+    rows: List[Dict[str, object]] = []
+    for i, a in enumerate(authors):
+        for rank, j in enumerate(order[i], 1):
+            if not np.isfinite(d[i, j]):
+                break
+            rows.append({"author": a, "rank": rank, "neighbor": authors[j], "distance": float(d[i, j])})
+    return pd.DataFrame(rows, columns=["author", "rank", "neighbor", "distance"])
+
+
+def _matrix_df(authors: Sequence[str], m: np.ndarray) -> pd.DataFrame:
+    out = pd.DataFrame(m, index=list(authors), columns=list(authors))
+    out.index.name = "author"
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Align all meals on (sure, ayet) and compare every author pair.")
+    ap.add_argument("--csv", required=True, help="Multi-author CSV with sure, ayet and operator count columns")
+    ap.add_argument("--author_col", default="", help="Author column name. If empty, auto-detect.")
+    ap.add_argument("--ops", default="", help="Comma-separated operator columns (default: Phase-1 OP_KEYS present)")
+    ap.add_argument("--outdir", required=True, help="Output directory")
+    ap.add_argument("--k", type=int, default=3, help="Nearest neighbours per author")
+    ap.add_argument("--pair_ayet", action="store_true", help="Also save the per-pair per-ayet cosine array (npz)")
+    args = ap.parse_args()
+
+    csv_path = Path(args.csv)
+    outdir = ensure_dir(args.outdir)
+    fmt = sniff_format(csv_path)
+    author_col = args.author_col.strip() or detect_author_col(csv_path, fmt)
+    ops = [c.strip() for c in args.ops.split(",") if c.strip()] or [c for c in OP_KEYS if c in fmt.columns]
+    if not ops:
+        raise RuntimeError(f"No operator columns found. Available: {fmt.columns[:60]}")
+
+    df = load_corpus(csv_path, columns=["sure", "ayet"] + ops, author_col=author_col, fmt=fmt)
+    t = build_tensor(df, author_col, ops)
+    print(f"[OK] authors={len(t.authors)} ayets={len(t.ayet_keys)} ops={len(ops)} author_col='{author_col}'")
+
+    pr = pairwise(t)
+
+    out_dist = outdir / "author_distance.csv"
+    out_agree = outdir / "author_agreement.csv"
+    out_nn = outdir / "author_neighbors.csv"
+    out_ayet = outdir / "ayet_disagreement.csv"
+    _matrix_df(t.authors, pr.distance).to_csv(out_dist, float_format="%.6f")
+    _matrix_df(t.authors, pr.agreement).to_csv(out_agree, float_format="%.6f")
+    nearest_neighbors(t.authors, pr.distance, k=args.k).to_csv(out_nn, index=False, float_format="%.6f")
+    ayet_disagreement(t, pr).to_csv(out_ayet, index=False, float_format="%.6f")
+    for p in (out_dist, out_agree, out_nn, out_ayet):
+        print(f"[WROTE] {p}")
+
+    if args.pair_ayet:
+        out_npz = outdir / "author_pair_ayet.npz"
+        np.savez_compressed(out_npz, authors=np.array(t.authors), ayet_keys=t.ayet_keys,
+                            cos=pr.cos, jaccard=pr.jac, both=pr.both)
+        print(f"[WROTE] {out_npz}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_ops_divergence_index.py — NK-Ops bitmap index over ayet-level stress results
+
+Purpose:
+    Answer cross-author divergence questions ("ayets that diverge for >= 30 of 44 authors
+    at s=0.8 but for none at s=0.2", per-sure rollups, ...) from a prebuilt index instead
+    of re-scanning every by_author/<author>/ayet_results.tsv.
+
+How it works:
+    - Universe = the 6236 ayet positions (sure/ayet in canonical order, AYET_COUNTS).
+    - One bitmap per (author, stress level, response) stored as packed uint64 words
+      (98 words = 784 bytes per bitmap). With a universe this small every roaring
+      container would be a dense bitmap anyway, so set algebra is a word-wise numpy op.
+    - Threshold queries stack the bitmaps of all authors for one (stress, response)
+      and count set bits per position (authors x positions bit matrix, one sum).
+    - Responses: boolean columns (e.g. divergent) give one bitmap each; categorical
+      columns (e.g. ABC_state) give one bitmap per "column=value".
+    - The index file (.npz) records the size/mtime of every source TSV; `build` on an
+      existing index only (re)reads authors that are new or changed.
+
+Inputs:
+    by_author/<author>/ayet_results.tsv — one row per (ayet, stress level):
+      sure, ayet (or ref "s:a"), stress (or --stress for single-level files), response columns
+
+Outputs:
+    build : divergence_index.npz (bitmaps + keys + source manifest)
+    query : positions as TSV (sure, ayet, per-stress author counts) and/or per-sure rollup
+
+Run:
+    python scripts/nk_ops_divergence_index.py build --results_root by_author --index results/divergence_index.npz
+    python scripts/nk_ops_divergence_index.py query --index results/divergence_index.npz \
+        --response divergent --min 30@0.8 --max 0@0.2 --by_sure
+
+Notes:
+    - Deterministic (bit order = canonical ayet order; authors sorted)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nk_ops_utils import ensure_dir, iso_now_local, sniff_csv, strip_compression_suffix
+
+NK_OPS_DIVERGENCE_INDEX_VERSION = "0.1.0"
+
+# ayets per sure (Kufan count, 6236 total)
+AYET_COUNTS = [
+    7, 286, 200, 176, 120, 165, 206, 75, 129, 109, 123, 111, 43, 52, 99, 128, 111, 110, 98, 135,
+    112, 78, 118, 64, 77, 227, 93, 88, 69, 60, 34, 30, 73, 54, 45, 83, 182, 88, 75, 85,
+    54, 53, 89, 59, 37, 35, 38, 29, 18, 45, 60, 49, 62, 55, 78, 96, 29, 22, 24, 13,
+    14, 11, 11, 18, 12, 12, 30, 52, 52, 44, 28, 28, 20, 56, 40, 31, 50, 40, 46, 42,
+    29, 19, 36, 25, 22, 17, 19, 26, 30, 20, 15, 21, 11, 8, 8, 19, 5, 8, 8, 11,
+    11, 8, 3, 9, 5, 4, 7, 3, 6, 3, 5, 4, 5, 6,
+]
+SURE_OFFSETS = np.concatenate(([0], np.cumsum(AYET_COUNTS))).astype(np.int64)
+N_AYETS = int(SURE_OFFSETS[-1])
+N_WORDS = (N_AYETS + 63) // 64
+
+TRUE_STRINGS = {"1", "1.0", "true", "t", "yes", "y"}
+FALSE_STRINGS = {"0", "0.0", "false", "f", "no", "n", ""}
+MAX_LABELS = 16  # categorical responses with more distinct values are skipped
+# columns that are never responses
+ID_COLS = {"sure", "ayet", "ref", "ayet_key", "stress", "s", "author", "meal_slug", "text", "segment_id"}
+DEFAULT_RESULTS_NAME = "ayet_results.tsv"
+
+
+# ---------------------------
+# Bitmaps
+# ---------------------------
+
+def stress_key(s: Any) -> str:
+    return f"{float(s):g}"
+
+
+def positions_of(sure: np.ndarray, ayet: np.ndarray) -> np.ndarray:
+    """Canonical 0-based positions; -1 where (sure, ayet) is out of range."""
+    sure = np.asarray(sure, dtype=np.int64)
+    ayet = np.asarray(ayet, dtype=np.int64)
+    ok = (sure >= 1) & (sure <= len(AYET_COUNTS))
+    s_idx = np.where(ok, sure - 1, 0)
+    ok &= (ayet >= 1) & (ayet <= np.asarray(AYET_COUNTS, dtype=np.int64)[s_idx])
+    return np.where(ok, SURE_OFFSETS[s_idx] + ayet - 1, -1)
+
+
+def sure_ayet_of(pos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    pos = np.asarray(pos, dtype=np.int64)
+    s_idx = np.searchsorted(SURE_OFFSETS, pos, side="right") - 1
+    return s_idx + 1, pos - SURE_OFFSETS[s_idx] + 1
+
+
+class Bitmap:
+    """Set of ayet positions as packed uint64 words (bit i of word w = position 64*w + i)."""
+
+    __slots__ = ("words",)
+
+    def __init__(self, words: Optional[np.ndarray] = None):
+        self.words = np.zeros(N_WORDS, dtype=np.uint64) if words is None else words
+
+    @classmethod
+    def from_positions(cls, pos: Iterable[int]) -> "Bitmap":
+        bits = np.zeros(N_WORDS * 64, dtype=bool)
+        bits[np.asarray(list(pos) if not isinstance(pos, np.ndarray) else pos, dtype=np.int64)] = True
+        return cls.from_bools(bits)
+
+    @classmethod
+    def from_bools(cls, bits: np.ndarray) -> "Bitmap":
+        padded = np.zeros(N_WORDS * 64, dtype=bool)
+        padded[:len(bits)] = bits
+        return cls(np.packbits(padded, bitorder="little").view(np.uint64).copy())
+
+    @classmethod
+    def full(cls) -> "Bitmap":
+        return cls.from_bools(np.ones(N_AYETS, dtype=bool))
+
+    def bools(self) -> np.ndarray:
+        return np.unpackbits(self.words.view(np.uint8), bitorder="little")[:N_AYETS].astype(bool)
+
+    def positions(self) -> np.ndarray:
+        return np.flatnonzero(self.bools())
+
+    def __len__(self) -> int:
+        # unpackbits rather than np.bitwise_count (numpy >= 2.0 only)
+        return int(np.unpackbits(self.words.view(np.uint8)).sum(dtype=np.int64))
+
+    def __and__(self, o: "Bitmap") -> "Bitmap":
+        return Bitmap(self.words & o.words)
+
+    def __or__(self, o: "Bitmap") -> "Bitmap":
+        return Bitmap(self.words | o.words)
+
+    def __xor__(self, o: "Bitmap") -> "Bitmap":
+        return Bitmap(self.words ^ o.words)
+
+    def __sub__(self, o: "Bitmap") -> "Bitmap":
+        return Bitmap(self.words & ~o.words)
+
+    def __invert__(self) -> "Bitmap":
+        return Bitmap(~self.words & _FULL.words)
+
+    def __eq__(self, o: object) -> bool:
+        return isinstance(o, Bitmap) and bool(np.array_equal(self.words, o.words))
+
+    def __repr__(self) -> str:
+        return f"Bitmap(n={len(self)})"
+
+    def by_sure(self) -> np.ndarray:
+        """(114,) set positions per sure."""
+        return np.add.reduceat(self.bools().astype(np.int64), SURE_OFFSETS[:-1])
+
+
+_FULL = Bitmap.from_bools(np.ones(N_AYETS, dtype=bool))
+
+
+# ---------------------------
+# Index
+# ---------------------------
+
+class DivergenceIndex:
+    """(author, stress, response) -> Bitmap, plus the source manifest for incremental builds."""
+
+    def __init__(self):
+        self.keys: List[Tuple[str, str, str]] = []
+        self.words = np.zeros((0, N_WORDS), dtype=np.uint64)
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self._pos: Dict[Tuple[str, str, str], int] = {}
+        self._groups: Optional[Dict[Tuple[str, str], List[int]]] = None
+
+    # -- construction --
+
+    def put(self, author: str, stress: Any, response: str, bm: Bitmap) -> None:
+        key = (author, stress_key(stress), response)
+        i = self._pos.get(key)
+        if i is None:
+            self._groups = None
+            self._pos[key] = len(self.keys)
+            self.keys.append(key)
+            if len(self.keys) > len(self.words):
+                # grow by doubling (amortised appends)
+                grown = np.zeros((max(64, 2 * len(self.words)), N_WORDS), dtype=np.uint64)
+                grown[:len(self.words)] = self.words
+                self.words = grown
+            i = len(self.keys) - 1
+        self.words[i] = bm.words
+
+    def drop_author(self, author: str) -> None:
+        keep = [i for i, k in enumerate(self.keys) if k[0] != author]
+        self.keys = [self.keys[i] for i in keep]
+        self.words = self.words[keep]
+        self._pos = {k: i for i, k in enumerate(self.keys)}
+        self._groups = None
+        self.sources.pop(author, None)
+
+    def add_frame(self, author: str, df: pd.DataFrame, responses: Optional[Sequence[str]] = None,
+                  stress: Optional[float] = None) -> int:
+        """Add one author's results (long format); returns the number of bitmaps written."""
+        cols = {c.lower(): c for c in df.columns}
+        if "sure" in cols and "ayet" in cols:
+            sure = pd.to_numeric(df[cols["sure"]], errors="coerce").fillna(0).to_numpy()
+            ayet = pd.to_numeric(df[cols["ayet"]], errors="coerce").fillna(0).to_numpy()
+        else:
+            ref_col = cols.get("ref") or cols.get("ayet_key")
+            if not ref_col:
+                raise RuntimeError(f"{author}: needs sure+ayet or a ref ('s:a') column. Available: {list(df.columns)[:40]}")
+            parts = df[ref_col].astype(str).str.split(":", n=1, expand=True)
+            sure = pd.to_numeric(parts[0], errors="coerce").fillna(0).to_numpy()
+            ayet = pd.to_numeric(parts[1], errors="coerce").fillna(0).to_numpy()
+        pos = positions_of(sure, ayet)
+        bad = int((pos < 0).sum())
+        if bad:
+            print(f"[WARN] {author}: {bad} rows outside the canonical ayet range skipped")
+
+        stress_col = cols.get("stress") or cols.get("s")
+        if stress_col is not None:
+            codes, uniq = pd.factorize(df[stress_col])
+            levels = np.asarray([stress_key(u) for u in uniq], dtype=object)[codes]
+        elif stress is not None:
+            levels = np.full(len(df), stress_key(stress), dtype=object)
+        else:
+            raise RuntimeError(f"{author}: no stress column (pass --stress for single-level files)")
+
+        resp_cols = list(responses) if responses else [c for c in df.columns if c.lower() not in ID_COLS]
+        masks: List[Tuple[str, np.ndarray]] = []
+        for c in resp_cols:
+            if c not in df.columns:
+                raise RuntimeError(f"{author}: response column '{c}' not found")
+            masks.extend(_response_masks(c, df[c].to_numpy()))
+        written = 0
+        for lvl in sorted(set(levels.tolist()), key=float):
+            sel = (levels == lvl) & (pos >= 0)
+            for name, mask in masks:
+                self.put(author, lvl, name, Bitmap.from_positions(pos[sel & mask]))
+                written += 1
+        return written
+
+    # -- lookup --
+
+    @property
+    def authors(self) -> List[str]:
+        return sorted({k[0] for k in self.keys})
+
+    @property
+    def stresses(self) -> List[str]:
+        return sorted({k[1] for k in self.keys}, key=float)
+
+    @property
+    def responses(self) -> List[str]:
+        return sorted({k[2] for k in self.keys})
+
+    def get(self, author: str, stress: Any, response: str) -> Bitmap:
+        i = self._pos.get((author, stress_key(stress), response))
+        return Bitmap() if i is None else Bitmap(self.words[i].copy())
+
+    def author_counts(self, stress: Any, response: str, authors: Optional[Sequence[str]] = None) -> np.ndarray:
+        """(N_AYETS,) number of authors whose bitmap has each position."""
+        if self._groups is None:
+            self._groups = {}
+            for i, k in enumerate(self.keys):
+                self._groups.setdefault((k[1], k[2]), []).append(i)
+        rows = self._groups.get((stress_key(stress), response), [])
+        if authors:
+            sel = set(authors)
+            rows = [i for i in rows if self.keys[i][0] in sel]
+        if not rows:
+            return np.zeros(N_AYETS, dtype=np.int64)
+        bits = np.unpackbits(self.words[rows].view(np.uint8), axis=1, bitorder="little")[:, :N_AYETS]
+        return bits.sum(axis=0, dtype=np.int64)
+
+    def at_least(self, k: int, stress: Any, response: str, authors: Optional[Sequence[str]] = None) -> Bitmap:
+        return Bitmap.from_bools(self.author_counts(stress, response, authors) >= k)
+
+    def at_most(self, k: int, stress: Any, response: str, authors: Optional[Sequence[str]] = None) -> Bitmap:
+        return Bitmap.from_bools(self.author_counts(stress, response, authors) <= k)
+
+    def any_author(self, stress: Any, response: str, authors: Optional[Sequence[str]] = None) -> Bitmap:
+        return self.at_least(1, stress, response, authors)
+
+    # -- persistence --
+
+    def save(self, path: str | Path) -> Path:
+        p = Path(path)
+        ensure_dir(p.parent)
+        meta = {
+            "version": NK_OPS_DIVERGENCE_INDEX_VERSION,
+            "generated_at": iso_now_local(),
+            "n_ayets": N_AYETS,
+            "keys": [list(k) for k in self.keys],
+            "sources": self.sources,
+        }
+        with p.open("wb") as f:
+            np.savez_compressed(f, words=self.words[:len(self.keys)], meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        return p
+
+    @classmethod
+    def load(cls, path: str | Path) -> "DivergenceIndex":
+        with np.load(Path(path), allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            words = z["words"]
+        if meta.get("n_ayets") != N_AYETS:
+            raise RuntimeError(f"{path}: index universe {meta.get('n_ayets')} != {N_AYETS}")
+        idx = cls()
+        idx.keys = [tuple(k) for k in meta["keys"]]
+        idx.words = words.astype(np.uint64).reshape(len(idx.keys), N_WORDS)
+        idx.sources = meta.get("sources", {})
+        idx._pos = {k: i for i, k in enumerate(idx.keys)}
+        return idx
+
+
+def _response_masks(col: str, values: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+    """Boolean-like column -> [(col, mask)]; categorical -> [("col=value", mask), ...]."""
+    codes, uniques = pd.factorize(values, sort=False)
+    if len(uniques) > 4 * MAX_LABELS:
+        return []
+    labels = [str(u).strip() for u in uniques]
+    low = {lb.lower() for lb in labels}
+    if low <= TRUE_STRINGS | FALSE_STRINGS:
+        true_codes = [i for i, lb in enumerate(labels) if lb.lower() in TRUE_STRINGS]
+        return [(col, np.isin(codes, true_codes))]
+    by_label: Dict[str, List[int]] = {}
+    for i, lb in enumerate(labels):
+        if lb:
+            by_label.setdefault(lb, []).append(i)
+    if len(by_label) > MAX_LABELS:
+        # scores / free text are not responses
+        return []
+    return [(f"{col}={lb}", np.isin(codes, by_label[lb])) for lb in sorted(by_label)]
+
+
+def read_results(path: Path) -> pd.DataFrame:
+    if strip_compression_suffix(path).suffix.lower() == ".tsv":
+        enc, sep = "utf-8", "\t"
+    else:
+        enc, sep = sniff_csv(path)
+    return pd.read_csv(path, sep=sep, encoding=enc, keep_default_na=False)
+
+
+def source_stamp(path: Path) -> Dict[str, Any]:
+    st = path.stat()
+    return {"path": str(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def discover(results_root: Path, name: str = DEFAULT_RESULTS_NAME) -> Dict[str, Path]:
+    """by_author/<author>/<name> -> {author: path}."""
+    return {p.parent.name: p for p in sorted(results_root.glob(f"*/{name}"))}
+
+
+def build(
+    index: DivergenceIndex,
+    sources: Dict[str, Path],
+    responses: Optional[Sequence[str]] = None,
+    stress: Optional[float] = None,
+    rebuild: bool = False,
+) -> Tuple[List[str], List[str]]:
+    """Add new/changed authors; returns (updated, unchanged)."""
+    updated: List[str] = []
+    unchanged: List[str] = []
+    for author, path in sorted(sources.items()):
+        stamp = source_stamp(path)
+        if not rebuild and index.sources.get(author) == stamp:
+            unchanged.append(author)
+            continue
+        index.drop_author(author)
+        index.add_frame(author, read_results(path), responses=responses, stress=stress)
+        index.sources[author] = stamp
+        updated.append(author)
+    return updated, unchanged
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+
+_COND_RX = re.compile(r"^\s*(\d+)\s*@\s*([0-9.]+)\s*$")
+
+
+def parse_cond(spec: str) -> Tuple[int, str]:
+    m = _COND_RX.match(spec)
+    if not m:
+        raise RuntimeError(f"bad condition {spec!r} (expected K@STRESS, e.g. 30@0.8)")
+    return int(m.group(1)), stress_key(m.group(2))
+
+
+def run_query(index: DivergenceIndex, response: str, mins: Sequence[str], maxs: Sequence[str],
+              authors: Optional[Sequence[str]] = None) -> Bitmap:
+    if response not in index.responses:
+        raise RuntimeError(f"response {response!r} not in index. Available: {index.responses}")
+    # an unknown stress / author selects no bitmaps: counts would be all 0 and "0@S" would match everything
+    unknown = sorted(set(authors or ()) - set(index.authors))
+    if unknown:
+        raise RuntimeError(f"authors not in index: {unknown}. Available: {index.authors}")
+    conds = []
+    for spec, at in [(x, index.at_least) for x in mins] + [(x, index.at_most) for x in maxs]:
+        k, s = parse_cond(spec)
+        if s not in index.stresses:
+            raise RuntimeError(f"stress {s} (in {spec!r}) not in index. Available: {index.stresses}")
+        conds.append((at, k, s))
+    out = Bitmap.full()
+    for at, k, s in conds:
+        out = out & at(k, s, response, authors)
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Bitmap index over ayet-level divergence (author x stress x response).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    # flags every subcommand takes after its name, like the repo's other CLIs
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--debug", action="store_true")
+
+    b = sub.add_parser("build", parents=[common], help="Build or incrementally update the index")
+    b.add_argument("--index", required=True, help="Index file (.npz); updated in place if it exists")
+    b.add_argument("--results_root", default=None, help="Directory with <author>/ayet_results.tsv")
+    b.add_argument("--results_name", default=DEFAULT_RESULTS_NAME, help="Per-author results file name")
+    b.add_argument("--tsv", action="append", default=[], help="Extra source author=path (repeatable)")
+    b.add_argument("--responses", default="", help="Comma-separated response columns (default: all non-id columns)")
+    b.add_argument("--stress", type=float, default=None, help="Stress level for files without a stress column")
+    b.add_argument("--rebuild", action="store_true", help="Re-read all sources")
+
+    q = sub.add_parser("query", parents=[common], help="Threshold / set queries")
+    q.add_argument("--index", required=True)
+    q.add_argument("--response", default="divergent", help="Response bitmap name (see `query --list`)")
+    q.add_argument("--min", action="append", default=[], help="K@STRESS: at least K authors (repeatable)")
+    q.add_argument("--max", action="append", default=[], help="K@STRESS: at most K authors; 0@S = none (repeatable)")
+    q.add_argument("--authors", default="", help="Comma-separated author subset (default: all)")
+    q.add_argument("--by_sure", action="store_true", help="Print per-sure counts of the result")
+    q.add_argument("--out", default=None, help="Write result positions (sure, ayet, author counts per stress) as TSV")
+    q.add_argument("--list", action="store_true", help="List authors, stress levels and responses")
+    args = ap.parse_args()
+
+    try:
+        if args.cmd == "build":
+            index_path = Path(args.index)
+            index = DivergenceIndex.load(index_path) if index_path.exists() else DivergenceIndex()
+            sources: Dict[str, Path] = {}
+            if args.results_root:
+                sources.update(discover(Path(args.results_root), args.results_name))
+            for spec in args.tsv:
+                author, _, path = spec.partition("=")
+                if not path:
+                    raise RuntimeError(f"--tsv expects author=path, got {spec!r}")
+                sources[author.strip()] = Path(path.strip())
+            if not sources:
+                raise RuntimeError("no sources (use --results_root and/or --tsv)")
+            responses = [c.strip() for c in args.responses.split(",") if c.strip()] or None
+            t0 = time.perf_counter()
+            updated, unchanged = build(index, sources, responses, args.stress, args.rebuild)
+            index.save(index_path)
+            print(f"[OK] authors updated={len(updated)} unchanged={len(unchanged)} "
+                  f"bitmaps={len(index.keys)} ({time.perf_counter() - t0:.2f}s)")
+            print(f"[WROTE] {index_path}")
+            return 0
+
+        index = DivergenceIndex.load(args.index)
+        if args.list:
+            print(json.dumps({"authors": index.authors, "stress_levels": index.stresses,
+                              "responses": index.responses}, ensure_ascii=False, indent=2))
+            return 0
+        authors = [a.strip() for a in args.authors.split(",") if a.strip()] or None
+        t0 = time.perf_counter()
+        res = run_query(index, args.response, args.min, args.max, authors)
+        dt = time.perf_counter() - t0
+        print(f"[OK] response={args.response} authors={len(authors or index.authors)} "
+              f"ayets={len(res)} / {N_AYETS} ({dt * 1e3:.2f} ms)")
+        if args.by_sure:
+            per = res.by_sure()
+            for s in np.flatnonzero(per):
+                print(f"  sure {s + 1:3d}: {per[s]:4d} / {AYET_COUNTS[s]}")
+        if args.out:
+            pos = res.positions()
+            sure, ayet = sure_ayet_of(pos)
+            table = {"sure": sure, "ayet": ayet}
+            for s in index.stresses:
+                table[f"n_authors_s{s}"] = index.author_counts(s, args.response, authors)[pos]
+            out = Path(args.out)
+            ensure_dir(out.parent)
+            pd.DataFrame(table).to_csv(out, sep="\t", index=False)
+            print(f"[WROTE] {out}")
+        return 0
+
+    except Exception as ex:
+        print(f"[ERR] {ex}")
+        if args.debug:
+            raise
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
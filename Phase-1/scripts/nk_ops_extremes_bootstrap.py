@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_ops_extremes_bootstrap.py — NK-Ops Phase-1 rank stability of the extremes tables
+
+Purpose:
+    extreme_meals.json / extremes_table.md rank authors on point values only. This script
+    resamples ayets within each author (bootstrap, fixed seed) and reports, per author and
+    metric, a confidence interval and the probability of being in the top / bottom K.
+
+How it works:
+    - Per-row data (one row per segment: author, sure, ayet, tau, operator counts) is summed
+      per (author, ayet): S (units x metrics) and the row count per unit.
+      Metrics use the pick_extremes names: share_<tau> and avg_<op>.
+    - One replicate of an author = n_a ayets drawn with replacement. Draws are turned into
+      multiplicity weights W (replicates x n_a) with one bincount, so all metric values of
+      a replicate block are W @ S / W @ rows (one matrix product, no per-replicate summary).
+    - Ranks are taken across authors within each replicate (ties: author order).
+    - Random streams are seeded per author from (seed, author position in sorted order), so
+      results do not depend on processing order or block size.
+
+Inputs:
+    CSV with author, sure, ayet and operator count columns (e.g. nk_ops_tau / nk_ops_tagger
+    output over all meals). Without a `tau` column, tau is assigned with nk_ops_tau defaults.
+
+Outputs (under --outdir):
+    extremes_bootstrap.csv   (metric, author, value, ci_lo, ci_hi, rank, rank_lo, rank_hi, p_top, p_bottom)
+    extremes_bootstrap.json  (parameters + per-metric stable top/bottom authors)
+
+Run:
+    python scripts/nk_ops_extremes_bootstrap.py --csv tau_all.csv --outdir results --n_boot 2000 --topk 5
+
+Notes:
+    - Deterministic for a given --seed (no wall-clock or order dependence)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from nk_ops_corpus import detect_author_col, load_corpus, sniff_format
+from nk_ops_table_io import write_table
+from nk_ops_utils import OP_KEYS, TAU_ORDER, ensure_dir, iso_now_local, write_json
+
+NK_OPS_EXTREMES_BOOTSTRAP_VERSION = "0.1.0"
+
+AYET_KEY_BASE = 1000  # key = sure * 1000 + ayet
+
+# replicates per W @ S block; bounds memory at block * n_ayets floats per author
+_BLOCK = 256
+
+
+@dataclass
+class AyetUnits:
+    authors: List[str]
+    metrics: List[str]
+    S: List[np.ndarray]       # per author: (n_a, M) metric numerators per ayet
+    rows: List[np.ndarray]    # per author: (n_a,) segment rows per ayet
+
+
+@dataclass
+class BootstrapResult:
+    authors: List[str]
+    metrics: List[str]
+    point: np.ndarray         # (A, M) full-sample values
+    boot: np.ndarray          # (B, A, M) replicate values
+    seed: int
+
+    def ranks(self, descending: bool = True) -> np.ndarray:
+        """(B, A, M) 1-based rank of each author per replicate and metric (ties: author order)."""
+        x = -self.boot if descending else self.boot
+        x = np.where(np.isnan(x), np.inf, x)
+        order = np.argsort(x, axis=1, kind="stable")
+        r = np.empty_like(order)
+        np.put_along_axis(r, order, np.arange(1, x.shape[1] + 1)[None, :, None], axis=1)
+        return r
+
+
+def build_units(df: pd.DataFrame, author_col: str, ops: Sequence[str], tau_col: str = "tau") -> AyetUnits:
+    df = df.dropna(subset=[author_col, "sure", "ayet"])
+    tau_present = [t for t in TAU_ORDER if (df[tau_col] == t).any()]
+    metrics = [f"share_{t}" for t in tau_present] + [f"avg_{op}" for op in ops]
+
+    tau_ind = np.stack([(df[tau_col] == t).to_numpy() for t in tau_present], axis=1) if tau_present \
+        else np.zeros((len(df), 0), dtype=bool)
+    V = np.concatenate([tau_ind.astype(np.float64), df[list(ops)].to_numpy(dtype=np.float64)], axis=1)
+
+    author = df[author_col].astype(str).to_numpy()
+    keys = df["sure"].astype("int64").to_numpy() * AYET_KEY_BASE + df["ayet"].astype("int64").to_numpy()
+    authors = sorted(a for a in pd.unique(author) if a.strip())
+
+    S: List[np.ndarray] = []
+    R: List[np.ndarray] = []
+    for a in authors:
+        sel = author == a
+        uk, inv = np.unique(keys[sel], return_inverse=True)
+        s = np.zeros((len(uk), V.shape[1]), dtype=np.float64)
+        np.add.at(s, inv, V[sel])
+        S.append(s)
+        R.append(np.bincount(inv, minlength=len(uk)).astype(np.float64))
+    return AyetUnits(authors=authors, metrics=metrics, S=S, rows=R)
+
+
+def bootstrap(units: AyetUnits, n_boot: int = 2000, seed: int = 12345) -> BootstrapResult:
+    A, M = len(units.authors), len(units.metrics)
+    point = np.full((A, M), np.nan)
+    boot = np.full((n_boot, A, M), np.nan)
+    for ai, (s, rows) in enumerate(zip(units.S, units.rows)):
+        n = len(rows)
+        if n == 0 or rows.sum() == 0:
+            continue
+        point[ai] = s.sum(axis=0) / rows.sum()
+        rng = np.random.default_rng([seed, ai])
+        for b0 in range(0, n_boot, _BLOCK):
+            nb = min(_BLOCK, n_boot - b0)
+            idx = rng.integers(0, n, size=(nb, n))
+            flat = (idx + np.arange(nb)[:, None] * n).ravel()
+            W = np.bincount(flat, minlength=nb * n).reshape(nb, n).astype(np.float64)
+            boot[b0:b0 + nb, ai] = (W @ s) / (W @ rows)[:, None]
+    return BootstrapResult(authors=units.authors, metrics=units.metrics, point=point, boot=boot, seed=seed)
+
+
+def _point_rank(point: np.ndarray) -> np.ndarray:
+    x = np.where(np.isnan(point), np.inf, -point)
+    order = np.argsort(x, axis=0, kind="stable")
+    r = np.empty_like(order)
+    np.put_along_axis(r, order, np.arange(1, point.shape[0] + 1)[:, None], axis=0)
+    return r
+
+
+def stability_table(res: BootstrapResult, topk: int = 5, ci: float = 0.95) -> pd.DataFrame:
+    """Long table: one row per (metric, author)."""
+    lo_q, hi_q = (1.0 - ci) / 2.0, 1.0 - (1.0 - ci) / 2.0
+    A, M = len(res.authors), len(res.metrics)
+    val_lo, val_hi = np.nanquantile(res.boot, [lo_q, hi_q], axis=0)
+    r_desc = res.ranks(descending=True)
+    rank_lo, rank_hi = np.quantile(r_desc, [lo_q, hi_q], axis=0, method="inverted_cdf")
+    p_top = (r_desc <= topk).mean(axis=0)
+    p_bottom = (res.ranks(descending=False) <= topk).mean(axis=0)
+
+    return pd.DataFrame({
+        "metric": np.repeat(res.metrics, A),
+        "author": np.tile(res.authors, M),
+        "value": res.point.T.ravel(),
+        "ci_lo": val_lo.T.ravel(),
+        "ci_hi": val_hi.T.ravel(),
+        "rank": _point_rank(res.point).T.ravel(),
+        "rank_lo": rank_lo.T.ravel().astype(np.int64),
+        "rank_hi": rank_hi.T.ravel().astype(np.int64),
+        "p_top": p_top.T.ravel(),
+        "p_bottom": p_bottom.T.ravel(),
+    })
+
+
+def stable_extremes(table: pd.DataFrame, topk: int, min_p: float = 0.9) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    """Per metric: authors with P(top K) / P(bottom K) >= min_p, most stable first."""
+    out: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for metric, g in table.groupby("metric", sort=False):
+        bucket: Dict[str, List[Dict[str, Any]]] = {}
+        for side, pcol in (("stable_top", "p_top"), ("stable_bottom", "p_bottom")):
+            sel = g[g[pcol] >= min_p].sort_values([pcol, "author"], ascending=[False, True], kind="stable")
+            bucket[side] = [{"author": r.author, pcol: float(getattr(r, pcol))} for r in sel.itertuples()]
+        out[str(metric)] = bucket
+    return out
+
+
+def load_units(csv_path: str | Path, author_col: str = "", ops: Optional[Sequence[str]] = None,
+               rules_path: Optional[str] = None) -> AyetUnits:
+    fmt = sniff_format(csv_path)
+    author_col = author_col or detect_author_col(csv_path, fmt)
+    ops = list(ops or [c for c in OP_KEYS if c in fmt.columns])
+    if not ops:
+        raise RuntimeError(f"No operator columns found. Available: {fmt.columns[:60]}")
+    has_tau = "tau" in fmt.columns
+    cols = ["sure", "ayet"] + ops + (["tau"] if has_tau else [])
+    df = load_corpus(csv_path, columns=cols, author_col=author_col, fmt=fmt)
+    if not has_tau:
+        from nk_ops_tau import classify, load_rules
+
+        df["tau"] = classify(df[ops].to_numpy(), ops, load_rules(rules_path)).tau
+    return build_units(df, author_col, ops)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Bootstrap rank stability (ayets resampled within author) for the extremes tables.")
+    ap.add_argument("--csv", required=True, help="Per-segment CSV with author, sure, ayet, operator counts [, tau]")
+    ap.add_argument("--outdir", required=True, help="Output directory")
+    ap.add_argument("--author_col", default="", help="Author column name. If empty, auto-detect.")
+    ap.add_argument("--rules", default=None, help="Tau rules JSON (only used when the CSV has no tau column)")
+    ap.add_argument("--n_boot", type=int, default=2000, help="Bootstrap replicates")
+    ap.add_argument("--seed", type=int, default=12345, help="Random seed (fixed for determinism)")
+    ap.add_argument("--topk", type=int, default=5, help="K for P(top K) / P(bottom K)")
+    ap.add_argument("--ci", type=float, default=0.95, help="Confidence level of the percentile intervals")
+    ap.add_argument("--min_p", type=float, default=0.9, help="Probability for the 'stable' lists in the JSON")
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args()
+
+    try:
+        outdir = ensure_dir(args.outdir)
+        units = load_units(args.csv, args.author_col.strip(), rules_path=args.rules)
+        print(f"[OK] authors={len(units.authors)} metrics={len(units.metrics)} "
+              f"ayets={sum(len(r) for r in units.rows)} n_boot={args.n_boot} seed={args.seed}")
+
+        res = bootstrap(units, n_boot=args.n_boot, seed=args.seed)
+        table = stability_table(res, topk=args.topk, ci=args.ci)
+
+        out_csv = outdir / "extremes_bootstrap.csv"
+        write_table(out_csv, [(c, table[c].to_numpy()) for c in table.columns])
+        out_json = outdir / "extremes_bootstrap.json"
+        write_json(out_json, {
+            "generated_at": iso_now_local(),
+            "source_file": str(args.csv),
+            "n_boot": args.n_boot,
+            "seed": args.seed,
+            "topk": args.topk,
+            "ci": args.ci,
+            "min_p": args.min_p,
+            "resample_unit": "ayet (sure, ayet) within author",
+            "authors": units.authors,
+            "metrics": units.metrics,
+            "stable_extremes": stable_extremes(table, args.topk, args.min_p),
+            "nk_ops_extremes_bootstrap_version": NK_OPS_EXTREMES_BOOTSTRAP_VERSION,
+        })
+        print(f"[WROTE] {out_csv}")
+        print(f"[WROTE] {out_json}")
+        return 0
+
+    except Exception as ex:
+        print(f"[ERR] {ex}")
+        if args.debug:
+            raise
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
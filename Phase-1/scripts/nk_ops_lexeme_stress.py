@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_ops_lexeme_stress.py — NK-Ops lexeme-level AB vs ABC stress experiment (full vocabulary)
+
+Purpose:
+    Evaluate AB and ABC marble responses (ASSERT / SOFT / SILENCE) for every distinct
+    lexeme of a corpus over a configurable stress grid, and estimate the stresses at
+    which each lexeme moves ASSERT -> SOFT -> SILENCE.
+
+Model (deterministic; parameters in the stress-grid config):
+    - Lexeme features (packed float32 arrays, one row per lexeme):
+        A = anchoring field: sum of A-feature weights of the lexeme's operators (capped at 1)
+        C = orientation field: sum of C-feature weights (capped at 1)
+        B = structural stability: log1p(freq) / log1p(max freq)
+    - Capacity (both representations, same tokens): wA*A + wB*B
+    - Stress load: AB = base, ABC = max(0.05, base * (1 - C_damping*C))
+      (the C-field is the only difference: it lets ABC absorb stress; at s = 0 AB == ABC)
+    - Margin m(s) = capacity - s * load
+        ASSERT  if m >= thresholds.assert
+        SOFT    if thresholds.soft <= m < thresholds.assert
+        SILENCE otherwise
+    - Transition stresses are exact (the margin is linear in s):
+        s_soft = (capacity - th_assert) / load, s_silence = (capacity - th_soft) / load,
+      clipped at 0 (already SOFT / SILENT without stress).
+    All lexemes x all grid points are evaluated as array operations in lexeme batches.
+
+Inputs (one of):
+    --csv       corpus CSV with a text column (vocabulary + frequencies are built from it)
+    --features  a previous per-lexeme table (lexeme, freq, A, B, C; stored with 6 decimals)
+                to re-run a new grid without re-tokenizing
+
+Outputs (under --outdir):
+    lexeme_stress_{base}.csv          (per lexeme: features, capacities, transition stresses,
+                                       responses at the report levels, divergence onset)
+    lexeme_stress_{base}_grid.csv     (per grid stress: response counts AB/ABC, divergent lexemes,
+                                       divergence ratio by lexeme and by token mass)
+    lexeme_stress_{base}_summary.json
+
+Run:
+    python scripts/nk_ops_lexeme_stress.py --csv corpus.csv --outdir results/stress --config configs/config_stress_grid_template.json
+
+Notes:
+    - Deterministic outputs (no randomness; lexemes sorted by frequency desc, then lexeme)
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from nk_ops_table_io import write_table
+from nk_ops_tagger import OperatorTagger, load_adapter, open_token_cache, tokenize
+from nk_ops_utils import ensure_dir, iso_now_local, write_json
+
+NK_OPS_LEXEME_STRESS_VERSION = "0.1.0"
+
+RESPONSES = ["ASSERT", "SOFT", "SILENCE"]
+_ASSERT, _SOFT, _SILENCE = 0, 1, 2
+
+# ABC stress load never drops below this (a lexeme is never fully stress-immune)
+_MIN_LOAD = 0.05
+
+DEFAULT_STRESS_CONFIG: Dict[str, Any] = {
+    "version": "0.1.0",
+    "stress_grid": {"start": 0.0, "stop": 1.0, "step": 0.05, "report": [0.2, 0.5, 0.8]},
+    "capacity_weights": {"A": 1.0, "B": 0.6},
+    "stress_load": {"base": 1.0, "C_damping": 0.6},
+    "thresholds": {"assert": 0.9, "soft": 0.35},
+    "feature_weights": {
+        "A": {"anchor": 1.0, "abst": 1.0, "past": 0.5, "evid": 0.5, "fut": 0.5, "prog": 0.5, "neg": 0.5},
+        "C": {"imp": 1.0, "invoke": 1.0, "barrier": 1.0, "dat": 0.5, "acc": 0.5},
+    },
+}
+
+
+def load_stress_config(path: Optional[str | Path] = None) -> Dict[str, Any]:
+    if not path:
+        return copy.deepcopy(DEFAULT_STRESS_CONFIG)
+    cfg = json.loads(Path(path).read_text(encoding="utf-8"))
+    for k in ("stress_grid", "capacity_weights", "stress_load", "thresholds"):
+        if k not in cfg:
+            raise RuntimeError(f"stress config {path}: missing key '{k}'")
+    cfg.setdefault("feature_weights", copy.deepcopy(DEFAULT_STRESS_CONFIG["feature_weights"]))
+    cfg.setdefault("version", "custom")
+    return cfg
+
+
+def stress_grid(cfg: Dict[str, Any]) -> np.ndarray:
+    """Sorted unique grid: start..stop by step, plus the report levels."""
+    g = cfg["stress_grid"]
+    if isinstance(g, list):
+        levels = [float(x) for x in g]
+    else:
+        n = int(round((float(g["stop"]) - float(g["start"])) / float(g["step"]))) + 1
+        levels = [round(float(g["start"]) + i * float(g["step"]), 10) for i in range(n)]
+        levels += [float(x) for x in g.get("report", [])]
+    return np.unique(np.round(np.asarray(levels, dtype=np.float64), 10))
+
+
+def report_levels(cfg: Dict[str, Any], grid: np.ndarray) -> List[float]:
+    g = cfg["stress_grid"]
+    rep = g.get("report") if isinstance(g, dict) else None
+    return [float(x) for x in (rep if rep else grid)]
+
+
+# ---------------------------
+# Lexeme features
+# ---------------------------
+
+@dataclass
+class LexemeFeatures:
+    lexemes: List[str]
+    freq: np.ndarray        # (n,) int64 token frequency
+    F: np.ndarray           # (n, 3) float32 A, B, C
+
+    def __len__(self) -> int:
+        return len(self.lexemes)
+
+
+def count_vocabulary(csv_path: str | Path, text_col: str, chunksize: int = 100_000) -> Counter:
+    from nk_ops_corpus import _read_kwargs, read_with_fallback, sniff_format
+
+    fmt = sniff_format(csv_path)
+    if text_col not in fmt.columns:
+        raise RuntimeError(f"text_col='{text_col}' not found. Available: {fmt.columns[:60]}")
+
+    def scan() -> Counter:
+        vocab: Counter = Counter()
+        reader = pd.read_csv(csv_path, usecols=[text_col], dtype={text_col: "string"}, chunksize=chunksize,
+                             **_read_kwargs(fmt))
+        for chunk in reader:
+            for text in chunk[text_col].fillna("").tolist():
+                vocab.update(tokenize(text))
+        return vocab
+
+    return read_with_fallback(fmt, scan)
+
+
+def _field_vector(tagger: OperatorTagger, weights: Dict[str, float]) -> np.ndarray:
+    return np.array([float(weights.get(op, 0.0)) for op in tagger.ops], dtype=np.float32)
+
+
+def build_features(vocab: Counter, tagger: OperatorTagger, cfg: Dict[str, Any]) -> LexemeFeatures:
+    items = sorted(vocab.items(), key=lambda kv: (-kv[1], kv[0]))
+    lexemes = [w for w, _ in items]
+    freq = np.array([c for _, c in items], dtype=np.int64)
+    F = np.zeros((len(lexemes), 3), dtype=np.float32)
+    if not lexemes:
+        return LexemeFeatures(lexemes=lexemes, freq=freq, F=F)
+    P = tagger.mask_matrix(tagger.analyze_many(lexemes)).astype(np.float32)
+    fw = cfg["feature_weights"]
+    F[:, 0] = np.minimum(P @ _field_vector(tagger, fw.get("A", {})), 1.0)
+    F[:, 2] = np.minimum(P @ _field_vector(tagger, fw.get("C", {})), 1.0)
+    F[:, 1] = np.log1p(freq) / np.log1p(freq.max())
+    return LexemeFeatures(lexemes=lexemes, freq=freq, F=F)
+
+
+def load_features(path: str | Path) -> LexemeFeatures:
+    df = pd.read_csv(path, usecols=["lexeme", "freq", "A", "B", "C"], keep_default_na=False,
+                     dtype={"lexeme": str})
+    return LexemeFeatures(lexemes=df["lexeme"].tolist(), freq=df["freq"].to_numpy(dtype=np.int64),
+                          F=df[["A", "B", "C"]].to_numpy(dtype=np.float32))
+
+
+# ---------------------------
+# Batched response engine
+# ---------------------------
+
+@dataclass
+class StressResult:
+    grid: np.ndarray        # (S,)
+    cap: np.ndarray         # (n, 2) AB, ABC capacities (equal; kept per representation)
+    load: np.ndarray        # (n, 2)
+    resp: np.ndarray        # (2, n, S) int8 response codes (0 AB, 1 ABC)
+    s_soft: np.ndarray      # (n, 2) ASSERT -> SOFT stress
+    s_silence: np.ndarray   # (n, 2) SOFT -> SILENCE stress
+    diverge_at: np.ndarray  # (n,) first grid stress where AB != ABC (nan: never)
+
+
+def capacities(F: np.ndarray, cfg: Dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+    w = cfg["capacity_weights"]
+    ld = cfg["stress_load"]
+    A, B, C = (F[:, i].astype(np.float64) for i in range(3))
+    cap = float(w.get("A", 1.0)) * A + float(w.get("B", 1.0)) * B
+    base = float(ld.get("base", 1.0))
+    load_abc = np.maximum(base * (1.0 - float(ld.get("C_damping", 0.0)) * C), _MIN_LOAD)
+    return np.stack([cap, cap], axis=1), np.stack([np.full_like(A, base), load_abc], axis=1)
+
+
+def evaluate(feats: LexemeFeatures, cfg: Dict[str, Any], grid: np.ndarray, batch_size: int = 65_536) -> StressResult:
+    th_assert = float(cfg["thresholds"]["assert"])
+    th_soft = float(cfg["thresholds"]["soft"])
+    if th_soft > th_assert:
+        raise RuntimeError("thresholds.soft must be <= thresholds.assert")
+    cap, load = capacities(feats.F, cfg)
+    n, S = len(feats), len(grid)
+    resp = np.empty((2, n, S), dtype=np.int8)
+    for b0 in range(0, n, batch_size):
+        sl = slice(b0, b0 + batch_size)
+        # (2, batch, S) margins in one broadcast
+        m = cap[sl].T[:, :, None] - grid[None, None, :] * load[sl].T[:, :, None]
+        resp[:, sl] = np.where(m >= th_assert, _ASSERT, np.where(m >= th_soft, _SOFT, _SILENCE))
+
+    s_soft = np.maximum((cap - th_assert) / load, 0.0)
+    s_silence = np.maximum((cap - th_soft) / load, 0.0)
+
+    div = resp[0] != resp[1]
+    first = div.argmax(axis=1)
+    diverge_at = np.where(div.any(axis=1), grid[first], np.nan)
+    return StressResult(grid=grid, cap=cap, load=load, resp=resp, s_soft=s_soft, s_silence=s_silence,
+                        diverge_at=diverge_at)
+
+
+# ---------------------------
+# Tables
+# ---------------------------
+
+def _level_index(grid: np.ndarray, s: float) -> int:
+    i = int(np.argmin(np.abs(grid - s)))
+    if abs(grid[i] - s) > 1e-9:
+        raise RuntimeError(f"report level {s} is not on the stress grid")
+    return i
+
+
+def lexeme_table(feats: LexemeFeatures, res: StressResult, levels: Sequence[float]) -> List[tuple]:
+    labels = np.asarray(RESPONSES, dtype=object)
+    cols: List[tuple] = [
+        ("lexeme", feats.lexemes),
+        ("freq", feats.freq),
+        ("A", feats.F[:, 0].astype(np.float64)),
+        ("B", feats.F[:, 1].astype(np.float64)),
+        ("C", feats.F[:, 2].astype(np.float64)),
+        ("capacity", res.cap[:, 0]),
+        ("load_ABC", res.load[:, 1]),
+        ("AB_s_soft", res.s_soft[:, 0]),
+        ("AB_s_silence", res.s_silence[:, 0]),
+        ("ABC_s_soft", res.s_soft[:, 1]),
+        ("ABC_s_silence", res.s_silence[:, 1]),
+        ("diverge_at", res.diverge_at),
+    ]
+    for s in levels:
+        i = _level_index(res.grid, s)
+        cols.append((f"AB_s{s:.2f}", labels[res.resp[0, :, i]]))
+        cols.append((f"ABC_s{s:.2f}", labels[res.resp[1, :, i]]))
+    return cols
+
+
+def grid_table(feats: LexemeFeatures, res: StressResult) -> List[tuple]:
+    n = max(len(feats), 1)
+    mass = max(int(feats.freq.sum()), 1)
+    div = res.resp[0] != res.resp[1]                       # (n, S)
+    cols: List[tuple] = [("stress", res.grid), ("lexemes", np.full(len(res.grid), len(feats), dtype=np.int64))]
+    for r, name in ((0, "AB"), (1, "ABC")):
+        for code, label in enumerate(RESPONSES):
+            cols.append((f"{name}_{label}", (res.resp[r] == code).sum(axis=0).astype(np.int64)))
+    n_div = div.sum(axis=0).astype(np.int64)
+    cols.append(("divergent", n_div))
+    cols.append(("ratio", n_div / n))
+    cols.append(("token_ratio", (feats.freq[:, None] * div).sum(axis=0) / mass))
+    return cols
+
+
+def _quantiles(x: np.ndarray) -> Dict[str, Optional[float]]:
+    x = x[np.isfinite(x)]
+    if len(x) == 0:
+        return {"n": 0, "p10": None, "median": None, "p90": None}
+    p10, med, p90 = np.quantile(x, [0.1, 0.5, 0.9])
+    return {"n": int(len(x)), "p10": float(p10), "median": float(med), "p90": float(p90)}
+
+
+def transition_summary(feats: LexemeFeatures, res: StressResult) -> Dict[str, Any]:
+    """Distribution of transition stresses over lexemes (lexemes that start ASSERT / SOFT at s=0)."""
+    out: Dict[str, Any] = {}
+    for r, name in ((0, "AB"), (1, "ABC")):
+        starts_assert = res.s_soft[:, r] > 0
+        starts_voiced = res.s_silence[:, r] > 0
+        w = feats.freq.astype(np.float64)
+        out[name] = {
+            "start_ASSERT": int(starts_assert.sum()),
+            "start_SILENCE": int((~starts_voiced).sum()),
+            "assert_to_soft": _quantiles(res.s_soft[starts_assert, r]),
+            "soft_to_silence": _quantiles(res.s_silence[starts_voiced, r]),
+            "token_weighted_mean_s_silence": float((w * res.s_silence[:, r]).sum() / max(w.sum(), 1.0)),
+        }
+    out["diverge_at"] = _quantiles(res.diverge_at)
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Full-vocabulary AB vs ABC lexeme stress experiment over a stress grid.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv", help="Corpus CSV (vocabulary is built from --text_col)")
+    src.add_argument("--features", help="Per-lexeme table from a previous run (lexeme, freq, A, B, C)")
+    ap.add_argument("--outdir", required=True, help="Output directory")
+    ap.add_argument("--config", default=None, help="Stress-grid config JSON (default: built-in, see configs/)")
+    ap.add_argument("--text_col", default="text")
+    ap.add_argument("--adapter", default=None, help="Adapter rules JSON (default: built-in 'tr')")
+    ap.add_argument("--token_cache", default=None, help="On-disk token analysis cache (sqlite)")
+    ap.add_argument("--min_freq", type=int, default=1, help="Drop lexemes seen fewer times")
+    ap.add_argument("--batch_size", type=int, default=65_536, help="Lexemes per engine batch")
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args()
+
+    try:
+        outdir = ensure_dir(args.outdir)
+        cfg = load_stress_config(args.config)
+        grid = stress_grid(cfg)
+        levels = report_levels(cfg, grid)
+
+        if args.csv:
+            adapter = load_adapter(args.adapter)
+            cache = open_token_cache(adapter, args.token_cache) if args.token_cache else None
+            tagger = OperatorTagger(adapter, cache=cache)
+            vocab = count_vocabulary(args.csv, args.text_col)
+            if args.min_freq > 1:
+                vocab = Counter({w: c for w, c in vocab.items() if c >= args.min_freq})
+            feats = build_features(vocab, tagger, cfg)
+            if cache is not None:
+                cache.close()
+            base = Path(args.csv).name.split(".")[0]
+        else:
+            feats = load_features(args.features)
+            base = Path(args.features).name.split(".")[0].replace("lexeme_stress_", "")
+        print(f"[OK] lexemes={len(feats)} grid={len(grid)} levels={levels} config={cfg.get('version')}")
+
+        res = evaluate(feats, cfg, grid, batch_size=args.batch_size)
+
+        out_lex = outdir / f"lexeme_stress_{base}.csv"
+        out_grid = outdir / f"lexeme_stress_{base}_grid.csv"
+        out_json = outdir / f"lexeme_stress_{base}_summary.json"
+        grid_cols = grid_table(feats, res)
+        write_table(out_lex, lexeme_table(feats, res, levels))
+        write_table(out_grid, grid_cols)
+
+        gt = dict(grid_cols)
+        by_level = {}
+        for s in levels:
+            i = _level_index(grid, s)
+            by_level[f"{s:.2f}"] = {"divergent": int(gt["divergent"][i]), "ratio": float(gt["ratio"][i]),
+                                    "token_ratio": float(gt["token_ratio"][i])}
+        write_json(out_json, {
+            "generated_at": iso_now_local(),
+            "source_file": args.csv or args.features,
+            "lexemes": len(feats),
+            "tokens": int(feats.freq.sum()),
+            "stress_config": cfg,
+            "stress_grid": grid.tolist(),
+            "stress_levels": by_level,
+            "transitions": transition_summary(feats, res),
+            "nk_ops_lexeme_stress_version": NK_OPS_LEXEME_STRESS_VERSION,
+        })
+        for p in (out_lex, out_grid, out_json):
+            print(f"[WROTE] {p}")
+        print("[SUMMARY]")
+        print(json.dumps(by_level, ensure_ascii=False, indent=2))
+        return 0
+
+    except Exception as ex:
+        print(f"[ERR] {ex}")
+        if args.debug:
+            raise
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
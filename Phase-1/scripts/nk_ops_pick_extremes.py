@@ -4,24 +4,31 @@
 NK-Ops Phase-1 helper: pick "extreme" authors/meals from aggregated sweep tables.
 
 Inputs (produced by your Phase-1 sweeps):
-  - all_authors_index.csv
+  - all_authors_tau_shares.csv (or any per-author table with share_* / tau_* columns)
   - all_authors_operator_avg.csv
 
+Optional input:
+  - extremes_bootstrap.csv (nk_ops_extremes_bootstrap.py): adds per-author confidence
+    intervals and P(top/bottom K) to every listed extreme
+
 Outputs (recommended to commit):
   - results/extreme_meals.json
   - results/extremes_table.md
 
 Typical usage:
   py scripts/nk_ops_pick_extremes.py ^
-    --index_csv "results/all_authors_index.csv" ^
+    --index_csv "results/all_authors_tau_shares.csv" ^
     --avg_csv "results/all_authors_operator_avg.csv" ^
     --out_json "results/extreme_meals.json" ^
     --out_md  "results/extremes_table.md" ^
     --topk 5
 
 Notes:
+- Authors are matched on nk_ops_utils.author_slug (the sweep's table key); bootstrap rows use
+  raw author names and are slugged the same way. Unmatched authors are reported as [WARN].
 - This script does NOT re-run MSV. It only ranks authors based on the already aggregated sweep tables.
 - Ranking is done both on operator averages and on tau-shares (A/AC/C/LOW_OPS/NOISE).
+- Rank stability is computed separately (per-ayet bootstrap) and only merged in here.
 """
 
 from __future__ import annotations
@@ -29,10 +36,12 @@ import argparse
 import json
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 
+from nk_ops_utils import author_slug
+
 
 TAU_COLS = ["share_NOISE", "share_LOW_OPS", "share_A", "share_AC", "share_C"]
 
@@ -51,6 +60,13 @@ def _read_csv(path: str) -> pd.DataFrame:
     return pd.read_csv(p)
 
 
+def _share_cols(df: pd.DataFrame) -> pd.DataFrame:
+    # the sweep's all_authors_tau_shares.csv names shares tau_<code>
+    ren = {f"tau_{c[len('share_'):]}": c for c in TAU_COLS
+           if c not in df.columns and f"tau_{c[len('share_'):]}" in df.columns}
+    return df.rename(columns=ren)
+
+
 def _detect_cols(df: pd.DataFrame, wanted: List[str]) -> List[str]:
     cols = []
     for c in wanted:
@@ -70,6 +86,8 @@ def _top_bottom(df: pd.DataFrame, col: str, k: int) -> Tuple[pd.DataFrame, pd.Da
 def _compact_author_row(row: pd.Series, cols: List[str]) -> Dict:
     out = {"author": row.get("author", None)}
     for c in cols:
+        if c == "author":
+            continue
         out[c] = float(row[c]) if pd.notna(row[c]) else None
     # convenience
     if "rows" in row.index:
@@ -79,13 +97,38 @@ def _compact_author_row(row: pd.Series, cols: List[str]) -> Dict:
     return out
 
 
-def build_extremes(index_df: pd.DataFrame, avg_df: pd.DataFrame, topk: int) -> Dict:
+BOOT_COLS = ["ci_lo", "ci_hi", "rank_lo", "rank_hi", "p_top", "p_bottom"]
+
+
+def _boot_lookup(boot_df: Optional[pd.DataFrame]) -> Dict[Tuple[str, str], Dict]:
+    if boot_df is None:
+        return {}
+    missing = [c for c in ["metric", "author"] + BOOT_COLS if c not in boot_df.columns]
+    if missing:
+        raise RuntimeError(f"Bootstrap CSV is missing columns: {missing}")
+    out = {}
+    for r in boot_df.itertuples(index=False):
+        out[(str(r.metric), author_slug(r.author))] = {
+            c: (int(getattr(r, c)) if c.startswith("rank") else float(getattr(r, c))) for c in BOOT_COLS
+        }
+    return out
+
+
+def _with_boot(entry: Dict, col: str, boot: Dict[Tuple[str, str], Dict]) -> Dict:
+    b = boot.get((col, author_slug(entry.get("author"))))
+    if b is not None:
+        entry["bootstrap"] = b
+    return entry
+
+
+def build_extremes(index_df: pd.DataFrame, avg_df: pd.DataFrame, topk: int,
+                   boot_df: Optional[pd.DataFrame] = None) -> Dict:
     # Normalize author key
     if "author" not in index_df.columns or "author" not in avg_df.columns:
         raise RuntimeError("Both CSVs must contain an 'author' column.")
 
     # Merge: keep shares + rows + operator avgs
-    merged = index_df.merge(avg_df, on="author", how="inner", suffixes=("", "_avg"))
+    merged = _share_cols(index_df).merge(avg_df, on="author", how="inner", suffixes=("", "_avg"))
     merged = merged.copy()
 
     # Column detection (be tolerant with naming)
@@ -95,6 +138,16 @@ def build_extremes(index_df: pd.DataFrame, avg_df: pd.DataFrame, topk: int) -> D
     if not tau_cols and not op_cols:
         raise RuntimeError("No expected tau/op columns found. Check your CSV headers.")
 
+    boot = _boot_lookup(boot_df)
+    if boot:
+        table_authors = {author_slug(a) for a in merged["author"]}
+        boot_authors = {a for _, a in boot}
+        for label, names in (("in sweep tables without bootstrap rows", table_authors - boot_authors),
+                             ("in bootstrap CSV without sweep rows", boot_authors - table_authors)):
+            if names:
+                shown = ", ".join(sorted(names)[:10]) + (" ..." if len(names) > 10 else "")
+                print(f"[WARN] {len(names)} author(s) {label}: {shown}")
+
     out = {
         "generated_at": pd.Timestamp.utcnow().isoformat() + "Z",
         "topk": topk,
@@ -110,21 +163,44 @@ def build_extremes(index_df: pd.DataFrame, avg_df: pd.DataFrame, topk: int) -> D
     for col in tau_cols:
         top, bot = _top_bottom(merged, col, topk)
         out["tau_extremes"][col] = {
-            "highest": [_compact_author_row(r, ["author", col, "rows"]) for _, r in top.iterrows()],
-            "lowest":  [_compact_author_row(r, ["author", col, "rows"]) for _, r in bot.iterrows()],
+            "highest": [_with_boot(_compact_author_row(r, ["author", col, "rows"]), col, boot) for _, r in top.iterrows()],
+            "lowest":  [_with_boot(_compact_author_row(r, ["author", col, "rows"]), col, boot) for _, r in bot.iterrows()],
         }
 
     # Operator extremes
     for col in op_cols:
         top, bot = _top_bottom(merged, col, topk)
         out["operator_extremes"][col] = {
-            "highest": [_compact_author_row(r, ["author", col, "rows"]) for _, r in top.iterrows()],
-            "lowest":  [_compact_author_row(r, ["author", col, "rows"]) for _, r in bot.iterrows()],
+            "highest": [_with_boot(_compact_author_row(r, ["author", col, "rows"]), col, boot) for _, r in top.iterrows()],
+            "lowest":  [_with_boot(_compact_author_row(r, ["author", col, "rows"]), col, boot) for _, r in bot.iterrows()],
         }
 
+    if boot:
+        out["notes"].append("bootstrap: percentile CI of the value, rank CI, and P(top/bottom K) "
+                            "from resampling ayets within each author (see nk_ops_extremes_bootstrap.py).")
+
     return out
 
 
+def _md_table(lines: List[str], title: str, entries: List[Dict], col: str, p_key: str) -> None:
+    has_boot = any("bootstrap" in r for r in entries)
+    if has_boot:
+        lines.append(f"\n**{title}**\n\n| rank | author | value | rows | CI | rank CI | P({p_key} K) |\n"
+                     "|---:|---|---:|---:|---:|---:|---:|\n")
+    else:
+        lines.append(f"\n**{title}**\n\n| rank | author | value | rows |\n|---:|---|---:|---:|\n")
+    for i, r in enumerate(entries, 1):
+        row = f"| {i} | {r.get('author')} | {r.get(col):.6f} | {r.get('rows','')} |"
+        if has_boot:
+            b = r.get("bootstrap")
+            if b:
+                row += (f" [{b['ci_lo']:.6f}, {b['ci_hi']:.6f}] | {b['rank_lo']}–{b['rank_hi']}"
+                        f" | {b['p_' + p_key]:.3f} |")
+            else:
+                row += " | | |"
+        lines.append(row + "\n")
+
+
 def write_md(extremes: Dict, out_md: str) -> None:
     p = Path(out_md)
     p.parent.mkdir(parents=True, exist_ok=True)
@@ -139,40 +215,36 @@ def write_md(extremes: Dict, out_md: str) -> None:
     lines.append("\n## Tau extremes\n")
     for col, bucket in extremes.get("tau_extremes", {}).items():
         lines.append(f"\n### {col}\n")
-        lines.append("\n**Highest**\n\n| rank | author | value | rows |\n|---:|---|---:|---:|\n")
-        for i, r in enumerate(bucket.get("highest", []), 1):
-            lines.append(f"| {i} | {r.get('author')} | {r.get(col):.6f} | {r.get('rows','')} |\n")
-        lines.append("\n**Lowest**\n\n| rank | author | value | rows |\n|---:|---|---:|---:|\n")
-        for i, r in enumerate(bucket.get("lowest", []), 1):
-            lines.append(f"| {i} | {r.get('author')} | {r.get(col):.6f} | {r.get('rows','')} |\n")
+        _md_table(lines, "Highest", bucket.get("highest", []), col, "top")
+        _md_table(lines, "Lowest", bucket.get("lowest", []), col, "bottom")
 
     # Operators
     lines.append("\n## Operator extremes\n")
     for col, bucket in extremes.get("operator_extremes", {}).items():
         lines.append(f"\n### {col}\n")
-        lines.append("\n**Highest**\n\n| rank | author | value | rows |\n|---:|---|---:|---:|\n")
-        for i, r in enumerate(bucket.get("highest", []), 1):
-            lines.append(f"| {i} | {r.get('author')} | {r.get(col):.6f} | {r.get('rows','')} |\n")
-        lines.append("\n**Lowest**\n\n| rank | author | value | rows |\n|---:|---|---:|---:|\n")
-        for i, r in enumerate(bucket.get("lowest", []), 1):
-            lines.append(f"| {i} | {r.get('author')} | {r.get(col):.6f} | {r.get('rows','')} |\n")
+        _md_table(lines, "Highest", bucket.get("highest", []), col, "top")
+        _md_table(lines, "Lowest", bucket.get("lowest", []), col, "bottom")
 
     p.write_text("".join(lines), encoding="utf-8")
 
 
 def main() -> None:
     ap = argparse.ArgumentParser()
-    ap.add_argument("--index_csv", required=True, help="all_authors_index.csv")
+    ap.add_argument("--index_csv", required=True, help="all_authors_tau_shares.csv (per-author tau shares)")
     ap.add_argument("--avg_csv", required=True, help="all_authors_operator_avg.csv")
     ap.add_argument("--out_json", required=True, help="Output JSON path (recommended: results/extreme_meals.json)")
     ap.add_argument("--out_md", required=True, help="Output markdown path (recommended: results/extremes_table.md)")
     ap.add_argument("--topk", type=int, default=5, help="How many highest/lowest to keep per metric")
+    ap.add_argument("--bootstrap_csv", default="",
+                    help="Optional extremes_bootstrap.csv (nk_ops_extremes_bootstrap.py) to annotate rank stability")
     args = ap.parse_args()
 
     index_df = _read_csv(args.index_csv)
     avg_df = _read_csv(args.avg_csv)
 
-    extremes = build_extremes(index_df, avg_df, topk=args.topk)
+    boot_df = _read_csv(args.bootstrap_csv) if args.bootstrap_csv else None
+
+    extremes = build_extremes(index_df, avg_df, topk=args.topk, boot_df=boot_df)
 
     out_json = Path(args.out_json)
     out_json.parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_ops_pipeline.py — NK-Ops cross-phase pipeline runner (declarative stage DAG)
+
+Purpose:
+    Run the Phase-1 / Phase-3 script chain from one pipeline definition instead of
+    hand-run commands: per-author sweeps -> all_authors_* -> pick_extremes,
+    4B v2 -> decision gate -> public samples, corpus -> lexeme stress, ...
+
+How it works:
+    - Each stage declares its command, input paths and output paths (see
+      configs/pipeline_template.json). "{var}" placeholders are filled from "vars"
+      (and --set overrides); relative paths are resolved against "root".
+    - Dependencies are inferred: a stage depends on the stage that produces one of its
+      inputs (same file, or a file under an output directory); "after" adds explicit edges.
+    - A stage is skipped when its fingerprint (command + content digests of all inputs)
+      matches the last successful run and all outputs exist. Digests are content
+      SHA-256s, memoised by (size, mtime), so an upstream re-run that writes identical
+      bytes does not re-trigger its dependents.
+    - Ready stages run concurrently on a local worker pool (--jobs); independent branches
+      (e.g. Phase-1 extremes and Phase-3C gating) overlap, so a full refresh costs about
+      its critical path. A failed stage blocks its dependents only.
+    - A per-stage timing report (status, start, duration, critical path) is printed at the end.
+
+Inputs:
+    --pipeline pipeline.json
+
+Outputs:
+    stage outputs (as declared), plus under the state dir (default: <root>/.nk_pipeline):
+      state.json            (fingerprints of the last successful runs + file digest memo)
+      logs/<stage>.log      (stdout + stderr of the last run of each stage)
+      report.json           (timing report of this run)
+
+Run:
+    python scripts/nk_ops_pipeline.py --pipeline configs/pipeline_template.json --jobs 4
+    python scripts/nk_ops_pipeline.py --pipeline configs/pipeline_template.json --dry_run
+    python scripts/nk_ops_pipeline.py --pipeline configs/pipeline_template.json --stage pick_extremes --force
+
+Notes:
+    - Stage commands run without a shell (argument lists); outputs of a run are only
+      checked for existence, never parsed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from nk_ops_utils import ensure_dir, iso_now_local, write_json
+
+NK_OPS_PIPELINE_VERSION = "0.1.0"
+
+_HASH_CHUNK = 1 << 20
+
+
+# ---------------------------
+# Pipeline definition
+# ---------------------------
+
+@dataclass
+class Stage:
+    name: str
+    cmd: List[str]
+    inputs: List[Path]
+    outputs: List[Path]
+    after: List[str] = field(default_factory=list)
+    cwd: Optional[Path] = None
+    deps: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class Pipeline:
+    root: Path
+    stages: Dict[str, Stage]    # definition order
+    order: List[str]            # topological order (ties: definition order)
+
+
+def _resolve_vars(raw: Dict[str, Any], overrides: Dict[str, str]) -> Dict[str, str]:
+    vals = {k: str(v) for k, v in raw.items()}
+    vals.update(overrides)
+    vals.setdefault("python", sys.executable)
+    # vars may reference other vars; expand until stable
+    for _ in range(len(vals) + 1):
+        changed = False
+        for k, v in vals.items():
+            nv = v.format_map(vals) if "{" in v else v
+            if nv != v:
+                vals[k] = nv
+                changed = True
+        if not changed:
+            return vals
+    raise RuntimeError("pipeline vars: circular reference")
+
+
+def _fill(s: str, vals: Dict[str, str], where: str) -> str:
+    try:
+        return s.format_map(vals)
+    except KeyError as ex:
+        raise RuntimeError(f"{where}: unknown var {ex}") from ex
+
+
+def _path(root: Path, s: str) -> Path:
+    p = Path(s)
+    return (p if p.is_absolute() else root / p).resolve()
+
+
+def _produces(stage: Stage, p: Path) -> bool:
+    return any(p == o or o in p.parents for o in stage.outputs)
+
+
+def _toposort(stages: Dict[str, Stage]) -> List[str]:
+    pending = {n: set(s.deps) for n, s in stages.items()}
+    order: List[str] = []
+    while pending:
+        ready = [n for n in stages if n in pending and not pending[n]]
+        if not ready:
+            raise RuntimeError(f"pipeline has a dependency cycle among: {sorted(pending)}")
+        for n in ready:
+            order.append(n)
+            del pending[n]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return order
+
+
+def load_pipeline(path: str | Path, overrides: Optional[Dict[str, str]] = None) -> Pipeline:
+    path = Path(path)
+    spec = json.loads(path.read_text(encoding="utf-8"))
+    if "stages" not in spec:
+        raise RuntimeError(f"pipeline {path}: missing key 'stages'")
+    vals = _resolve_vars(spec.get("vars", {}), overrides or {})
+    root = _path(path.parent, vals.get("root", "."))
+    vals["root"] = str(root)
+
+    stages: Dict[str, Stage] = {}
+    for st in spec["stages"]:
+        name = st.get("name")
+        if not name:
+            raise RuntimeError(f"pipeline {path}: stage without 'name'")
+        if name in stages:
+            raise RuntimeError(f"pipeline {path}: duplicate stage '{name}'")
+        if not st.get("enabled", True):
+            continue
+        cmd = st.get("cmd")
+        if not cmd:
+            raise RuntimeError(f"stage '{name}': missing 'cmd'")
+        argv = shlex.split(cmd) if isinstance(cmd, str) else [str(c) for c in cmd]
+        where = f"stage '{name}'"
+        stages[name] = Stage(
+            name=name,
+            cmd=[_fill(a, vals, where) for a in argv],
+            inputs=[_path(root, _fill(s, vals, where)) for s in st.get("inputs", [])],
+            outputs=[_path(root, _fill(s, vals, where)) for s in st.get("outputs", [])],
+            after=list(st.get("after", [])),
+            cwd=_path(root, _fill(st["cwd"], vals, where)) if st.get("cwd") else root,
+        )
+
+    for s in stages.values():
+        for a in s.after:
+            if a not in stages:
+                raise RuntimeError(f"stage '{s.name}': unknown 'after' stage '{a}'")
+            s.deps.add(a)
+        for p in s.inputs:
+            for o in stages.values():
+                if o.name != s.name and _produces(o, p):
+                    s.deps.add(o.name)
+    return Pipeline(root=root, stages=stages, order=_toposort(stages))
+
+
+def select(pl: Pipeline, targets: Sequence[str]) -> List[str]:
+    """Targets plus everything upstream of them, in topological order."""
+    if not targets:
+        return list(pl.order)
+    keep: Set[str] = set()
+    todo = list(targets)
+    while todo:
+        n = todo.pop()
+        if n not in pl.stages:
+            raise RuntimeError(f"unknown stage '{n}'. Stages: {pl.order}")
+        if n not in keep:
+            keep.add(n)
+            todo.extend(pl.stages[n].deps)
+    return [n for n in pl.order if n in keep]
+
+
+# ---------------------------
+# Fingerprints (content digests, memoised by size + mtime)
+# ---------------------------
+
+class DigestMemo:
+    def __init__(self, memo: Optional[Dict[str, List[Any]]] = None):
+        self.memo: Dict[str, List[Any]] = dict(memo or {})
+        self._lock = threading.Lock()
+
+    def file_digest(self, p: Path) -> str:
+        st = p.stat()
+        key = str(p)
+        with self._lock:
+            hit = self.memo.get(key)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return str(hit[2])
+        h = hashlib.sha256()
+        with p.open("rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                h.update(chunk)
+        d = h.hexdigest()
+        with self._lock:
+            self.memo[key] = [st.st_size, st.st_mtime_ns, d]
+        return d
+
+    def digest(self, p: Path) -> str:
+        if p.is_dir():
+            h = hashlib.sha256()
+            for f in sorted(x for x in p.rglob("*") if x.is_file()):
+                h.update(str(f.relative_to(p)).encode("utf-8"))
+                h.update(self.file_digest(f).encode("ascii"))
+            return "dir:" + h.hexdigest()
+        return self.file_digest(p)
+
+
+def fingerprint(stage: Stage, memo: DigestMemo) -> str:
+    missing = [str(p) for p in stage.inputs if not p.exists()]
+    if missing:
+        raise RuntimeError(f"missing inputs: {missing}")
+    payload = {
+        "cmd": stage.cmd,
+        "cwd": str(stage.cwd),
+        "inputs": [[str(p), memo.digest(p)] for p in stage.inputs],
+        "outputs": [str(p) for p in stage.outputs],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+
+@dataclass
+class StageRun:
+    name: str
+    status: str = "pending"     # ran | skipped | failed | blocked | planned
+    start: float = 0.0          # seconds since pipeline start
+    seconds: float = 0.0
+    returncode: Optional[int] = None
+    message: str = ""
+
+
+class Runner:
+    def __init__(self, pl: Pipeline, state_dir: Path, jobs: int = 1, force: bool = False,
+                 force_stages: Sequence[str] = ()):
+        self.pl = pl
+        self.state_dir = ensure_dir(state_dir)
+        self.logs = ensure_dir(self.state_dir / "logs")
+        self.state_path = self.state_dir / "state.json"
+        self.jobs = max(1, jobs)
+        self.force = force
+        self.force_stages = set(force_stages)
+        state = json.loads(self.state_path.read_text(encoding="utf-8")) if self.state_path.exists() else {}
+        self.fps: Dict[str, Any] = state.get("stages", {})
+        self.memo = DigestMemo(state.get("files", {}))
+        self._lock = threading.Lock()
+        self.t0 = time.perf_counter()
+
+    def _save_state(self) -> None:
+        with self._lock:
+            data = {"stages": dict(self.fps), "files": dict(self.memo.memo),
+                    "nk_ops_pipeline_version": NK_OPS_PIPELINE_VERSION}
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+    def _up_to_date(self, st: Stage, fp: str) -> bool:
+        if self.force or st.name in self.force_stages:
+            return False
+        prev = self.fps.get(st.name, {})
+        return prev.get("fingerprint") == fp and all(p.exists() for p in st.outputs)
+
+    def _run_stage(self, st: Stage) -> StageRun:
+        r = StageRun(name=st.name, start=time.perf_counter() - self.t0)
+        t = time.perf_counter()
+        try:
+            fp = fingerprint(st, self.memo)
+            if self._up_to_date(st, fp):
+                r.status = "skipped"
+                r.message = "inputs unchanged"
+                return r
+            print(f"[RUN] {st.name}: {' '.join(st.cmd)}", flush=True)
+            log_path = self.logs / f"{st.name}.log"
+            with log_path.open("w", encoding="utf-8", errors="replace") as log:
+                proc = subprocess.run(st.cmd, cwd=str(st.cwd), stdout=log, stderr=subprocess.STDOUT)
+            r.returncode = proc.returncode
+            if proc.returncode != 0:
+                r.status = "failed"
+                r.message = f"exit {proc.returncode}, see {log_path}"
+                return r
+            missing = [str(p) for p in st.outputs if not p.exists()]
+            if missing:
+                r.status = "failed"
+                r.message = f"declared outputs not written: {missing}"
+                return r
+            r.status = "ran"
+            with self._lock:
+                self.fps[st.name] = {"fingerprint": fp, "finished_at": iso_now_local()}
+            self._save_state()
+            return r
+        except Exception as ex:
+            r.status = "failed"
+            r.message = str(ex)
+            return r
+        finally:
+            r.seconds = time.perf_counter() - t
+
+    def run(self, names: Sequence[str]) -> Dict[str, StageRun]:
+        names = list(names)
+        wanted = set(names)
+        runs: Dict[str, StageRun] = {}
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as ex:
+            while len(runs) < len(names):
+                for n in names:
+                    if n in runs or n in running.values():
+                        continue
+                    deps = self.pl.stages[n].deps & wanted
+                    if any(runs.get(d) and runs[d].status in ("failed", "blocked") for d in deps):
+                        bad = sorted(d for d in deps if runs.get(d) and runs[d].status in ("failed", "blocked"))
+                        runs[n] = StageRun(name=n, status="blocked", message=f"upstream failed: {bad}")
+                        print(f"[SKIP] {n}: blocked by {bad}", flush=True)
+                        continue
+                    if all(d in runs for d in deps):
+                        running[ex.submit(self._run_stage, self.pl.stages[n])] = n
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for f in done:
+                    n = running.pop(f)
+                    r = f.result()
+                    runs[n] = r
+                    tag = {"ran": "OK", "skipped": "SKIP", "failed": "FAIL"}[r.status]
+                    print(f"[{tag}] {n} ({r.seconds:.2f}s){' — ' + r.message if r.message else ''}", flush=True)
+        self._save_state()
+        return runs
+
+
+# ---------------------------
+# Report
+# ---------------------------
+
+def critical_path(pl: Pipeline, runs: Dict[str, StageRun]) -> Tuple[float, List[str]]:
+    """Longest chain of stage durations through the DAG (what a full refresh costs with enough workers)."""
+    best: Dict[str, Tuple[float, List[str]]] = {}
+    for n in pl.order:
+        if n not in runs:
+            continue
+        up = [best[d] for d in pl.stages[n].deps if d in best]
+        base = max(up, key=lambda x: x[0]) if up else (0.0, [])
+        best[n] = (base[0] + runs[n].seconds, base[1] + [n])
+    return max(best.values(), key=lambda x: x[0]) if best else (0.0, [])
+
+
+def report(pl: Pipeline, runs: Dict[str, StageRun], wall: float) -> Dict[str, Any]:
+    cp_sec, cp = critical_path(pl, runs)
+    stage_sum = sum(r.seconds for r in runs.values())
+    w = max([len(n) for n in runs] + [5])
+    print("[REPORT]")
+    print(f"  {'stage':<{w}}  {'status':<8} {'start':>8} {'seconds':>9}")
+    for n in pl.order:
+        if n in runs:
+            r = runs[n]
+            print(f"  {n:<{w}}  {r.status:<8} {r.start:>8.2f} {r.seconds:>9.2f}")
+    print(f"  wall={wall:.2f}s  sum_of_stages={stage_sum:.2f}s  critical_path={cp_sec:.2f}s ({' -> '.join(cp)})")
+    return {
+        "generated_at": iso_now_local(),
+        "wall_seconds": wall,
+        "sum_of_stage_seconds": stage_sum,
+        "critical_path_seconds": cp_sec,
+        "critical_path": cp,
+        "stages": [
+            {"name": n, "status": runs[n].status, "start": runs[n].start, "seconds": runs[n].seconds,
+             "returncode": runs[n].returncode, "message": runs[n].message}
+            for n in pl.order if n in runs
+        ],
+        "nk_ops_pipeline_version": NK_OPS_PIPELINE_VERSION,
+    }
+
+
+def _parse_set(items: Sequence[str]) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for it in items:
+        if "=" not in it:
+            raise RuntimeError(f"--set expects key=value, got '{it}'")
+        k, v = it.split("=", 1)
+        out[k.strip()] = v
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run the NK-Ops stage DAG: skip unchanged stages, run independent branches in parallel.")
+    ap.add_argument("--pipeline", required=True, help="Pipeline definition JSON")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Concurrent stages")
+    ap.add_argument("--stage", action="append", default=[], help="Run only this stage (+ upstream); repeatable")
+    ap.add_argument("--force", action="store_true", help="Re-run selected stages even if inputs are unchanged")
+    ap.add_argument("--force_stage", action="append", default=[], help="Re-run this stage even if unchanged; repeatable")
+    ap.add_argument("--set", action="append", default=[], help="Override a pipeline var: key=value; repeatable")
+    ap.add_argument("--state_dir", default="", help="State/log directory (default: <root>/.nk_pipeline)")
+    ap.add_argument("--dry_run", action="store_true", help="Print the plan (stages, dependencies, up-to-date?) and exit")
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args()
+
+    try:
+        pl = load_pipeline(args.pipeline, _parse_set(args.set))
+        names = select(pl, args.stage)
+        state_dir = Path(args.state_dir) if args.state_dir else pl.root / ".nk_pipeline"
+        runner = Runner(pl, state_dir, jobs=args.jobs, force=args.force, force_stages=args.force_stage)
+        print(f"[OK] pipeline={args.pipeline} root={pl.root} stages={len(names)} jobs={runner.jobs}")
+
+        if args.dry_run:
+            for n in names:
+                st = pl.stages[n]
+                missing = [p for p in st.inputs if not p.exists()]
+                if not missing:
+                    state = "up-to-date" if runner._up_to_date(st, fingerprint(st, runner.memo)) else "will run"
+                elif all(any(_produces(pl.stages[d], p) for d in st.deps) for p in missing):
+                    state = "will run (inputs produced upstream)"
+                else:
+                    state = f"missing inputs: {[str(p) for p in missing]}"
+                deps = ", ".join(sorted(st.deps)) or "-"
+                print(f"[PLAN] {n:<24} deps=[{deps}] {state}")
+            return 0
+
+        runs = runner.run(names)
+        wall = time.perf_counter() - runner.t0
+        out_json = runner.state_dir / "report.json"
+        write_json(out_json, report(pl, runs, wall))
+        print(f"[WROTE] {out_json}")
+        return 1 if any(r.status in ("failed", "blocked") for r in runs.values()) else 0
+
+    except Exception as ex:
+        print(f"[ERR] {ex}")
+        if args.debug:
+            raise
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
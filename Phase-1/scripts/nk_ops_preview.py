@@ -0,0 +1,334 @@
+# nk_ops_preview.py
+# NK-Ops — fast preview mode: deterministic stratified samples + confidence intervals
+# v0.1 (utility module; keep deterministic)
+#
+# During rule / parameter iteration, tau shares, operator averages and gate decision
+# counts are estimated from a sample instead of the full corpus:
+#   - strata = (author, sure); every row gets a fixed pseudo-random number u from a
+#     splitmix64 hash of (seed, row key); a stratum's sample at fraction f is its
+#     ceil(f * N_h) rows with the smallest u (at least min_per_stratum). Samples are
+#     nested: a larger f only adds rows, so refinement never recomputes a row.
+#   - per-row metric values (indicators for shares, counts for averages) are combined
+#     with the stratified estimator, per author and pooled:
+#         mean = sum_h W_h ybar_h,   var = sum_h W_h^2 (1 - n_h/N_h) s_h^2 / n_h
+#     (W_h = N_h / N of the group; s_h^2 with ddof=1, pooled within-sample variance
+#     for strata with a single sampled row); CI = mean +- z * sqrt(var).
+#   - refine(): grow f (doubling) until every CI of the checked groups (entry points: the
+#     pooled estimates) is narrower than the target.
+#   - ExactCache (opt-in, --preview_cache PATH): full runs store their exact values keyed by
+#     input file stamp + config; previews over the same input and config report error and CI
+#     coverage against them. Without a path nothing is read or written.
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nk_ops_utils import ensure_dir, iso_now_local
+
+NK_OPS_PREVIEW_VERSION = "0.1.0"
+
+Z_95 = 1.959963984540054
+POOLED = "ALL"
+
+_M64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        z = x + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return (z ^ (z >> np.uint64(31))) & _M64
+
+
+def row_keys(n: int, ids: Optional[Sequence[Any]] = None) -> np.ndarray:
+    """uint64 key per row: a hash of the row id when given (stable under reordering), else the position."""
+    if ids is None:
+        return np.arange(n, dtype=np.uint64)
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(i).encode("utf-8"), digest_size=8).digest(), "little") for i in ids),
+        dtype=np.uint64, count=n,
+    )
+
+
+@dataclass
+class Estimates:
+    metrics: List[str]
+    groups: List[str]           # authors, then POOLED
+    mean: np.ndarray            # (G, K)
+    se: np.ndarray              # (G, K)
+    n_sample: np.ndarray        # (G,)
+    n_rows: np.ndarray          # (G,)
+    frac: float
+    unseen: Optional[np.ndarray] = None   # (G, K) metric is 0 on every sampled row
+    unit: Optional[np.ndarray] = None     # (G,) scale of the metric vs a per-row mean (scaled())
+
+    def ci(self, z: float = Z_95) -> Tuple[np.ndarray, np.ndarray]:
+        lo, hi = self.mean - z * self.se, self.mean + z * self.se
+        if self.unseen is not None:
+            # Wald collapses to [0, 0] for events the sample never saw: rule of three (95%)
+            bound = np.where(self.n_sample < self.n_rows, 3.0 / np.maximum(self.n_sample, 1), 0.0)
+            if self.unit is not None:
+                bound = bound * self.unit
+            bound = bound[:, None]
+            hi = np.where(self.unseen, np.maximum(hi, bound), hi)
+        return lo, hi
+
+    def max_width(self, z: float = Z_95, groups: Optional[Sequence[str]] = None) -> float:
+        rows = [self.groups.index(g) for g in groups] if groups else list(range(len(self.groups)))
+        lo, hi = self.ci(z)
+        return float((hi - lo)[rows].max()) if rows and self.se.size else 0.0
+
+    def scaled(self, factor_per_group: np.ndarray, metrics: Optional[List[str]] = None) -> "Estimates":
+        """Means times a per-group factor (e.g. shares -> counts with factor = n_rows)."""
+        f = np.asarray(factor_per_group, dtype=np.float64)
+        unit = f if self.unit is None else self.unit * f
+        return Estimates(metrics=metrics or self.metrics, groups=self.groups, mean=self.mean * f[:, None],
+                         se=self.se * f[:, None], n_sample=self.n_sample, n_rows=self.n_rows, frac=self.frac,
+                         unseen=self.unseen, unit=unit)
+
+
+@dataclass
+class StratifiedSample:
+    strata: np.ndarray          # (n,) stratum code per row
+    N_h: np.ndarray             # (H,) rows per stratum
+    rank: np.ndarray            # (n,) rank of the row's u inside its stratum
+    group_of: np.ndarray        # (H,) group (author) code per stratum
+    group_names: List[str]
+    min_per_stratum: int = 2
+
+    @classmethod
+    def build(
+        cls,
+        author: Sequence[Any],
+        sure: Optional[Sequence[Any]] = None,
+        keys: Optional[np.ndarray] = None,
+        seed: int = 0,
+        min_per_stratum: int = 2,
+    ) -> "StratifiedSample":
+        a_codes, a_names = pd.factorize(pd.Series(np.asarray(author, dtype=object)).astype(str), sort=True)
+        n = len(a_codes)
+        if sure is not None:
+            s_codes, _ = pd.factorize(pd.Series(np.asarray(sure, dtype=object)).astype(str), sort=True)
+        else:
+            s_codes = np.zeros(n, dtype=np.int64)
+        pair = a_codes.astype(np.int64) * (int(s_codes.max()) + 1 if n else 1) + s_codes
+        uniq, strata = np.unique(pair, return_inverse=True)
+        strata = strata.ravel()
+        keys = np.arange(n, dtype=np.uint64) if keys is None else np.asarray(keys, dtype=np.uint64)
+        u = _splitmix64(keys ^ _splitmix64(np.full(n, seed, dtype=np.uint64)))
+        order = np.lexsort((u, strata))
+        N_h = np.bincount(strata, minlength=len(uniq))
+        starts = np.concatenate(([0], np.cumsum(N_h)[:-1]))
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n) - np.repeat(starts, N_h)
+        group_of = (uniq // (int(s_codes.max()) + 1 if n else 1)).astype(np.int64)
+        return cls(strata=strata, N_h=N_h, rank=rank, group_of=group_of,
+                   group_names=[str(x) for x in a_names], min_per_stratum=min_per_stratum)
+
+    def n_h(self, frac: float) -> np.ndarray:
+        want = np.ceil(frac * self.N_h).astype(np.int64)
+        return np.minimum(self.N_h, np.maximum(want, self.min_per_stratum))
+
+    def select(self, frac: float) -> np.ndarray:
+        """(n,) bool: rows in the sample at this fraction (nested in frac)."""
+        return self.rank < self.n_h(frac)[self.strata]
+
+    def estimate(self, values: np.ndarray, mask: np.ndarray, frac: float, metrics: Sequence[str]) -> Estimates:
+        """values: (n_selected, K) per sampled row, in row order of mask."""
+        Y = np.asarray(values, dtype=np.float64).reshape(int(mask.sum()), -1)
+        H, K = len(self.N_h), Y.shape[1]
+        h = self.strata[mask]
+        n_h = np.bincount(h, minlength=H).astype(np.float64)
+        s1 = np.zeros((H, K))
+        s2 = np.zeros((H, K))
+        np.add.at(s1, h, Y)
+        np.add.at(s2, h, Y * Y)
+        ybar = s1 / np.maximum(n_h, 1)[:, None]
+        ss = np.maximum(s2 - n_h[:, None] * ybar * ybar, 0.0)
+        var_h = ss / np.maximum(n_h - 1, 1)[:, None]
+        # single-row strata: pooled within-stratum variance
+        multi = n_h >= 2
+        pooled_var = ss[multi].sum(axis=0) / max(float((n_h[multi] - 1).sum()), 1.0)
+        var_h[~multi] = pooled_var
+        fpc = 1.0 - n_h / np.maximum(self.N_h, 1)
+        v_h = np.where(n_h[:, None] > 0, fpc[:, None] * var_h / np.maximum(n_h, 1)[:, None], 0.0)
+
+        G = len(self.group_names)
+        gid = np.concatenate([self.group_of, np.full(H, G)])  # each stratum counted for its group + pooled
+        hh = np.concatenate([np.arange(H), np.arange(H)])
+        N_g = np.bincount(gid, weights=self.N_h[hh].astype(np.float64), minlength=G + 1)
+        W = self.N_h[hh] / N_g[gid]
+        mean = np.zeros((G + 1, K))
+        var = np.zeros((G + 1, K))
+        np.add.at(mean, gid, W[:, None] * ybar[hh])
+        np.add.at(var, gid, (W * W)[:, None] * v_h[hh])
+        nz = np.zeros((G + 1, K))
+        np.add.at(nz, gid, (s2 > 0)[hh].astype(np.float64))
+        return Estimates(
+            metrics=list(metrics), groups=self.group_names + [POOLED], mean=mean, se=np.sqrt(var),
+            n_sample=np.bincount(gid, weights=n_h[hh], minlength=G + 1).astype(np.int64),
+            n_rows=N_g.astype(np.int64), frac=frac, unseen=nz == 0,
+        )
+
+
+class RowValues:
+    """Per-row metric values computed on demand and memoised (nested samples reuse rows)."""
+
+    def __init__(self, n: int, compute: Callable[[np.ndarray], np.ndarray]):
+        self.compute = compute
+        self.done = np.zeros(n, dtype=bool)
+        self.values: Optional[np.ndarray] = None
+
+    def get(self, mask: np.ndarray) -> np.ndarray:
+        todo = np.flatnonzero(mask & ~self.done)
+        if len(todo):
+            v = np.asarray(self.compute(todo), dtype=np.float64).reshape(len(todo), -1)
+            if self.values is None:
+                self.values = np.zeros((len(self.done), v.shape[1]))
+            self.values[todo] = v
+            self.done[todo] = True
+        return self.values[mask] if self.values is not None else np.zeros((0, 0))
+
+
+def refine(
+    sample: StratifiedSample,
+    rows: RowValues,
+    metrics: Sequence[str],
+    frac: float,
+    target_width: Optional[float] = None,
+    z: float = Z_95,
+    groups: Optional[Sequence[str]] = None,
+    log: Optional[Callable[[str], None]] = None,
+) -> Estimates:
+    """Estimate at frac; with target_width, double frac until the widest CI is below it."""
+    while True:
+        mask = sample.select(frac)
+        est = sample.estimate(rows.get(mask), mask, frac, metrics)
+        width = est.max_width(z, groups)
+        if log:
+            log(f"preview frac={frac:.4g} sampled={int(mask.sum())}/{len(mask)} max_ci_width={width:.4g}")
+        if target_width is None or width < target_width or frac >= 1.0:
+            return est
+        frac = min(1.0, 2.0 * frac)
+
+
+# ---------------------------
+# Exact-value cache + report
+# ---------------------------
+
+def source_stamp(path: str | Path) -> str:
+    st = Path(path).stat()
+    return f"{Path(path).resolve()}|{st.st_size}|{st.st_mtime_ns}"
+
+
+class ExactCache:
+    """{key: {group: {metric: value}}} JSON file; key = tool | input stamp | config (path None: disabled)."""
+
+    def __init__(self, path: Optional[str | Path] = None):
+        self.path = Path(path) if path else None
+        self.data: Dict[str, Any] = {}
+        if self.path is not None and self.path.exists():
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @staticmethod
+    def key(tool: str, source: str | Path, config: str) -> str:
+        return f"{tool}|{source_stamp(source)}|{config}"
+
+    def get(self, key: str) -> Optional[Dict[str, Dict[str, float]]]:
+        hit = self.data.get(key)
+        return hit["values"] if hit else None
+
+    def put(self, key: str, values: Dict[str, Dict[str, float]]) -> None:
+        if self.path is None:
+            return
+        self.data[key] = {"stored_at": iso_now_local(), "values": values}
+        ensure_dir(self.path.parent)
+        self.path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def exact_values(group_names: Sequence[str], metrics: Sequence[str], means: np.ndarray) -> Dict[str, Dict[str, float]]:
+    """(G+1, K) exact means (groups then POOLED) -> cache payload."""
+    names = list(group_names) + [POOLED]
+    return {g: {m: float(means[i, j]) for j, m in enumerate(metrics)} for i, g in enumerate(names)}
+
+
+def group_means(group_codes: np.ndarray, n_groups: int, values: np.ndarray) -> np.ndarray:
+    """Exact per-group and pooled means of full-corpus values -> (G+1, K)."""
+    Y = np.asarray(values, dtype=np.float64).reshape(len(group_codes), -1)
+    s = np.zeros((n_groups + 1, Y.shape[1]))
+    np.add.at(s, group_codes, Y)
+    s[n_groups] = Y.sum(axis=0)
+    cnt = np.bincount(group_codes, minlength=n_groups + 1).astype(np.float64)
+    cnt[n_groups] = len(group_codes)
+    return s / np.maximum(cnt, 1)[:, None]
+
+
+def preview_report(
+    est: Estimates,
+    exact: Optional[Dict[str, Dict[str, float]]] = None,
+    z: float = Z_95,
+    decimals: int = 6,
+) -> Dict[str, Any]:
+    lo, hi = est.ci(z)
+    out: Dict[str, Any] = {}
+    covered = total = 0
+    for i, g in enumerate(est.groups):
+        rows: Dict[str, Any] = {}
+        for j, m in enumerate(est.metrics):
+            r: Dict[str, Any] = {
+                "estimate": round(float(est.mean[i, j]), decimals),
+                "ci_lo": round(float(lo[i, j]), decimals),
+                "ci_hi": round(float(hi[i, j]), decimals),
+            }
+            ex = (exact or {}).get(g, {}).get(m)
+            if ex is not None:
+                r["exact"] = round(ex, decimals)
+                r["error"] = round(float(est.mean[i, j]) - ex, decimals) + 0.0
+                r["covered"] = bool(lo[i, j] - 1e-12 <= ex <= hi[i, j] + 1e-12)
+                covered += r["covered"]
+                total += 1
+            rows[m] = r
+        out[g] = {"n_sample": int(est.n_sample[i]), "n_rows": int(est.n_rows[i]), "metrics": rows}
+    return {
+        "frac": est.frac,
+        "confidence_z": z,
+        "max_ci_width": est.max_width(z),
+        "max_ci_width_pooled": est.max_width(z, [POOLED]),
+        "exact_cached": exact is not None,
+        "coverage": (round(covered / total, 4) if total else None),
+        "groups": out,
+        "nk_ops_preview_version": NK_OPS_PREVIEW_VERSION,
+    }
+
+
+def print_pooled(report: Dict[str, Any], limit: int = 20) -> None:
+    g = report["groups"][POOLED]
+    print(f"[PREVIEW] frac={report['frac']:.4g} sampled={g['n_sample']}/{g['n_rows']} "
+          f"max_ci_width(pooled)={report['max_ci_width_pooled']:.4g}"
+          + (f" coverage_vs_exact={report['coverage']}" if report["exact_cached"] else " (no cached exact values)"))
+    for m, r in list(g["metrics"].items())[:limit]:
+        ex = f"  exact={r['exact']:.6g} err={r['error']:+.3g}" if "exact" in r else ""
+        print(f"  {m:24s} {r['estimate']:.6g}  [{r['ci_lo']:.6g}, {r['ci_hi']:.6g}]{ex}")
+
+
+def add_preview_args(ap: Any, dash: str = "_") -> None:
+    """--preview / --preview_width / --preview_seed (dash='-' for Phase-3 style flags)."""
+    ap.add_argument("--preview", type=float, default=0.0,
+                    help="Preview: estimate from a stratified (author x sure) sample of this fraction, with 95%% CIs")
+    ap.add_argument(f"--preview{dash}width", type=float, default=None,
+                    help="Preview: double the fraction until every pooled CI is narrower than this")
+    ap.add_argument(f"--preview{dash}seed", type=int, default=0, help="Preview: sampling seed")
+    ap.add_argument(f"--preview{dash}cache", default="",
+                    help="Exact-value cache JSON (opt-in): full runs store exact values, previews compare against them")
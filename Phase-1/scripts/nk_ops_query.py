@@ -0,0 +1,435 @@
+# nk_ops_query.py
+# NK-Ops — lazy query API over the corpus, the divergence index and the Phase-3 gate
+# v0.1 (utility module; keep deterministic)
+#
+# For notebooks and small scripts: build a plan, execute only when a result is asked for,
+# and read only what the question needs.
+#
+#   from nk_ops_query import Corpus
+#   nk = Corpus.open(segments="tags_all.csv", index="results/divergence_index.npz",
+#                    scores="scores/phase3_4b_abl_vs_dat_v2.csv")
+#   q = nk.authors(["diyanet", "elmalili"]).sures(2, 8)
+#   q.stress(0.8).divergence_rate("silence")        # divergence index only (no CSV parse)
+#   q.tau_shares(); q.operator_avg()                # ONE pass over segments, shared
+#   q.gate(theta_on=1.3).decisions_by_class()       # streams the 4B table, gate per signature
+#   print(q.explain())
+#
+# Plans are immutable; each builder call returns a new Query. Consecutive filters fuse
+# (authors(...).authors(...) intersects, sures(...).sures(...) intersects) into one
+# predicate applied where the data is read:
+#   - segments CSV: only the author / sure / operator columns are parsed (usecols), rows are
+#     filtered chunk by chunk before anything else; parquet gets the predicate as reader
+#     filters (pyarrow)
+#   - divergence index: author / stress / response select bitmaps, sures become a position
+#     mask; nothing else is loaded
+#   - gate scores table: rows are filtered while streaming, before gate inputs are built;
+#     the gate runs once per distinct input signature
+# Aggregates over the same selection share one pass and are cached per plan on the
+# Corpus (tau_shares() then operator_avg() reads the segments once).
+
+from __future__ import annotations
+
+import csv
+import sys
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nk_ops_corpus import _read_kwargs, detect_author_col, read_with_fallback, sniff_format
+from nk_ops_divergence_index import N_AYETS, SURE_OFFSETS, DivergenceIndex, stress_key
+from nk_ops_signature import SignatureIndex
+from nk_ops_tau import dedup_classify, load_rules
+from nk_ops_utils import OP_KEYS, TAU_ORDER, open_any, strip_compression_suffix
+
+NK_OPS_QUERY_VERSION = "0.1.0"
+
+_CHUNK_ROWS = 250_000
+
+# the Phase-3 gate lives in Phase-3/scripts; imported on first .gate() execution
+_PHASE3_SCRIPTS = Path(__file__).resolve().parents[2] / "Phase-3" / "scripts"
+
+
+def _gate_module():
+    if str(_PHASE3_SCRIPTS) not in sys.path:
+        sys.path.insert(0, str(_PHASE3_SCRIPTS))
+    import nk_phase3c_decision_gate_public as gate
+    return gate
+
+
+def _sure_ids(spec: Iterable[Any]) -> FrozenSet[int]:
+    out = set()
+    for s in spec:
+        if isinstance(s, range):
+            out.update(s)
+        elif isinstance(s, (list, tuple, set, frozenset)):
+            out.update(_sure_ids(s))
+        else:
+            out.add(int(s))
+    bad = sorted(s for s in out if not 1 <= s <= len(SURE_OFFSETS) - 1)
+    if bad:
+        raise RuntimeError(f"sure ids out of range 1..{len(SURE_OFFSETS) - 1}: {bad}")
+    return frozenset(out)
+
+
+@dataclass(frozen=True)
+class Plan:
+    authors: Optional[FrozenSet[str]] = None
+    sures: Optional[FrozenSet[int]] = None
+    stress: Optional[str] = None
+    ops: Optional[Tuple[str, ...]] = None
+    rules: Optional[str] = None             # tau rules JSON path (None: DEFAULT_RULES)
+    gate: Optional[Tuple[Tuple[str, float], ...]] = None   # Params overrides
+    steps: int = 12
+
+    def describe(self) -> List[str]:
+        out = []
+        if self.authors is not None:
+            out.append(f"author in {sorted(self.authors)}")
+        if self.sures is not None:
+            out.append(f"sure in {sorted(self.sures)}")
+        if self.stress is not None:
+            out.append(f"stress = {self.stress} (divergence index only)")
+        return out or ["(no filter)"]
+
+
+@dataclass
+class Corpus:
+    """Data sources (any may be None) + per-plan result cache. Use Corpus.open(...)."""
+    segments: Optional[Path] = None     # per-segment operator counts (tagger output)
+    index: Optional[Path] = None        # nk_ops_divergence_index .npz
+    scores: Optional[Path] = None       # Phase-3B/4B v2 table (gate input)
+    author_col: str = ""
+    _cache: Dict[Any, Any] = field(default_factory=dict, repr=False)
+    _div: Optional[DivergenceIndex] = field(default=None, repr=False)
+
+    @classmethod
+    def open(
+        cls,
+        segments: Optional[str | Path] = None,
+        index: Optional[str | Path] = None,
+        scores: Optional[str | Path] = None,
+        author_col: str = "",
+    ) -> "Query":
+        """Register sources (nothing is read yet) and return the root query."""
+        srcs = {k: (Path(v) if v else None) for k, v in (("segments", segments), ("index", index), ("scores", scores))}
+        for k, p in srcs.items():
+            if p is not None and not p.exists():
+                raise RuntimeError(f"{k} source not found: {p}")
+        if not any(srcs.values()):
+            raise RuntimeError("Corpus.open needs at least one of segments=, index=, scores=")
+        return Query(cls(author_col=author_col, **srcs), Plan())
+
+    def divergence(self) -> DivergenceIndex:
+        if self.index is None:
+            raise RuntimeError("no divergence index: Corpus.open(index=...)")
+        if self._div is None:
+            self._div = DivergenceIndex.load(self.index)
+        return self._div
+
+
+@dataclass(frozen=True)
+class Query:
+    corpus: Corpus
+    plan: Plan
+
+    # ---------------------------
+    # Builders (lazy)
+    # ---------------------------
+
+    def authors(self, names: Iterable[str]) -> "Query":
+        sel = frozenset(str(a) for a in ([names] if isinstance(names, str) else names))
+        cur = self.plan.authors
+        return replace(self, plan=replace(self.plan, authors=sel if cur is None else cur & sel))
+
+    def sures(self, *ids: Any) -> "Query":
+        """sures(2, 8) -> sures 2 and 8; sures(range(2, 9)) -> 2..8."""
+        sel = _sure_ids(ids)
+        cur = self.plan.sures
+        return replace(self, plan=replace(self.plan, sures=sel if cur is None else cur & sel))
+
+    def stress(self, s: Any) -> "Query":
+        return replace(self, plan=replace(self.plan, stress=stress_key(s)))
+
+    def ops(self, names: Sequence[str]) -> "Query":
+        return replace(self, plan=replace(self.plan, ops=tuple(names)))
+
+    def rules(self, path: Optional[str | Path]) -> "Query":
+        return replace(self, plan=replace(self.plan, rules=str(path) if path else None))
+
+    def gate(self, steps: int = 12, **params: float) -> "Query":
+        """Gate parameters (Params field names, e.g. theta_on=1.3); defaults = the gate's."""
+        return replace(self, plan=replace(self.plan, gate=tuple(sorted(params.items())), steps=steps))
+
+    def explain(self) -> str:
+        c, p = self.corpus, self.plan
+        lines = [f"NK-Ops query plan (v{NK_OPS_QUERY_VERSION})", "  filter: " + " AND ".join(p.describe())]
+        if c.segments is not None:
+            lines.append(f"  segments: {c.segments} -> read [author, sure?, ops] chunked, filter per chunk; "
+                         "tau_shares/operator_avg/summary share one pass")
+        if c.index is not None:
+            lines.append(f"  divergence: {c.index} -> bitmaps for the selected (author, stress, response), "
+                         "sures as a position mask")
+        if c.scores is not None:
+            g = dict(p.gate or ())
+            lines.append(f"  gate: {c.scores} -> rows filtered while streaming; gate per distinct signature "
+                         f"(steps={p.steps}{', ' + str(g) if g else ''})")
+        return "\n".join(lines)
+
+    # ---------------------------
+    # Segments: tau + operator aggregates (one fused pass)
+    # ---------------------------
+
+    def _segment_columns(self) -> Tuple[str, List[str], List[str]]:
+        c = self.corpus
+        if c.segments is None:
+            raise RuntimeError("no segments table: Corpus.open(segments=...)")
+        fmt = self._segments_format()
+        author_col = c.author_col or (detect_author_col(c.segments, fmt) if fmt is not None else "author")
+        columns = fmt.columns if fmt is not None else _table_columns(c.segments)
+        ops = list(self.plan.ops) if self.plan.ops else [k for k in OP_KEYS if k in columns]
+        if not ops:
+            raise RuntimeError(f"no operator columns in {c.segments}")
+        need = [author_col] + (["sure"] if self.plan.sures is not None else []) + ops
+        missing = [x for x in need if x not in columns]
+        if missing:
+            raise RuntimeError(f"{c.segments}: missing columns {missing}")
+        return author_col, ops, need
+
+    def _segments_format(self):
+        seg = self.corpus.segments
+        if strip_compression_suffix(seg).suffix.lower() in (".parquet", ".feather"):
+            return None
+        return sniff_format(seg)
+
+    def _scan_segments(self, author_col: str, need: List[str], fmt=None) -> Iterator[pd.DataFrame]:
+        """Filtered chunks of the segments table (only `need` columns are read)."""
+        seg, p = self.corpus.segments, self.plan
+        suffix = strip_compression_suffix(seg).suffix.lower()
+        if suffix == ".parquet":
+            filters = []
+            if p.authors is not None:
+                filters.append((author_col, "in", sorted(p.authors)))
+            if p.sures is not None:
+                filters.append(("sure", "in", sorted(p.sures)))
+            yield pd.read_parquet(seg, columns=need, filters=filters or None)
+            return
+        if suffix == ".feather":
+            chunks: Iterable[pd.DataFrame] = [pd.read_feather(seg, columns=need)]
+        else:
+            # default numeric parsing (C fast path); blanks become NaN and are filled per pass
+            chunks = pd.read_csv(seg, usecols=need, dtype={author_col: "category"},
+                                 chunksize=_CHUNK_ROWS, **_read_kwargs(fmt))
+        for ch in chunks:
+            mask = np.ones(len(ch), dtype=bool)
+            if p.authors is not None:
+                mask &= ch[author_col].astype(str).isin(p.authors).to_numpy()
+            if p.sures is not None:
+                mask &= ch["sure"].isin(p.sures).fillna(False).to_numpy(dtype=bool)
+            if mask.any():
+                yield ch[mask]
+
+    def _segment_pass(self) -> Dict[str, Any]:
+        """tau counts + operator totals per author, one read of the segments."""
+        key = ("segments", self.plan.authors, self.plan.sures, self.plan.ops, self.plan.rules)
+        if key in self.corpus._cache:
+            return self.corpus._cache[key]
+        author_col, ops, need = self._segment_columns()
+        rules = load_rules(self.plan.rules)
+        core = [o for o in ops if o in OP_KEYS] or ops
+        fmt = self._segments_format()
+
+        def scan():
+            authors: Dict[str, int] = {}
+            tau = np.zeros((0, len(TAU_ORDER)), dtype=np.int64)
+            totals = np.zeros((0, len(ops)), dtype=np.int64)
+            for ch in self._scan_segments(author_col, need, fmt):
+                names = ch[author_col].astype(str).to_numpy()
+                codes, uniq = pd.factorize(names)
+                gid = np.asarray([authors.setdefault(u, len(authors)) for u in uniq], dtype=np.int64)[codes]
+                if len(authors) > len(tau):
+                    tau = np.vstack([tau, np.zeros((len(authors) - len(tau), len(TAU_ORDER)), dtype=np.int64)])
+                    totals = np.vstack([totals, np.zeros((len(authors) - len(totals), len(ops)), dtype=np.int64)])
+                X = ch[ops].fillna(0).to_numpy(dtype=np.int64)
+                res, _ = dedup_classify(X, ops, rules, core_ops=core)
+                np.add.at(tau, (gid, res.tau_idx.astype(np.int64)), 1)
+                np.add.at(totals, gid, X)
+            return authors, tau, totals
+
+        # a decode error past the sniffed sample restarts the pass with the fallback encoding
+        authors, tau, totals = scan() if fmt is None else read_with_fallback(fmt, scan)
+        order = sorted(authors)
+        rows = np.asarray([authors[a] for a in order], dtype=np.int64)
+        out = {"authors": order, "ops": ops,
+               "tau": tau[rows] if len(rows) else tau, "totals": totals[rows] if len(rows) else totals}
+        self.corpus._cache[key] = out
+        return out
+
+    def _per_author_frame(self, values: np.ndarray, cols: List[str], n: np.ndarray, authors: List[str]) -> pd.DataFrame:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shares = np.where(n[:, None] > 0, values / np.maximum(n, 1)[:, None], 0.0)
+            pooled = values.sum(axis=0) / max(int(n.sum()), 1)
+        df = pd.DataFrame(shares, columns=cols)
+        df.insert(0, "rows", n)
+        df.insert(0, "author", authors)
+        all_row = pd.DataFrame([[ "ALL", int(n.sum()), *pooled.tolist()]], columns=df.columns)
+        return pd.concat([df, all_row], ignore_index=True)
+
+    def tau_shares(self) -> pd.DataFrame:
+        """Per author (+ "ALL"): rows and tau_<code> shares, TAU_ORDER columns."""
+        r = self._segment_pass()
+        n = r["tau"].sum(axis=1)
+        return self._per_author_frame(r["tau"], [f"tau_{t}" for t in TAU_ORDER], n, r["authors"])
+
+    def operator_avg(self) -> pd.DataFrame:
+        """Per author (+ "ALL"): rows and avg_<op> (operator count per segment)."""
+        r = self._segment_pass()
+        n = r["tau"].sum(axis=1)
+        return self._per_author_frame(r["totals"], [f"avg_{o}" for o in r["ops"]], n, r["authors"])
+
+    def summary(self) -> Dict[str, Any]:
+        """Pooled tau counts / shares and operator totals / averages of the selection."""
+        r = self._segment_pass()
+        tau = r["tau"].sum(axis=0)
+        totals = r["totals"].sum(axis=0)
+        n = int(tau.sum())
+        return {
+            "rows": n,
+            "authors": r["authors"],
+            "filter": self.plan.describe(),
+            "tau_counts": {t: int(v) for t, v in zip(TAU_ORDER, tau.tolist()) if v},
+            "tau_shares": {t: (int(v) / n if n else 0.0) for t, v in zip(TAU_ORDER, tau.tolist()) if v},
+            "operator_totals": {o: int(v) for o, v in zip(r["ops"], totals.tolist())},
+            "operator_avg_per_row": {o: (int(v) / n if n else 0.0) for o, v in zip(r["ops"], totals.tolist())},
+        }
+
+    # ---------------------------
+    # Divergence index
+    # ---------------------------
+
+    def _position_mask(self) -> np.ndarray:
+        if self.plan.sures is None:
+            return np.ones(N_AYETS, dtype=bool)
+        m = np.zeros(N_AYETS, dtype=bool)
+        for s in self.plan.sures:
+            m[SURE_OFFSETS[s - 1]:SURE_OFFSETS[s]] = True
+        return m
+
+    def divergence_rate(self, response: str) -> pd.DataFrame:
+        """Per author and stress: divergent ayets / ayets in the selected sures."""
+        idx = self.corpus.divergence()
+        if response not in idx.responses:
+            raise RuntimeError(f"response '{response}' not in index. Available: {idx.responses}")
+        if self.plan.stress is not None and self.plan.stress not in idx.stresses:
+            raise RuntimeError(f"stress {self.plan.stress} not in index. Available: {idx.stresses}")
+        authors = sorted(self.plan.authors & set(idx.authors)) if self.plan.authors is not None else idx.authors
+        stresses = [self.plan.stress] if self.plan.stress is not None else idx.stresses
+        mask = self._position_mask()
+        n_ayets = int(mask.sum())
+        rows = []
+        for st in stresses:
+            for a in authors:
+                k = int(idx.get(a, st, response).bools()[mask].sum())
+                rows.append((a, st, response, n_ayets, k, k / n_ayets if n_ayets else 0.0))
+        return pd.DataFrame(rows, columns=["author", "stress", "response", "n_ayets", "divergent", "rate"])
+
+    # ---------------------------
+    # Phase-3 gate
+    # ---------------------------
+
+    def _gate_params(self):
+        gate = _gate_module()
+        return gate, gate.Params(**dict(self.plan.gate or ()))
+
+    def _gate_inputs(self):
+        """Gate inputs of the selected rows (filtered while streaming, gate dedup semantics)."""
+        key = ("gate_inputs", self.plan.authors, self.plan.sures)
+        if key in self.corpus._cache:
+            return self.corpus._cache[key]
+        if self.corpus.scores is None:
+            raise RuntimeError("no gate scores table: Corpus.open(scores=...)")
+        gate = _gate_module()
+        path = self.corpus.scores
+        p = self.plan
+        with open_any(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+            reader = csv.reader(f, delimiter=gate.sniff_delim(path))
+            fields = next(reader, [])
+            col_seg = gate.pick_col(fields, ["segment_id", "id", "seg_id", "segment"]) or "segment_id"
+            col_meal = gate.pick_col(fields, ["meal_slug", "author", "score_author"]) or "meal_slug"
+            col_sure = gate.pick_col(fields, ["sure", "score_sure"]) or gate.pick_col_regex(fields, r"\bsure\b") or "sure"
+            i_seg, i_meal, i_sure = (fields.index(c) if c in fields else -1 for c in (col_seg, col_meal, col_sure))
+            nf = len(fields)
+            rows: List[Dict[str, str]] = []
+            seen = set()
+            for r in reader:
+                if len(r) < nf:
+                    r = r + [""] * (nf - len(r))
+                seg = r[i_seg].strip() if i_seg >= 0 else ""
+                if not seg or seg in seen:
+                    continue
+                # first row per segment_id decides (as in the gate), then the filter applies
+                seen.add(seg)
+                if p.authors is not None and (r[i_meal].strip() if i_meal >= 0 else "") not in p.authors:
+                    continue
+                if p.sures is not None:
+                    # unparseable / nan / inf sure: not in any selection (never an error)
+                    sv = gate.to_float(r[i_sure] if i_sure >= 0 else "", np.nan)
+                    if not np.isfinite(sv) or int(sv) not in p.sures:
+                        continue
+                rows.append(dict(zip(fields, r)))
+        inp = gate.inputs_from_rows(rows, fields)
+        self.corpus._cache[key] = inp
+        return inp
+
+    def _gate_final(self) -> Tuple[Any, np.ndarray, np.ndarray]:
+        """(inputs, Pi_final, D_final) per selected segment."""
+        key = ("gate", self.plan.authors, self.plan.sures, self.plan.gate, self.plan.steps)
+        if key in self.corpus._cache:
+            return self.corpus._cache[key]
+        gate, params = self._gate_params()
+        inp = self._gate_inputs()
+        sA, gT = inp.gates()
+        index = SignatureIndex.build([inp.A0, inp.T0, inp.cond, sA, gT])
+        res = gate.run_dynamics(*index.unique_columns(), params, self.plan.steps)
+        out = (inp, index.broadcast(res["Pi"]), index.broadcast(res["D"]))
+        self.corpus._cache[key] = out
+        return out
+
+    def decisions(self) -> pd.DataFrame:
+        """Per selected segment: ids, class, Pi_final, D_final."""
+        inp, Pi, D = self._gate_final()
+        return pd.DataFrame({"segment_id": inp.seg, "meal_slug": inp.meal, "sure": inp.sure, "ayet": inp.ayet,
+                             "class": inp.cls, "Pi_final": Pi, "D_final": D})
+
+    def _decisions_by(self, labels: Sequence[str], name: str) -> pd.DataFrame:
+        _, _, D = self._gate_final()
+        lab = np.asarray(labels, dtype=object)
+        rows = []
+        for g in sorted(set(labels)):
+            sel = lab == g
+            n = int(sel.sum())
+            d = int(D[sel].sum())
+            rows.append((g, n, d, d / n if n else 0.0))
+        return pd.DataFrame(rows, columns=[name, "n_segments", "decisions", "decision_rate"])
+
+    def decisions_by_class(self) -> pd.DataFrame:
+        inp, _, _ = self._gate_final()
+        return self._decisions_by(inp.cls, "class")
+
+    def decisions_by_author(self) -> pd.DataFrame:
+        inp, _, _ = self._gate_final()
+        return self._decisions_by(inp.meal, "meal_slug")
+
+
+def _table_columns(path: Path) -> List[str]:
+    """Column names of a parquet / feather table (schema only)."""
+    try:
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+    except ImportError as ex:
+        raise RuntimeError(f"parquet / feather segments need pyarrow: {ex}") from ex
+    if path.suffix.lower() == ".parquet":
+        return list(pq.read_schema(path).names)
+    return list(feather.read_table(path, memory_map=True).schema.names)
@@ -0,0 +1,95 @@
+# nk_ops_reduce.py
+# NK-Ops — deterministic reductions (parallel work, serial-identical bytes)
+# v0.1 (utility module; keep deterministic)
+#
+# Parallel paths may finish in any order; outputs must not depend on it:
+#   - ordered_map: work runs on N workers, results come back in INPUT order; callers
+#     combine them in that fixed order, never in completion order
+#   - rank_order: sort with an explicit tie-break (label), NaN last
+#   - sha256_file / digest_tree / diff_digests: streaming digests of output files, used by
+#     the serial-vs-parallel verify modes
+# Timestamps written into outputs follow SOURCE_DATE_EPOCH when it is set
+# (nk_ops_utils.iso_now_local), so two verify runs can match byte for byte.
+
+from __future__ import annotations
+
+import hashlib
+import math
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+NK_OPS_REDUCE_VERSION = "0.1.0"
+
+
+def ordered_map(
+    fn: Callable[[T], R],
+    items: Sequence[T],
+    workers: int = 1,
+    processes: bool = False,
+) -> List[R]:
+    """fn over items on `workers` threads (or processes); results in input order."""
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [fn(x) for x in items]
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=min(workers, len(items))) as ex:
+        # map() yields in submission order regardless of which worker finishes first
+        return list(ex.map(fn, items))
+
+
+def rank_order(
+    labels: Sequence[str],
+    values: Sequence[float],
+    descending: bool = True,
+) -> List[int]:
+    """Positions sorted by value (ties: label ascending; NaN last)."""
+    def key(i: int) -> Tuple[int, float, str]:
+        v = float(values[i])
+        if math.isnan(v):
+            return (1, 0.0, str(labels[i]))
+        return (0, -v if descending else v, str(labels[i]))
+    return sorted(range(len(labels)), key=key)
+
+
+# ---------------------------
+# Output digests
+# ---------------------------
+
+def sha256_file(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def digest_tree(root: str | Path, exclude: Sequence[str] = ()) -> Dict[str, str]:
+    """{relative posix path: sha256} for every file under root (sorted by path)."""
+    root = Path(root)
+    out: Dict[str, str] = {}
+    for p in sorted(root.rglob("*")):
+        if not p.is_file():
+            continue
+        rel = p.relative_to(root).as_posix()
+        if any(rel == e or rel.startswith(e.rstrip("/") + "/") for e in exclude):
+            continue
+        out[rel] = sha256_file(p)
+    return out
+
+
+def diff_digests(a: Dict[str, str], b: Dict[str, str]) -> Dict[str, Any]:
+    """Compare two digest maps: files only in one side, and files whose bytes differ."""
+    only_a = sorted(set(a) - set(b))
+    only_b = sorted(set(b) - set(a))
+    differ = sorted(k for k in set(a) & set(b) if a[k] != b[k])
+    return {
+        "identical": not (only_a or only_b or differ),
+        "files_compared": len(set(a) & set(b)),
+        "only_serial": only_a,
+        "only_parallel": only_b,
+        "differ": differ,
+    }
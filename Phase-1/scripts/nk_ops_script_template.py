@@ -7,7 +7,8 @@ Inputs:
     CSV with at least: <COLUMNS>
 
 Outputs:
-    <FILES>
+    <OUTPUT_NAME>.csv            (input columns + operator counts + tau / noise_reason / msv_A..C)
+    <OUTPUT_NAME>_summary.json   (build_summary schema)
 
 Run:
     python scripts/nk_ops_<NAME>.py --csv <PATH> --outdir <DIR> --msv_version 0.1.3
@@ -25,10 +26,12 @@ import json
 import os
 import sys
 from dataclasses import dataclass
-from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+from nk_ops_tagger import load_adapter, merge_counts, tag_segments
+from nk_ops_tau import dedup_classify, load_rules, summarize
+
 
 def eprint(msg: str) -> None:
     sys.stderr.write(msg + "\n")
@@ -39,10 +42,6 @@ def log(prefix: str, msg: str, quiet: bool = False) -> None:
         print(f"[{prefix}] {msg}")
 
 
-def iso_now() -> str:
-    return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
-
-
 def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
@@ -75,6 +74,9 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument("--config", default=None, help="Optional config JSON")
     ap.add_argument("--text_col", default="text", help="Text column name")
     ap.add_argument("--sep", default=None, help="CSV separator override")
+    ap.add_argument("--adapter", default=None, help="Operator adapter JSON (default: built-in 'tr')")
+    ap.add_argument("--rules", default=None, help="Tau rules JSON (default: built-in, see nk_ops_tau.py)")
+    ap.add_argument("--workers", type=int, default=1, help="Worker processes for operator tagging")
     ap.add_argument("--quiet", action="store_true")
     ap.add_argument("--debug", action="store_true")
     return ap.parse_args()
@@ -96,17 +98,31 @@ def main() -> int:
 
         log("OK", f"rows={len(rows)} sep={sep_detected} text_col='{args.text_col}' msv_version={args.msv_version}", args.quiet)
 
-        # TODO: call NK-Ops/MSV core here and produce per-row outputs
-
-        # Example: summary stub
-        summary = {
-            "rows": len(rows),
-            "msv_version": args.msv_version,
-            "source_file": str(csv_path),
-            "sep_detected": sep_detected,
-            "text_col": args.text_col,
-            "generated_at": iso_now(),
-        }
+        # Operator tagging (one count column per operator, ready for build_summary)
+        adapter = load_adapter(args.adapter)
+        counts, ops = tag_segments([r[args.text_col] for r in rows], adapter, workers=args.workers)
+        merge_counts(rows, counts, ops)
+
+        # MSV / tau core (classified once per distinct operator-count row)
+        rules = load_rules(args.rules)
+        res, index = dedup_classify(counts, ops, rules)
+        log("INFO", index.describe(), args.quiet)
+        for r, t, nr, m in zip(rows, res.tau.tolist(), res.noise_reason.tolist(), res.msv.tolist()):
+            r["tau"] = t
+            r["noise_reason"] = nr
+            r["msv_A"], r["msv_B"], r["msv_C"] = (f"{v:.6f}" for v in m)
+
+        out_csv = outdir / f"<OUTPUT_NAME>.csv"
+        with out_csv.open("w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            w.writeheader()
+            w.writerows(rows)
+        log("WROTE", str(out_csv), args.quiet)
+
+        summary = summarize(res, counts, ops, source_file=str(csv_path), msv_version=args.msv_version,
+                            extra={"sep_detected": sep_detected, "text_col": args.text_col,
+                                   "adapter": f"{adapter['name']}-{adapter['version']}",
+                                   "tau_rules_version": rules["version"]})
 
         summary_path = outdir / f"<OUTPUT_NAME>_summary.json"
         write_json(summary_path, summary)
@@ -0,0 +1,131 @@
+# nk_ops_signature.py
+# NK-Ops — signature index (evaluate each distinct input tuple once, broadcast back)
+# v0.1 (utility module; keep deterministic)
+#
+# Tau assignment, MSV components and the Phase-3C gate are pure functions of a few
+# per-segment inputs (operator counts; A0/T0/cond/class). Many segments share the exact
+# same inputs, so the work only has to be done per distinct signature:
+#   idx = SignatureIndex.build([A0, T0, cond, cls])
+#   out_unique = f(*idx.unique_columns())          # one evaluation per signature
+#   out = idx.broadcast(out_unique)                # back to segment order
+# Signatures are exact (no rounding): floats compare by bit pattern (-0.0 and 0.0 differ,
+# all NaNs are one value), strings by equality.
+# Unique signatures are numbered in first-appearance order, so results never depend on
+# sort order of the keys.
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+
+def _codes(col: Any) -> np.ndarray:
+    """Non-negative int64 codes of one column (equal values <-> equal code)."""
+    a = np.asarray(col)
+    if a.ndim != 1:
+        raise RuntimeError(f"signature columns must be 1-D, got shape {a.shape}")
+    if a.dtype.kind in "iub" and len(a):
+        # small-range integers (operator counts, flags): offset codes, no sort needed
+        lo, hi = int(a.min()), int(a.max())
+        if hi - lo < 4 * len(a) + 16:
+            return a.astype(np.int64) - lo
+    if a.dtype.kind == "f" and a.dtype.itemsize in (2, 4, 8):
+        # raw bits, so -0.0 keeps its own signature (the gate writes "-0.000000" for it);
+        # only NaN payloads are made canonical
+        a = np.ascontiguousarray(np.where(np.isnan(a), np.nan, a).astype(a.dtype))
+        a = a.view(f"i{a.dtype.itemsize}")
+    if a.dtype.kind == "O":
+        a = a.astype(str)
+    _, inv = np.unique(a, return_inverse=True)
+    return inv.astype(np.int64).ravel()
+
+
+def _combine(codes: Sequence[np.ndarray], n: int) -> np.ndarray:
+    """Mixed-radix key over per-column codes; re-densified whenever it would overflow int64."""
+    key = np.zeros(n, dtype=np.int64)
+    for c in codes:
+        radix = int(c.max()) + 1 if len(c) else 1
+        if (int(key.max()) + 1 if n else 1) * radix >= 2 ** 62:
+            _, key = np.unique(key, return_inverse=True)
+            key = key.astype(np.int64).ravel()
+        key = key * radix + c
+    return key
+
+
+@dataclass
+class SignatureIndex:
+    first: np.ndarray       # (U,) row of the first segment with each signature
+    inverse: np.ndarray     # (n,) signature id per segment (0..U-1, first-appearance order)
+    counts: np.ndarray      # (U,) segments per signature
+    columns: List[Any]      # the original columns (for unique_columns)
+
+    @classmethod
+    def build(cls, columns: Sequence[Any]) -> "SignatureIndex":
+        cols = list(columns)
+        if not cols:
+            raise RuntimeError("signature needs at least one column")
+        n = len(cols[0])
+        for c in cols:
+            if len(c) != n:
+                raise RuntimeError("signature columns differ in length")
+        key = _combine([_codes(c) for c in cols], n)
+        _, first, inv = np.unique(key, return_index=True, return_inverse=True)
+        inv = inv.ravel()
+        # renumber by first appearance
+        order = np.argsort(first, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        inverse = rank[inv].astype(np.int64)
+        return cls(first=first[order].astype(np.int64), inverse=inverse,
+                   counts=np.bincount(inverse, minlength=len(order)), columns=cols)
+
+    @classmethod
+    def from_matrix(cls, X: np.ndarray) -> "SignatureIndex":
+        """Rows of a 2-D matrix as signatures (e.g. operator counts)."""
+        X = np.asarray(X)
+        return cls.build([X[:, j] for j in range(X.shape[1])] if X.ndim == 2 and X.shape[1] else [np.zeros(len(X))])
+
+    @classmethod
+    def identity(cls, n: int, columns: Sequence[Any] = ()) -> "SignatureIndex":
+        """No deduplication: every segment is its own signature."""
+        ar = np.arange(n, dtype=np.int64)
+        return cls(first=ar, inverse=ar.copy(), counts=np.ones(n, dtype=np.int64), columns=list(columns))
+
+    @property
+    def n_rows(self) -> int:
+        return int(len(self.inverse))
+
+    @property
+    def n_unique(self) -> int:
+        return int(len(self.first))
+
+    def unique_columns(self) -> List[Any]:
+        """Each input column restricted to one representative row per signature."""
+        out: List[Any] = []
+        for c in self.columns:
+            if isinstance(c, np.ndarray):
+                out.append(c[self.first])
+            else:
+                out.append([c[i] for i in self.first.tolist()])
+        return out
+
+    def broadcast(self, values: Any) -> Any:
+        """Per-signature values (first axis U) -> per-segment values (first axis n)."""
+        return np.asarray(values)[self.inverse]
+
+    def report(self) -> Dict[str, Any]:
+        n, u = self.n_rows, self.n_unique
+        return {
+            "rows": n,
+            "unique_signatures": u,
+            "dedup_ratio": round(n / u, 4) if u else None,
+            "work_saved": round(1.0 - u / n, 6) if n else 0.0,
+            "max_rows_per_signature": int(self.counts.max()) if u else 0,
+        }
+
+    def describe(self) -> str:
+        r = self.report()
+        return (f"signatures unique={r['unique_signatures']} rows={r['rows']} "
+                f"dedup={r['dedup_ratio']}x saved={r['work_saved']:.1%}")
@@ -17,6 +17,22 @@ This script is a *driver* that:
    - extreme_meals.json
    - extremes_table.md
 
+Parallel runs (--workers N):
+- per-author sweeps run N at a time; results are merged in author order (never in
+  completion order) and extremes break ties by author, so outputs are byte-identical
+  to --workers 1.
+- --verify_determinism runs the serial and the parallel sweep into
+  <outdir>/determinism_serial and <outdir>/determinism_parallel with a pinned
+  SOURCE_DATE_EPOCH, compares SHA-256 digests of every output file and writes
+  <outdir>/determinism_report.json (exit code 1 on any difference).
+
+Preview (--preview FRAC / --preview_width W / --preview_seed / --preview_cache PATH):
+- the flags (nk_ops_preview) are forwarded to every per-author nk_ops_author_sweep.py
+  call, only when given; each per-author summary is then a stratified-sample estimate,
+  and so are the aggregated tables and extremes built from them.
+- --preview_cache is one JSON file written by every per-author run, so it needs
+  --workers 1.
+
 Why this exists:
 - Your previous `nk_ops_pick_extremes.py` failed because the input index CSV
   didn't include tau shares. This driver makes the missing table on purpose.
@@ -32,65 +48,40 @@ import argparse
 import csv
 import json
 import os
+import re
+import shutil
 import subprocess
 import sys
+import time
 from dataclasses import dataclass
-from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Sequence, Tuple
 
 import pandas as pd
 
+from nk_ops_corpus import detect_author_col, scan_distinct, sniff_format
+from nk_ops_preview import add_preview_args
+from nk_ops_reduce import diff_digests, digest_tree, ordered_map, rank_order
+from nk_ops_table_io import frame_columns, with_suffix_format, write_table
+from nk_ops_utils import author_slug, iso_now_local
+
 
 # ----------------------------
 # Utilities
 # ----------------------------
 
-def _read_csv_safely(path: str) -> pd.DataFrame:
-    # pandas sep sniff + robust utf-8
-    for enc in ("utf-8", "utf-8-sig", "cp1254", "latin1"):
-        try:
-            return pd.read_csv(path, encoding=enc)
-        except Exception:
-            continue
-    # last resort
-    return pd.read_csv(path, encoding_errors="ignore")
-
-
-def _detect_author_col(df: pd.DataFrame) -> str:
-    candidates = ["author", "meal_slug", "translator", "meal", "source_author"]
-    for c in candidates:
-        if c in df.columns:
-            return c
-    # heuristic: first col that looks categorical (few uniques) and is str
-    obj_cols = [c for c in df.columns if df[c].dtype == "object"]
-    if not obj_cols:
-        raise RuntimeError("No string columns found to infer author column. Provide --author_col.")
-    # pick column with smallest unique count but >1
-    best = None
-    best_u = None
-    for c in obj_cols:
-        u = df[c].nunique(dropna=True)
-        if u > 1 and (best_u is None or u < best_u):
-            best = c
-            best_u = u
-    if best is None:
-        raise RuntimeError("Could not infer author column. Provide --author_col.")
-    return best
-
-
 def _slug(s: str) -> str:
-    # keep it filesystem-friendly but stable
-    s = str(s).strip()
-    s = s.replace("\\", "_").replace("/", "_").replace(" ", "_")
-    s = "".join(ch for ch in s if ch.isalnum() or ch in ("_", "-", "."))
-    return s[:120] if len(s) > 120 else s
+    # shared with nk_ops_pick_extremes (bootstrap rows are matched on the same key)
+    return author_slug(s)
 
 
-def _find_latest_summary(outdir: Path, author_slug: str) -> Path:
+def _find_latest_summary(outdir: Path, author_slug: str, other_slugs: Sequence[str] = ()) -> Path:
     """
     Try hard to find the per-author summary json written by nk_ops_author_sweep.py.
-    We search a few patterns and pick the newest by mtime.
+    We search a few patterns and pick the newest by mtime (ties: by name).
+    The slug must appear as a whole token of the file name ("e" does not match
+    "author_sweep_x_summary.json"), and files of a longer author slug containing this one
+    ("ali" vs "ali_bulac") are skipped: with concurrent sweeps "newest" is not "ours".
     """
     patterns = [
         f"*{author_slug}*_summary.json",
@@ -101,9 +92,12 @@ def _find_latest_summary(outdir: Path, author_slug: str) -> Path:
     hits: List[Path] = []
     for pat in patterns:
         hits.extend(outdir.glob(pat))
+    token = re.compile(r"(?<![^\W_])" + re.escape(author_slug) + r"(?![^\W_])")
+    longer = [s for s in other_slugs if s != author_slug and author_slug in s]
+    hits = [p for p in set(hits) if token.search(p.name) and not any(s in p.name for s in longer)]
     if not hits:
         raise RuntimeError(f"Summary JSON not found for author='{author_slug}'. Looked for: {patterns}")
-    hits.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    hits.sort(key=lambda p: (p.stat().st_mtime, p.name), reverse=True)
     return hits[0]
 
 
@@ -115,6 +109,7 @@ def _run_author_sweep(
     outdir: Path,
     msv_version: str,
     extra_args: List[str],
+    other_slugs: Sequence[str] = (),
 ) -> Path:
     """
     Calls `nk_ops_author_sweep.py` for one author.
@@ -148,7 +143,21 @@ def _run_author_sweep(
         raise RuntimeError(msg)
 
     # locate summary json
-    return _find_latest_summary(outdir, author_slug)
+    return _find_latest_summary(outdir, author_slug, other_slugs)
+
+
+def _preview_args(args: argparse.Namespace) -> List[str]:
+    """Preview flags to forward to nk_ops_author_sweep.py (only those given)."""
+    out: List[str] = []
+    if args.preview:
+        out += ["--preview", str(args.preview)]
+    if args.preview_width is not None:
+        out += ["--preview_width", str(args.preview_width)]
+    if out and args.preview_seed:
+        out += ["--preview_seed", str(args.preview_seed)]
+    if args.preview_cache:
+        out += ["--preview_cache", str(args.preview_cache)]
+    return out
 
 
 # ----------------------------
@@ -164,9 +173,12 @@ class ExtremeItem:
 
 def _top_bottom(df: pd.DataFrame, metric: str, topk: int) -> ExtremeItem:
     s = df[["author", metric]].dropna()
-    s = s.sort_values(metric, ascending=False)
-    top = list(zip(s["author"].head(topk).tolist(), s[metric].head(topk).astype(float).tolist()))
-    bottom = list(zip(s["author"].tail(topk).tolist(), s[metric].tail(topk).astype(float).tolist()))
+    authors = s["author"].astype(str).tolist()
+    values = s[metric].astype(float).tolist()
+    # descending by value, ties by author: same ranking however the rows were produced
+    ranked = [(authors[i], values[i]) for i in rank_order(authors, values, descending=True)]
+    top = ranked[:topk]
+    bottom = ranked[-topk:] if topk > 0 else []
     return ExtremeItem(metric=metric, top=top, bottom=bottom)
 
 
@@ -174,7 +186,7 @@ def _write_extremes_md(extremes: List[ExtremeItem], out_md: Path, title: str) ->
     lines = []
     lines.append(f"# {title}")
     lines.append("")
-    lines.append(f"Generated at: {datetime.now().isoformat(timespec='seconds')}")
+    lines.append(f"Generated at: {iso_now_local()}")
     lines.append("")
     for ex in extremes:
         lines.append(f"## {ex.metric}")
@@ -193,55 +205,32 @@ def _write_extremes_md(extremes: List[ExtremeItem], out_md: Path, title: str) ->
 # Main
 # ----------------------------
 
-def main():
-    ap = argparse.ArgumentParser(
-        description="Run nk_ops_author_sweep.py for ALL authors and aggregate results + extremes."
-    )
-    ap.add_argument("--csv", required=True, help="Multi-author CSV (e.g., meals_all.csv)")
-    ap.add_argument("--author_col", default="", help="Author column name. If empty, auto-detect.")
-    ap.add_argument("--outdir", required=True, help="Output directory for per-author sweeps + aggregated tables")
-    ap.add_argument("--msv_version", default="0.1.3", help="MSV version to pass through")
-    ap.add_argument("--python", default=sys.executable, help="Python executable to use")
-    ap.add_argument("--author_sweep_script", default="nk_ops_author_sweep.py", help="Path to nk_ops_author_sweep.py")
-    ap.add_argument("--topk", type=int, default=5, help="Top/bottom K for extremes tables")
-    ap.add_argument("--no_run", action="store_true", help="Do not run per-author sweeps; only aggregate from existing summaries")
-    ap.add_argument("--extra", default="", help="Extra args forwarded to nk_ops_author_sweep.py (string)")
-    args = ap.parse_args()
-
-    csv_path = Path(args.csv)
-    outdir = Path(args.outdir)
+def _sweep(
+    args: argparse.Namespace,
+    csv_path: Path,
+    outdir: Path,
+    author_sweep_script: Path,
+    authors: List[str],
+    author_col: str,
+    workers: int,
+) -> None:
+    """Per-author sweeps (unless --no_run) + aggregated tables + extremes into outdir."""
     outdir.mkdir(parents=True, exist_ok=True)
 
-    author_sweep_script = Path(args.author_sweep_script)
-    if not author_sweep_script.exists():
-        # try relative to this file
-        here = Path(__file__).resolve().parent
-        alt = here / args.author_sweep_script
-        if alt.exists():
-            author_sweep_script = alt
-        else:
-            raise RuntimeError(f"author_sweep_script not found: {args.author_sweep_script}")
-
-    df = _read_csv_safely(str(csv_path))
-    author_col = args.author_col.strip() or _detect_author_col(df)
-
-    if author_col not in df.columns:
-        raise RuntimeError(f"author_col='{author_col}' not found in CSV. Available: {list(df.columns)}")
-
-    # unique authors
-    authors = sorted([a for a in df[author_col].dropna().unique().tolist() if str(a).strip() != ""])
-    if not authors:
-        raise RuntimeError("No authors found in author column.")
-
     # run sweeps
-    extra_args = [x for x in args.extra.strip().split() if x]
+    extra_args = [x for x in args.extra.strip().split() if x] + _preview_args(args)
     summary_paths: Dict[str, Path] = {}
+    slugs = [_slug(a) for a in authors]
 
     if not args.no_run:
-        print(f"[INFO] authors={len(authors)} author_col='{author_col}' msv_version={args.msv_version}")
-        for i, a in enumerate(authors, 1):
+        print(f"[INFO] authors={len(authors)} author_col='{author_col}' msv_version={args.msv_version} workers={workers}")
+        if args.preview or args.preview_width is not None:
+            print("[INFO] preview: per-author summaries (and the tables below) are sample estimates")
+
+        def run_one(item: Tuple[int, str]) -> Path:
+            i, a = item
             print(f"[RUN] {i:02d}/{len(authors)} author='{a}'")
-            p = _run_author_sweep(
+            return _run_author_sweep(
                 python_exe=args.python,
                 author_sweep_script=author_sweep_script,
                 csv_path=csv_path,
@@ -249,14 +238,18 @@ def main():
                 outdir=outdir,
                 msv_version=args.msv_version,
                 extra_args=extra_args,
+                other_slugs=slugs,
             )
-            summary_paths[str(a)] = p
+
+        # results come back in author order whatever order the sweeps finish in
+        paths = ordered_map(run_one, list(enumerate(authors, 1)), workers=workers)
+        summary_paths = {str(a): p for a, p in zip(authors, paths)}
     else:
         print("[INFO] --no_run enabled: collecting from existing summary JSONs in outdir")
         # try to locate summary for each author
         for a in authors:
             author_slug = _slug(a)
-            summary_paths[str(a)] = _find_latest_summary(outdir, author_slug)
+            summary_paths[str(a)] = _find_latest_summary(outdir, author_slug, slugs)
 
     # aggregate
     index_rows = []
@@ -288,17 +281,17 @@ def main():
             op_row[f"avg_{k}"] = float(op_avg.get(k, 0.0))
         op_rows.append(op_row)
 
-    index_df = pd.DataFrame(index_rows).sort_values("author")
-    tau_df = pd.DataFrame(tau_rows).sort_values("author")
-    op_df = pd.DataFrame(op_rows).sort_values("author")
+    index_df = pd.DataFrame(index_rows).sort_values("author", kind="mergesort")
+    tau_df = pd.DataFrame(tau_rows).sort_values("author", kind="mergesort")
+    op_df = pd.DataFrame(op_rows).sort_values("author", kind="mergesort")
 
-    out_index = outdir / "all_authors_index.csv"
-    out_tau = outdir / "all_authors_tau_shares.csv"
-    out_ops = outdir / "all_authors_operator_avg.csv"
+    out_index = with_suffix_format(outdir / "all_authors_index.csv", args.table_format)
+    out_tau = with_suffix_format(outdir / "all_authors_tau_shares.csv", args.table_format)
+    out_ops = with_suffix_format(outdir / "all_authors_operator_avg.csv", args.table_format)
 
-    index_df.to_csv(out_index, index=False)
-    tau_df.to_csv(out_tau, index=False)
-    op_df.to_csv(out_ops, index=False)
+    # same bytes as DataFrame.to_csv(index=False) for csv
+    for out_df, out_path in ((index_df, out_index), (tau_df, out_tau), (op_df, out_ops)):
+        write_table(out_path, frame_columns(out_df), decimals=None, lineterminator=os.linesep)
 
     print(f"[WROTE] {out_index}")
     print(f"[WROTE] {out_tau}")
@@ -317,7 +310,7 @@ def main():
     # write combined JSON (easy for GitHub)
     out_json = outdir / "extreme_meals.json"
     extremes_payload = {
-        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "generated_at": iso_now_local(),
         "msv_version": args.msv_version,
         "topk": topk,
         "tau_extremes": {ex.metric: {"top": ex.top, "bottom": ex.bottom} for ex in tau_ext},
@@ -330,7 +323,99 @@ def main():
     _write_extremes_md(tau_ext + op_ext, out_md, title="NK-Ops Phase-1 — Extremes (Tau + Operators)")
     print(f"[WROTE] {out_md}")
 
-    print("[DONE] all-authors sweep aggregation + extremes complete.")
+    print(f"[DONE] all-authors sweep aggregation + extremes complete -> {outdir}")
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Run nk_ops_author_sweep.py for ALL authors and aggregate results + extremes."
+    )
+    ap.add_argument("--csv", required=True, help="Multi-author CSV (e.g., meals_all.csv)")
+    ap.add_argument("--author_col", default="", help="Author column name. If empty, auto-detect.")
+    ap.add_argument("--outdir", required=True, help="Output directory for per-author sweeps + aggregated tables")
+    ap.add_argument("--msv_version", default="0.1.3", help="MSV version to pass through")
+    ap.add_argument("--python", default=sys.executable, help="Python executable to use")
+    ap.add_argument("--author_sweep_script", default="nk_ops_author_sweep.py", help="Path to nk_ops_author_sweep.py")
+    ap.add_argument("--topk", type=int, default=5, help="Top/bottom K for extremes tables")
+    ap.add_argument("--no_run", action="store_true", help="Do not run per-author sweeps; only aggregate from existing summaries")
+    ap.add_argument("--extra", default="", help="Extra args forwarded to nk_ops_author_sweep.py (string)")
+    ap.add_argument("--table_format", default="csv", choices=["csv", "parquet", "feather"],
+                    help="Format of the all_authors_* tables (parquet/feather need pyarrow)")
+    ap.add_argument("--workers", type=int, default=1, help="Per-author sweeps run in parallel (outputs identical to 1)")
+    ap.add_argument("--verify_determinism", action="store_true",
+                    help="Run serial and parallel sweeps into <outdir>/determinism_{serial,parallel} and compare SHA-256 of every output")
+    add_preview_args(ap)
+    args = ap.parse_args()
+
+    if args.preview_cache and (args.workers > 1 or args.verify_determinism):
+        raise RuntimeError("--preview_cache is one file shared by the per-author runs: use --workers 1")
+
+    csv_path = Path(args.csv)
+    outdir = Path(args.outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    author_sweep_script = Path(args.author_sweep_script)
+    if not author_sweep_script.exists():
+        # try relative to this file
+        here = Path(__file__).resolve().parent
+        alt = here / args.author_sweep_script
+        if alt.exists():
+            author_sweep_script = alt
+        else:
+            raise RuntimeError(f"author_sweep_script not found: {args.author_sweep_script}")
+
+    # encoding + sep from a byte sample; only the author column is ever parsed here
+    fmt = sniff_format(csv_path)
+    author_col = args.author_col.strip() or detect_author_col(csv_path, fmt)
+
+    if author_col not in fmt.columns:
+        raise RuntimeError(f"author_col='{author_col}' not found in CSV. Available: {fmt.columns}")
+
+    # unique authors (streaming distinct scan)
+    authors = scan_distinct(csv_path, author_col, fmt)
+    if not authors:
+        raise RuntimeError("No authors found in author column.")
+
+    if not args.verify_determinism:
+        _sweep(args, csv_path, outdir, author_sweep_script, authors, author_col, args.workers)
+        return
+
+    if args.no_run:
+        raise RuntimeError("--verify_determinism needs the per-author sweeps (drop --no_run)")
+    # one pinned clock for both runs (inherited by the per-author subprocesses)
+    os.environ.setdefault("SOURCE_DATE_EPOCH", str(int(time.time())))
+    workers = max(args.workers, 2)
+    runs = {"serial": 1, "parallel": workers}
+    digests = {}
+    for name, w in runs.items():
+        d = outdir / f"determinism_{name}"
+        if d.exists():
+            print(f"[INFO] clearing previous verify run: {d}")
+            shutil.rmtree(d)
+        print(f"[INFO] verify: {name} sweep (workers={w}) -> {d}")
+        _sweep(args, csv_path, d, author_sweep_script, authors, author_col, w)
+        digests[name] = digest_tree(d)
+
+    diff = diff_digests(digests["serial"], digests["parallel"])
+    report = {
+        "generated_at": iso_now_local(),
+        "source_file": str(csv_path),
+        "source_date_epoch": os.environ["SOURCE_DATE_EPOCH"],
+        "workers": runs,
+        **diff,
+        "sha256_serial": digests["serial"],
+        "sha256_parallel": digests["parallel"],
+    }
+    out_report = outdir / "determinism_report.json"
+    out_report.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[WROTE] {out_report}")
+    if diff["identical"]:
+        print(f"[OK] serial and parallel outputs identical ({diff['files_compared']} files)")
+        return
+    for k in ("only_serial", "only_parallel", "differ"):
+        for f in diff[k]:
+            print(f"[ERR] {k}: {f}")
+    raise SystemExit(1)
 
 
 if __name__ == "__main__":
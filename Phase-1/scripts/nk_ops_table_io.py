@@ -0,0 +1,274 @@
+# nk_ops_table_io.py
+# NK-Ops — shared bulk table writer (decision / trace / aggregate tables)
+# v0.1 (utility module; keep deterministic)
+#
+# Tables are passed as columns (name -> array/sequence), not as per-row dicts.
+# CSV output is byte-identical to csv.writer / csv.DictWriter with the repo's
+# f"{x:.6f}" float formatting:
+#   - float / int arrays are rendered to ASCII digits with numpy integer arithmetic
+#     (no per-cell Python formatting); values whose rounding is ambiguous in float
+#     arithmetic fall back to Python's own formatting, so every cell equals
+#     f"{x:.{decimals}f}"
+#   - other values follow the csv module (None -> "", float -> repr, else str) and
+#     its QUOTE_MINIMAL rule
+#   - rows are assembled as one byte buffer per block and written in large writes
+# Parquet / Feather output of the same columns is optional (needs pyarrow).
+# CSV paths ending in .gz / .xz / .zst are compressed while writing (streamed per block).
+
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from nk_ops_utils import ensure_dir, open_any, strip_compression_suffix
+
+Columns = Union[Mapping[str, Any], Sequence[Tuple[str, Any]]]
+
+# A "ragged" column: (flat uint8 bytes, per-row byte lengths), rows in order.
+Ragged = Tuple[np.ndarray, np.ndarray]
+
+_WRITE_BLOCK_ROWS = 65_536
+
+# |x| * 10**decimals must stay well inside the exactly-representable integer range
+_FAST_LIMIT = 2.0 ** 52
+
+
+def _items(columns: Columns) -> List[Tuple[str, Any]]:
+    return list(columns.items()) if isinstance(columns, Mapping) else list(columns)
+
+
+# ---------------------------
+# Cell rendering
+# ---------------------------
+
+def _csv_field(v: Any) -> str:
+    # same conversions as the csv module
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return repr(v)
+    return str(v)
+
+
+def _quote(s: str, sep: str) -> str:
+    # csv.QUOTE_MINIMAL
+    if sep in s or '"' in s or "\n" in s or "\r" in s:
+        return '"' + s.replace('"', '""') + '"'
+    return s
+
+
+def _ragged_from_strings(strs: Sequence[str], encoding: str) -> Ragged:
+    enc = [x.encode(encoding) for x in strs]
+    lengths = np.fromiter(map(len, enc), dtype=np.int64, count=len(enc))
+    return np.frombuffer(b"".join(enc), dtype=np.uint8), lengths
+
+
+def _split_ragged(r: Ragged, encoding: str = "utf-8") -> List[str]:
+    data, lengths = r
+    raw = data.tobytes()
+    ends = np.cumsum(lengths).tolist()
+    return [raw[a:b].decode(encoding) for a, b in zip([0] + ends[:-1], ends)]
+
+
+def _ragged_digits(
+    q: np.ndarray,
+    neg: np.ndarray,
+    frac: Optional[np.ndarray],
+    decimals: int,
+    overrides: Dict[int, bytes],
+) -> Ragged:
+    """
+    Render [-]q[.frac] right-aligned into a byte matrix and cut each row to its length.
+    Rows listed in `overrides` take the given bytes instead.
+    """
+    n = len(q)
+    if n == 0:
+        return np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.int64)
+    nd = np.ones(n, dtype=np.int64)
+    for k in range(1, 19):
+        nd += q >= 10 ** k
+    tail = decimals + 1 if frac is not None and decimals > 0 else 0
+    lengths = neg.astype(np.int64) + nd + tail
+    for i, b in overrides.items():
+        lengths[i] = len(b)
+    width = max(int(lengths.max()), int(nd.max()) + tail + 1)
+
+    M = np.full((n, width), ord("0"), dtype=np.uint8)
+    if tail:
+        r = frac
+        for k in range(decimals):
+            M[:, width - 1 - k] = 48 + r % 10
+            r = r // 10
+        M[:, width - tail] = ord(".")
+    qq = q
+    for k in range(int(nd.max())):
+        M[:, width - tail - 1 - k] = 48 + qq % 10
+        qq = qq // 10
+    neg_rows = np.flatnonzero(neg)
+    M[neg_rows, width - lengths[neg_rows]] = ord("-")
+    for i, b in overrides.items():
+        if b:
+            M[i, width - len(b):] = np.frombuffer(b, dtype=np.uint8)
+    keep = np.arange(width)[None, :] >= (width - lengths)[:, None]
+    return M[keep], lengths
+
+
+def _ragged_float(x: np.ndarray, decimals: int, na_rep: str, encoding: str) -> Ragged:
+    x = np.asarray(x, dtype=np.float64)
+    y = np.abs(x) * (10.0 ** decimals)
+    finite = np.isfinite(y) & (y < _FAST_LIMIT)
+    y_f = np.where(finite, y, 0.0)
+    # Python rounds the exact binary value; the scaled float may be off by a few ulps,
+    # so values sitting (almost) on a .5 boundary are formatted by Python instead.
+    frac = y_f - np.floor(y_f)
+    ambiguous = np.abs(frac - 0.5) <= np.maximum(y_f * 8.9e-16, 1e-300)
+    m = np.rint(y_f).astype(np.int64)
+    p = 10 ** decimals
+    overrides: Dict[int, bytes] = {}
+    for i in np.flatnonzero(~finite | ambiguous):
+        v = float(x[i])
+        overrides[int(i)] = (na_rep if math.isnan(v) else f"{v:.{decimals}f}").encode(encoding)
+    return _ragged_digits(m // p, np.signbit(x) & finite, m % p, decimals, overrides)
+
+
+def _ragged_int(a: np.ndarray) -> Ragged:
+    a = np.asarray(a, dtype=np.int64)
+    lowest = a == np.iinfo(np.int64).min
+    overrides = {int(i): str(int(a[i])).encode("ascii") for i in np.flatnonzero(lowest)}
+    return _ragged_digits(np.abs(np.where(lowest, 0, a)), a < 0, None, 0, overrides)
+
+
+def format_fixed(values: Any, decimals: int = 6, na_rep: str = "nan") -> List[str]:
+    """Vectorised f"{x:.{decimals}f}" over a float array (exactly the same strings)."""
+    return _split_ragged(_ragged_float(np.asarray(values, dtype=np.float64), decimals, na_rep, "utf-8"))
+
+
+def ragged_column(
+    values: Any,
+    sep: str = ",",
+    decimals: Optional[int] = 6,
+    na_rep: str = "nan",
+    encoding: str = "utf-8",
+) -> Ragged:
+    """One column as CSV-ready bytes."""
+    arr = values if isinstance(values, np.ndarray) else None
+    if arr is not None and arr.dtype.kind == "f" and decimals is not None:
+        return _ragged_float(arr, decimals, na_rep, encoding)
+    if arr is not None and arr.dtype.kind in "iu":
+        return _ragged_int(arr)
+    seq = arr.tolist() if arr is not None else values
+    return _ragged_from_strings([_quote(_csv_field(v), sep) for v in seq], encoding)
+
+
+def _assemble_rows(cols: Sequence[Ragged], sep: bytes, term: bytes) -> bytes:
+    """Interleave ragged columns into one CSV byte block (sep between cells, term after rows)."""
+    row_len = sum(lengths for _, lengths in cols) + len(sep) * (len(cols) - 1) + len(term)
+    if len(row_len) == 0:
+        return b""
+    out = np.empty(int(row_len.sum()), dtype=np.uint8)
+    cur = np.concatenate(([0], np.cumsum(row_len)[:-1])).astype(np.int64)
+    for j, (data, lengths) in enumerate(cols):
+        if len(data):
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            out[np.repeat(cur - starts, lengths) + np.arange(len(data))] = data
+        cur = cur + lengths
+        for b in (sep if j < len(cols) - 1 else term):
+            out[cur] = b
+            cur = cur + 1
+    return out.tobytes()
+
+
+# ---------------------------
+# Writers
+# ---------------------------
+
+def write_csv_columns(
+    path: str | Path,
+    columns: Columns,
+    *,
+    sep: str = ",",
+    decimals: Optional[int] = 6,
+    na_rep: str = "nan",
+    lineterminator: str = "\r\n",
+    encoding: str = "utf-8",
+) -> int:
+    """
+    Write columns as CSV in bulk. Float numpy arrays get fixed `decimals`
+    (None: repr, like the csv module); lineterminator defaults to csv's "\\r\\n".
+    Returns the number of data rows.
+    """
+    items = _items(columns)
+    names = [nm for nm, _ in items]
+    n = len(items[0][1]) if items else 0
+    for name, v in items:
+        if len(v) != n:
+            raise RuntimeError(f"column '{name}' has {len(v)} rows, expected {n}")
+
+    p = Path(path)
+    ensure_dir(p.parent)
+    sep_b = sep.encode(encoding)
+    term_b = lineterminator.encode(encoding)
+    # one write per block (no per-row writes); compressed paths stream through the codec
+    with open_any(p, "wb") as f:
+        f.write((sep.join(_quote(str(nm), sep) for nm in names) + lineterminator).encode(encoding))
+        for start in range(0, n, _WRITE_BLOCK_ROWS):
+            block = [v[start:start + _WRITE_BLOCK_ROWS] for _, v in items]
+            cols = [ragged_column(v, sep=sep, decimals=decimals, na_rep=na_rep, encoding=encoding) for v in block]
+            if len(cols) == 1 and (cols[0][1] == 0).any():
+                # csv quotes a lone empty field so the row is not read back as blank
+                cells = [c or '""' for c in _split_ragged(cols[0], encoding)]
+                cols = [_ragged_from_strings(cells, encoding)]
+            f.write(_assemble_rows(cols, sep_b, term_b))
+    return n
+
+
+def columns_from_rows(rows: Sequence[Dict[str, Any]], fieldnames: Sequence[str]) -> List[Tuple[str, List[Any]]]:
+    """Row dicts -> columns (missing keys -> ""), e.g. for callers that still build dicts."""
+    return [(k, [r.get(k, "") for r in rows]) for k in fieldnames]
+
+
+def frame_columns(df: Any) -> List[Tuple[str, Any]]:
+    """pandas DataFrame -> columns (numpy arrays), for tables built with pandas."""
+    return [(str(c), df[c].to_numpy()) for c in df.columns]
+
+
+def write_table(
+    path: str | Path,
+    columns: Columns,
+    *,
+    fmt: Optional[str] = None,
+    **csv_kwargs: Any,
+) -> int:
+    """
+    Write one table as csv (default), parquet or feather. `fmt` defaults to the file suffix.
+    Parquet/Feather keep native dtypes (no float formatting) and need pyarrow.
+    """
+    p = Path(path)
+    fmt = (fmt or strip_compression_suffix(p).suffix.lstrip(".") or "csv").lower()
+    if fmt in ("csv", "tsv", "txt"):
+        return write_csv_columns(p, columns, **csv_kwargs)
+    if fmt not in ("parquet", "feather"):
+        raise RuntimeError(f"unsupported table format: {fmt!r} (csv, parquet, feather)")
+    try:
+        import pandas as pd
+        import pyarrow  # noqa: F401
+    except ImportError as ex:
+        raise RuntimeError(f"{fmt} output needs pandas + pyarrow: {ex}") from ex
+    df = pd.DataFrame({k: (v if isinstance(v, np.ndarray) else list(v)) for k, v in _items(columns)})
+    ensure_dir(p.parent)
+    if fmt == "parquet":
+        df.to_parquet(p, index=False)
+    else:
+        df.to_feather(p)
+    return len(df)
+
+
+def with_suffix_format(path: str | Path, fmt: Optional[str]) -> Path:
+    """results/x.csv + 'parquet' -> results/x.parquet (None/'csv' keeps the path, incl. .csv.gz)."""
+    p = Path(path)
+    if not fmt or fmt == "csv":
+        return p
+    return strip_compression_suffix(p).with_suffix("." + fmt)
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_ops_tagger.py — NK-Ops Phase-1 operator extraction engine
+
+Purpose:
+    Tag text segments with operator counts (Phase-1 keys + Phase-2 tags such as
+    CASE.ABL / EVID.MIS) from a language adapter's suffix and lexeme rules.
+
+How it works:
+    - All suffix rules of an adapter are compiled into ONE reversed-suffix trie
+      (a combined automaton: one walk from the token end finds every operator whose
+      suffix matches), lexeme rules into one hash table.
+    - A batch of segments is tokenized once; each distinct token is analysed once
+      (token -> operator bitmask), then counts are scattered back per segment with
+      numpy bincounts.
+    - Count = number of tokens in the segment carrying the operator
+      (an operator is counted at most once per token).
+    - Batches can be spread over worker processes; results are concatenated in
+      input order, so output is identical for any --workers.
+    - Optional token cache (--token_cache): token analyses are memoised per adapter
+      rules across batches, authors and runs (see nk_ops_token_cache.py).
+
+Inputs:
+    CSV with at least: text (configurable via --text_col)
+
+Outputs:
+    nk_ops_tags_{input_basename}.csv           (id cols + one count column per operator)
+    nk_ops_tags_{input_basename}_summary.json
+
+Run:
+    python scripts/nk_ops_tagger.py --csv <PATH> --outdir <DIR> --msv_version 0.1.3 --workers 4
+    python scripts/nk_ops_tagger.py --csv <PATH> --outdir <DIR> --msv_version 0.1.3 --preview 0.02 --preview_width 0.02
+
+Preview (--preview FRAC / --preview_width W):
+    only a stratified author x sure sample is tagged; tau shares (default rules) and
+    operator averages per author (+ pooled) are reported with 95% CIs in
+    nk_ops_tags_{input_basename}_preview.json (no tags CSV). --preview_width doubles the
+    sample (tagging only the added segments) until every pooled CI is narrower than W.
+    With --preview_cache PATH, full runs store exact values there for comparison.
+
+Notes:
+    - Deterministic outputs (no randomness)
+    - The built-in adapter ("tr") is a minimal Turkish rule set; pass the production
+      rules with --adapter adapter.json (same schema as ADAPTER_TR).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nk_ops_preview import (
+    POOLED,
+    ExactCache,
+    RowValues,
+    StratifiedSample,
+    add_preview_args,
+    exact_values,
+    group_means,
+    preview_report,
+    print_pooled,
+    refine,
+)
+from nk_ops_token_cache import TokenCache
+from nk_ops_utils import avg_ops, ensure_dir, iso_now_local, write_json
+
+NK_OPS_TAGGER_VERSION = "0.1.0"
+
+
+# ---------------------------
+# Built-in adapter (Turkish)
+# ---------------------------
+# Schema:
+#   name, version, min_stem (chars that must remain before a suffix),
+#   operators: {op_name: {"suffixes": [...], "lexemes": [...], "except": [...], "min_stem": n}}
+#   ("except": optional whole tokens on which the operator's suffix rules do not fire;
+#    "min_stem": optional per-operator override of the adapter's min_stem)
+# Column order of the output follows the operators order.
+
+_PAST_DI = ["dı", "di", "du", "dü", "tı", "ti", "tu", "tü"]
+_EVID_MIS = ["mış", "miş", "muş", "müş"]
+_NEG_MA = ["madı", "medi", "mıyor", "miyor", "muyor", "müyor", "maz", "mez", "mamış", "memiş", "mayacak", "meyecek"]
+# dative -(y)A / -(n)A: a bare a/e only after a consonant (after a vowel the buffer y is
+# required), and not after d/t (locative -dA), m (negative / verbal noun -mA), c/ç
+# (equative -cA) or l (instrumental -lA); 1sg possessive + dative -ImA is listed explicitly.
+# The consonant belongs to the stem, hence min_stem 1 for these operators (ev+e -> "eve").
+_CASE_DAT = (["ya", "ye", "na", "ne", "ıma", "ime", "uma", "üme"]
+             + [c + v for c in "bfgğhjkprsşvz" for v in "ae"])
+# stems and function words that end in consonant + a/e without being datives
+_CASE_DAT_EXCEPT = [
+    "musa", "isa", "yahya", "zekeriya", "kabe", "mekke", "medine",
+    "kasa", "masa", "sure", "dünya", "rüya", "tevbe", "tövbe", "mucize", "kıssa",
+    "ise", "oysa", "yoksa", "göre", "üzere", "sonra", "zira", "daha", "diye", "niye",
+    "yine", "gene", "galiba",
+]
+_ABST_LIK = ["lık", "lik", "luk", "lük"]
+
+ADAPTER_TR: Dict[str, Any] = {
+    "name": "tr",
+    "version": "0.1.1",
+    "min_stem": 2,
+    "operators": {
+        "neg": {"suffixes": _NEG_MA, "lexemes": ["değil", "yok", "hiç", "asla", "hayır"]},
+        "dat": {"suffixes": _CASE_DAT, "lexemes": [], "except": _CASE_DAT_EXCEPT, "min_stem": 1},
+        "acc": {"suffixes": ["yı", "yi", "yu", "yü", "nı", "ni", "nu", "nü", "ı", "i", "u", "ü"], "lexemes": []},
+        "invoke": {"suffixes": [], "lexemes": ["ey", "rabbimiz", "rabbim", "allahım", "tanrım"]},
+        "anchor": {"suffixes": ["dır", "dir", "dur", "dür", "tır", "tir", "tur", "tür"],
+                   "lexemes": ["işte", "elbette", "şüphesiz", "gerçekten", "muhakkak"]},
+        "past": {"suffixes": _PAST_DI, "lexemes": []},
+        "evid": {"suffixes": _EVID_MIS, "lexemes": []},
+        "fut": {"suffixes": ["acak", "ecek", "acaktır", "ecektir"], "lexemes": []},
+        "prog": {"suffixes": ["ıyor", "iyor", "uyor", "üyor", "yor"], "lexemes": []},
+        "abst": {"suffixes": _ABST_LIK, "lexemes": []},
+        "imp": {"suffixes": ["ın", "in", "un", "ün", "ınız", "iniz", "unuz", "ünüz", "sın", "sin", "sun", "sün"], "lexemes": []},
+        "barrier": {"suffixes": ["mayın", "meyin", "ma", "me"], "lexemes": ["haram", "yasak", "sakın", "sakının"]},
+        # Phase-2 tags
+        "CASE.ABL": {"suffixes": ["dan", "den", "tan", "ten"], "lexemes": []},
+        "CASE.DAT": {"suffixes": _CASE_DAT, "lexemes": [], "except": _CASE_DAT_EXCEPT, "min_stem": 1},
+        "VOICE.PASS": {"suffixes": ["ıldı", "ildi", "uldu", "üldü", "ılır", "ilir", "ulur", "ülür", "ınır", "inir"], "lexemes": []},
+        "EVID.MIS": {"suffixes": _EVID_MIS, "lexemes": []},
+        "PAST.DI": {"suffixes": _PAST_DI, "lexemes": []},
+        "NEG.MA": {"suffixes": _NEG_MA, "lexemes": []},
+        "ABST.LIK": {"suffixes": _ABST_LIK, "lexemes": []},
+    },
+}
+
+
+def load_adapter(path: Optional[str | Path] = None) -> Dict[str, Any]:
+    if not path:
+        return ADAPTER_TR
+    adapter = json.loads(Path(path).read_text(encoding="utf-8"))
+    for k in ("name", "version", "operators"):
+        if k not in adapter:
+            raise RuntimeError(f"adapter {path}: missing key '{k}'")
+    return adapter
+
+
+# ---------------------------
+# Tokenizer
+# ---------------------------
+
+_TOKEN_RX = re.compile(r"[^\W\d_]+")
+_APOS_RX = re.compile(r"['’`]")
+
+
+def normalize_text(text: str) -> str:
+    # Turkish-aware lowercasing (I -> ı, İ -> i); apostrophes join proper-noun suffixes (Allah'a -> allaha)
+    text = text.replace("I", "ı").replace("İ", "i").lower()
+    return _APOS_RX.sub("", text)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RX.findall(normalize_text(text or ""))
+
+
+# ---------------------------
+# Engine
+# ---------------------------
+
+_END = ""  # trie terminal key (never a character)
+
+
+class OperatorTagger:
+    """
+    Compiled adapter: one reversed-suffix trie + one lexeme table, both mapping to
+    operator bitmasks (bit i = ops[i]).
+    """
+
+    def __init__(self, adapter: Dict[str, Any], cache: Optional[TokenCache] = None):
+        self.adapter = adapter
+        self.ops: List[str] = list(adapter["operators"].keys())
+        self.version = f"{adapter['name']}-{adapter['version']}"
+        self.cache = cache
+        self.min_stem = int(adapter.get("min_stem", 2))
+        self._trie: Dict[str, Any] = {}
+        self._lexemes: Dict[str, int] = {}
+        self._except: Dict[str, int] = {}
+        self._max_depth = 0
+        for i, op in enumerate(self.ops):
+            rules = adapter["operators"][op]
+            for suf in rules.get("suffixes", []):
+                suf = normalize_text(suf)
+                node = self._trie
+                for ch in reversed(suf):
+                    node = node.setdefault(ch, {})
+                node[_END] = node.get(_END, 0) | (1 << i)
+                self._max_depth = max(self._max_depth, len(suf))
+            for lex in rules.get("lexemes", []):
+                lex = normalize_text(lex)
+                self._lexemes[lex] = self._lexemes.get(lex, 0) | (1 << i)
+            for tok in rules.get("except", []):
+                tok = normalize_text(tok)
+                self._except[tok] = self._except.get(tok, 0) | (1 << i)
+        # per-operator min_stem: _stem_ok[r] = operators whose suffixes may leave a stem of r chars
+        stems = [int(adapter["operators"][op].get("min_stem", self.min_stem)) for op in self.ops]
+        self._min_stem_any = min(stems, default=self.min_stem)
+        self._stem_ok = [sum(1 << i for i, m in enumerate(stems) if m <= r) for r in range(max(stems, default=0) + 1)]
+        self._all_ops = (1 << len(self.ops)) - 1
+
+    def analyze(self, token: str) -> int:
+        """Operator bitmask of one normalized token."""
+        suffix_mask = 0
+        node = self._trie
+        n = len(token)
+        limit = min(self._max_depth, n - self._min_stem_any)
+        for d in range(limit):
+            node = node.get(token[-1 - d])
+            if node is None:
+                break
+            hit = node.get(_END, 0)
+            if hit:
+                r = n - d - 1  # stem length left before this suffix
+                suffix_mask |= hit & (self._stem_ok[r] if r < len(self._stem_ok) else self._all_ops)
+        return self._lexemes.get(token, 0) | (suffix_mask & ~self._except.get(token, 0))
+
+    def mask_matrix(self, masks: Sequence[int]) -> np.ndarray:
+        """(n_tokens, n_ops) bool matrix from bitmasks."""
+        arr = np.asarray(masks, dtype=np.int64)
+        bits = np.int64(1) << np.arange(len(self.ops), dtype=np.int64)
+        return (arr[:, None] & bits[None, :]) != 0
+
+    def tag(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Tag one batch of segments. Returns int32 counts of shape (len(texts), n_ops).
+        """
+        n = len(texts)
+        vocab: Dict[str, int] = {}
+        tok_ids: List[int] = []
+        seg_idx: List[int] = []
+        for s, text in enumerate(texts):
+            for w in tokenize(text):
+                i = vocab.get(w)
+                if i is None:
+                    i = vocab[w] = len(vocab)
+                tok_ids.append(i)
+                seg_idx.append(s)
+
+        counts = np.zeros((n, len(self.ops)), dtype=np.int32)
+        if not tok_ids:
+            return counts
+        has_op = self.mask_matrix(self.analyze_many(list(vocab.keys())))
+        ids = np.asarray(tok_ids, dtype=np.int64)
+        segs = np.asarray(seg_idx, dtype=np.int64)
+        for j in range(len(self.ops)):
+            sel = has_op[ids, j]
+            if sel.any():
+                counts[:, j] = np.bincount(segs[sel], minlength=n)
+        return counts
+
+    def analyze_many(self, tokens: Sequence[str]) -> List[int]:
+        if self.cache is not None:
+            return self.cache.get_many(tokens, self.analyze)
+        return [self.analyze(w) for w in tokens]
+
+
+def adapter_cache_key(adapter: Dict[str, Any]) -> str:
+    """
+    Cache scope: adapter name-version plus a digest of the rules, so edited rules
+    never reuse analyses made under the old ones.
+    """
+    rules = json.dumps({"min_stem": adapter.get("min_stem", 2), "operators": adapter["operators"]},
+                       ensure_ascii=False, sort_keys=True)
+    digest = hashlib.sha1(rules.encode("utf-8")).hexdigest()[:12]
+    return f"{adapter['name']}-{adapter['version']}:{digest}"
+
+
+def open_token_cache(adapter: Dict[str, Any], path: Optional[str | Path] = None, maxsize: int = 200_000) -> TokenCache:
+    return TokenCache(adapter_cache_key(adapter), maxsize=maxsize, path=path)
+
+
+# ---------------------------
+# Batch / multi-process driver
+# ---------------------------
+
+_WORKER_TAGGER: Optional[OperatorTagger] = None
+
+
+def _worker_init(adapter: Dict[str, Any], cache_spec: Optional[Tuple[str, int, Optional[str]]]) -> None:
+    global _WORKER_TAGGER
+    cache = TokenCache(*cache_spec) if cache_spec else None
+    _WORKER_TAGGER = OperatorTagger(adapter, cache=cache)
+
+
+def _worker_tag(texts: Sequence[str]) -> Tuple[np.ndarray, Dict[str, float]]:
+    assert _WORKER_TAGGER is not None
+    cache = _WORKER_TAGGER.cache
+    before = cache.stats.as_dict() if cache is not None else {}
+    counts = _WORKER_TAGGER.tag(texts)
+    if cache is None:
+        return counts, {}
+    after = cache.stats.as_dict()
+    return counts, {k: after[k] - before[k] for k in ("lookups", "mem_hits", "disk_hits", "misses")}
+
+
+def tag_segments(
+    texts: Sequence[str],
+    adapter: Optional[Dict[str, Any]] = None,
+    workers: int = 1,
+    batch_size: int = 50_000,
+    cache: Optional[TokenCache] = None,
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    Tag all segments. Returns (counts[n_segments, n_ops], ops).
+    Batches are contiguous and re-assembled in input order (deterministic for any workers).
+    With workers > 1 each process opens its own copy of `cache` (same disk store);
+    their statistics are merged into cache.stats.
+    """
+    adapter = adapter or ADAPTER_TR
+    tagger = OperatorTagger(adapter, cache=cache)
+    texts = ["" if t is None else str(t) for t in texts]
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    if not batches:
+        return np.zeros((0, len(tagger.ops)), dtype=np.int32), tagger.ops
+    if workers <= 1 or len(batches) == 1:
+        parts = [tagger.tag(b) for b in batches]
+    else:
+        cache_spec = cache.spec() if cache is not None else None
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init, initargs=(adapter, cache_spec)) as ex:
+            results = list(ex.map(_worker_tag, batches))
+        parts = [c for c, _ in results]
+        if cache is not None:
+            for _, st in results:
+                cache.stats.merge(st)
+    return np.vstack(parts), tagger.ops
+
+
+def merge_counts(rows: List[Dict[str, Any]], counts: np.ndarray, ops: Sequence[str]) -> List[Dict[str, Any]]:
+    """Write count columns into row dicts in place (shape expected by build_summary)."""
+    cols = counts.tolist()
+    for r, c in zip(rows, cols):
+        for op, v in zip(ops, c):
+            r[op] = v
+    return rows
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+
+def log(prefix: str, msg: str, quiet: bool = False) -> None:
+    if not quiet:
+        print(f"[{prefix}] {msg}")
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Tag segments with NK-Ops operator counts.")
+    ap.add_argument("--csv", required=True, help="Input CSV")
+    ap.add_argument("--outdir", required=True, help="Output directory")
+    ap.add_argument("--msv_version", required=True, help="MSV version, e.g. 0.1.3")
+    ap.add_argument("--text_col", default="text", help="Text column name")
+    ap.add_argument("--id_cols", default="", help="Comma-separated id columns to keep (default: all non-text columns)")
+    ap.add_argument("--adapter", default=None, help="Adapter JSON (default: built-in 'tr')")
+    ap.add_argument("--workers", type=int, default=1, help="Worker processes")
+    ap.add_argument("--batch_size", type=int, default=50_000, help="Segments per batch")
+    ap.add_argument("--token_cache", default=None, help="On-disk token cache (sqlite), shared across runs")
+    ap.add_argument("--cache_size", type=int, default=200_000, help="In-process LRU size (tokens)")
+    ap.add_argument("--no_cache", action="store_true", help="Disable token memoisation")
+    ap.add_argument("--author_col", default="", help="Author column for preview strata. If empty, auto-detect.")
+    add_preview_args(ap)
+    ap.add_argument("--quiet", action="store_true")
+    ap.add_argument("--debug", action="store_true")
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    from nk_ops_corpus import detect_author_col, load_corpus, sniff_format
+    from nk_ops_tau import DEFAULT_RULES, metric_values, preview_metrics, rules_config
+
+    csv_path = Path(args.csv)
+    outdir = ensure_dir(args.outdir)
+    try:
+        adapter = load_adapter(args.adapter)
+        fmt = sniff_format(csv_path)
+        if args.text_col not in fmt.columns:
+            raise RuntimeError(f"missing text_col='{args.text_col}'")
+        id_cols = [c.strip() for c in args.id_cols.split(",") if c.strip()] or [c for c in fmt.columns if c != args.text_col]
+        df = load_corpus(csv_path, columns=id_cols + [args.text_col], fmt=fmt)
+        log("OK", f"rows={len(df)} sep={fmt.sep!r} encoding={fmt.encoding} adapter={adapter['name']}-{adapter['version']}", args.quiet)
+
+        cache = None if args.no_cache else open_token_cache(adapter, args.token_cache, args.cache_size)
+        ops_all = list(adapter["operators"])
+        base = csv_path.name.split(".")[0]
+        exact_cache = ExactCache(args.preview_cache or None)
+        preview = bool(args.preview or args.preview_width)
+        author_col = args.author_col.strip()
+        if not author_col and (preview or exact_cache.enabled):
+            # only preview strata / cached per-author values use the author (detection is a full pass)
+            try:
+                author_col = detect_author_col(csv_path, fmt)
+            except RuntimeError:
+                author_col = ""
+        authors = df[author_col].astype(str).to_numpy() if author_col in df.columns else np.full(len(df), "all")
+        cache_key = ExactCache.key("nk_ops_tagger", csv_path,
+                                   adapter_cache_key(adapter) + "|" + rules_config(DEFAULT_RULES, ops_all))
+        metrics = preview_metrics(ops_all)
+
+        if preview:
+            texts = df[args.text_col].tolist()
+            sample = StratifiedSample.build(authors, df["sure"].to_numpy() if "sure" in df.columns else None,
+                                            seed=args.preview_seed)
+
+            def tag_rows(idx: np.ndarray) -> np.ndarray:
+                c, _ = tag_segments([texts[i] for i in idx.tolist()], adapter, workers=args.workers,
+                                    batch_size=args.batch_size, cache=cache)
+                return metric_values(c, ops_all, DEFAULT_RULES)
+
+            est = refine(sample, RowValues(len(df), tag_rows), metrics, args.preview or 0.01, args.preview_width,
+                         groups=[POOLED], log=lambda m: log("INFO", m, args.quiet))
+            if cache is not None:
+                cache.close()
+            report = preview_report(est, exact_cache.get(cache_key))
+            report.update({"source_file": str(args.csv), "msv_version": args.msv_version,
+                           "adapter": f"{adapter['name']}-{adapter['version']}", "seed": args.preview_seed,
+                           "generated_at": iso_now_local()})
+            out_json = outdir / f"nk_ops_tags_{base}_preview.json"
+            write_json(out_json, report)
+            print_pooled(report)
+            log("WROTE", str(out_json), args.quiet)
+            return 0
+
+        counts, ops = tag_segments(df[args.text_col].tolist(), adapter, workers=args.workers,
+                                   batch_size=args.batch_size, cache=cache)
+        if cache is not None:
+            st = cache.stats
+            log("INFO", f"token_cache lookups={st.lookups} mem_hits={st.mem_hits} disk_hits={st.disk_hits} "
+                        f"misses={st.misses} hit_rate={st.hit_rate:.3f}", args.quiet)
+            cache.close()
+        out = df[id_cols].copy()
+        for j, op in enumerate(ops):
+            out[op] = counts[:, j]
+
+        out_csv = outdir / f"nk_ops_tags_{base}.csv"
+        out.to_csv(out_csv, index=False)
+        log("WROTE", str(out_csv), args.quiet)
+
+        totals = {op: int(v) for op, v in zip(ops, counts.sum(axis=0).tolist())}
+        summary = {
+            "rows": len(df),
+            "msv_version": args.msv_version,
+            "source_file": str(args.csv),
+            "sep_detected": fmt.sep,
+            "text_col": args.text_col,
+            "adapter": f"{adapter['name']}-{adapter['version']}",
+            "operator_totals": totals,
+            "operator_avg_per_row": avg_ops(totals, len(df)),
+            "token_cache": cache.stats.as_dict() if cache is not None else None,
+            "generated_at": iso_now_local(),
+            "nk_ops_tagger_version": NK_OPS_TAGGER_VERSION,
+        }
+        summary_path = outdir / f"nk_ops_tags_{base}_summary.json"
+        write_json(summary_path, summary)
+        log("WROTE", str(summary_path), args.quiet)
+        if exact_cache.enabled:
+            # exact per-author values for later previews of the same input + adapter
+            codes, names = pd.factorize(pd.Series(authors), sort=True)
+            exact_cache.put(cache_key, exact_values(list(names), metrics, group_means(
+                codes, len(names), metric_values(counts, ops, DEFAULT_RULES))))
+
+        print("[SUMMARY]")
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return 0
+
+    except Exception as ex:
+        log("ERR", str(ex), quiet=False)
+        if args.debug:
+            raise
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
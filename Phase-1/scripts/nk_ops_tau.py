@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_ops_tau.py — NK-Ops Phase-1 tau-class assignment + MSV components (vectorised)
+
+Purpose:
+    Assign tau codes and MSV A/C components to a whole operator-count matrix at once,
+    so re-classifying the corpus after a rule change is an array operation, not a re-sweep.
+
+Rules (docs/TAU_CLASSES.md, docs/MSV.md):
+    - MSV components are matrix products: A = X @ wA, B = X @ wB, C = X @ wC
+      (default wA: anchor/abst/temporal/evid/neg, wC: imp/invoke/dat/acc/barrier,
+       wB empty: B is reserved for Phase-2 and only activates when weighted).
+    - NOISE    : no core operator detected              (noise_reason = "no_ops")
+                 — any detected core operator forbids NOISE (formal lock).
+    - LOW_OPS  : operators present, no component reaches its activation threshold
+                 (noise_reason = "below_activation")
+    - otherwise: the active components in A, B, C order -> A, C, AC, AB, BC, ABC
+                 (B alone is not a Phase-1 regime and stays LOW_OPS).
+
+Inputs:
+    CSV with operator count columns (e.g. nk_ops_tagger output)
+
+Outputs:
+    nk_ops_tau_{input_basename}.csv           (input columns + tau, noise_reason, msv_A/B/C)
+    nk_ops_tau_{input_basename}_summary.json  (build_summary schema)
+
+Run:
+    python scripts/nk_ops_tau.py --csv tags.csv --outdir results --msv_version 0.1.3 [--rules rules.json]
+    python scripts/nk_ops_tau.py --csv tags.csv --outdir results --msv_version 0.1.3 --preview 0.02 --preview_width 0.02
+
+Preview (--preview FRAC / --preview_width W):
+    tau shares and operator averages per author (+ pooled) from a stratified author x sure
+    sample with 95% CIs (nk_ops_preview); --preview_width doubles the sample until every
+    pooled CI is narrower than W. Writes nk_ops_tau_{input_basename}_preview.json only. Full runs
+    store their exact values in --preview_cache PATH when given; previews of the same
+    input + rules report error and CI coverage against them.
+
+Notes:
+    - Rows are classified once per distinct operator-count signature (nk_ops_signature);
+      the summary records the dedup ratio under "signature_dedup"
+    - Deterministic outputs (no randomness)
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nk_ops_preview import (
+    POOLED,
+    ExactCache,
+    RowValues,
+    StratifiedSample,
+    add_preview_args,
+    exact_values,
+    group_means,
+    preview_report,
+    print_pooled,
+    refine,
+)
+from nk_ops_signature import SignatureIndex
+from nk_ops_utils import (
+    OP_KEYS,
+    TAU_ORDER,
+    avg_ops,
+    ensure_dir,
+    iso_now_local,
+    order_tau_counts,
+    shares_from_counts,
+    write_json,
+)
+
+NK_OPS_TAU_VERSION = "0.1.0"
+
+NOISE_REASON_NO_OPS = "no_ops"
+NOISE_REASON_BELOW = "below_activation"
+
+DEFAULT_RULES: Dict[str, Any] = {
+    "version": "0.1.0",
+    "weights": {
+        "A": {"anchor": 1.0, "abst": 1.0, "past": 0.5, "evid": 0.5, "fut": 0.5, "prog": 0.5, "neg": 0.5},
+        "B": {},
+        "C": {"imp": 1.0, "invoke": 1.0, "barrier": 1.0, "dat": 0.5, "acc": 0.5},
+    },
+    "thresholds": {"A": 1.0, "B": 1.0, "C": 1.0},
+}
+
+# active-component bitmask (A=1, B=2, C=4) -> tau code
+_CODE_BY_MASK = ["LOW_OPS", "A", "LOW_OPS", "AB", "C", "AC", "BC", "ABC"]
+_TAU_INDEX = {t: i for i, t in enumerate(TAU_ORDER)}
+_MASK_TO_TAU = np.array([_TAU_INDEX[c] for c in _CODE_BY_MASK], dtype=np.int8)
+_NOISE = _TAU_INDEX["NOISE"]
+_LOW_OPS = _TAU_INDEX["LOW_OPS"]
+
+
+def load_rules(path: Optional[str | Path] = None) -> Dict[str, Any]:
+    if not path:
+        return copy.deepcopy(DEFAULT_RULES)
+    rules = json.loads(Path(path).read_text(encoding="utf-8"))
+    for k in ("version", "weights", "thresholds"):
+        if k not in rules:
+            raise RuntimeError(f"rules {path}: missing key '{k}'")
+    return rules
+
+
+def weight_vectors(rules: Dict[str, Any], ops: Sequence[str]) -> np.ndarray:
+    """(O, 3) weight matrix, columns A, B, C; weights for absent ops are dropped."""
+    W = np.zeros((len(ops), 3), dtype=np.float64)
+    pos = {op: i for i, op in enumerate(ops)}
+    for j, comp in enumerate(("A", "B", "C")):
+        for op, w in rules["weights"].get(comp, {}).items():
+            if op in pos:
+                W[pos[op], j] = float(w)
+    return W
+
+
+@dataclass
+class TauResult:
+    tau_idx: np.ndarray     # (n,) int8 index into TAU_ORDER
+    msv: np.ndarray         # (n, 3) float64 A, B, C
+    noise: np.ndarray       # (n,) int8: 0 = "", 1 = no_ops, 2 = below_activation
+
+    @property
+    def tau(self) -> np.ndarray:
+        return np.asarray(TAU_ORDER, dtype=object)[self.tau_idx]
+
+    @property
+    def noise_reason(self) -> np.ndarray:
+        return np.asarray(["", NOISE_REASON_NO_OPS, NOISE_REASON_BELOW], dtype=object)[self.noise]
+
+    def tau_counts(self) -> Dict[str, int]:
+        c = np.bincount(self.tau_idx, minlength=len(TAU_ORDER))
+        return order_tau_counts({TAU_ORDER[i]: int(v) for i, v in enumerate(c) if v})
+
+    def noise_counts(self) -> Dict[str, int]:
+        c = np.bincount(self.noise, minlength=3)
+        return {r: int(c[i]) for i, r in ((1, NOISE_REASON_NO_OPS), (2, NOISE_REASON_BELOW)) if c[i]}
+
+
+def classify(
+    counts: np.ndarray,
+    ops: Sequence[str],
+    rules: Optional[Dict[str, Any]] = None,
+    core_ops: Sequence[str] = OP_KEYS,
+    index: Optional[SignatureIndex] = None,
+) -> TauResult:
+    """
+    counts: (n, O) operator counts, columns in `ops` order. Only `core_ops` decide NOISE.
+    index: signature index over the count rows; rows are then classified once per
+    distinct signature and broadcast back (see dedup_classify).
+    """
+    if index is not None:
+        u = classify(np.asarray(counts)[index.first], ops, rules, core_ops)
+        return TauResult(tau_idx=index.broadcast(u.tau_idx), msv=index.broadcast(u.msv),
+                         noise=index.broadcast(u.noise))
+    rules = rules or DEFAULT_RULES
+    X = np.asarray(counts, dtype=np.float64)
+    W = weight_vectors(rules, ops)
+    msv = X @ W
+
+    th = rules["thresholds"]
+    thr = np.array([th.get("A", 1.0), th.get("B", 1.0), th.get("C", 1.0)], dtype=np.float64)
+    comp_on = msv >= thr[None, :]
+    # a component without any weight never activates (B in Phase-1)
+    comp_on &= np.abs(W).sum(axis=0)[None, :] > 0
+    mask = comp_on[:, 0] * 1 + comp_on[:, 1] * 2 + comp_on[:, 2] * 4
+    tau_idx = _MASK_TO_TAU[mask]
+
+    core_set = set(core_ops)
+    core = [i for i, op in enumerate(ops) if op in core_set]
+    has_ops = (X[:, core] > 0).any(axis=1) if core else np.zeros(len(X), dtype=bool)
+    tau_idx = np.where(has_ops, tau_idx, _NOISE).astype(np.int8)
+
+    noise = np.zeros(len(X), dtype=np.int8)
+    noise[~has_ops] = 1
+    noise[has_ops & (tau_idx == _LOW_OPS)] = 2
+    return TauResult(tau_idx=tau_idx, msv=msv, noise=noise)
+
+
+def dedup_classify(
+    counts: np.ndarray,
+    ops: Sequence[str],
+    rules: Optional[Dict[str, Any]] = None,
+    core_ops: Sequence[str] = OP_KEYS,
+) -> Tuple[TauResult, SignatureIndex]:
+    """classify() once per distinct operator-count row; also returns the index (for reports)."""
+    index = SignatureIndex.from_matrix(np.asarray(counts))
+    return classify(counts, ops, rules, core_ops, index=index), index
+
+
+def summarize(
+    res: TauResult,
+    counts: np.ndarray,
+    ops: Sequence[str],
+    *,
+    source_file: Optional[str] = None,
+    msv_version: Optional[str] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """build_summary schema from arrays (no per-row dicts)."""
+    n = int(len(res.tau_idx))
+    tau_counts = res.tau_counts()
+    noise = sorted(res.noise_counts().items(), key=lambda kv: (-kv[1], kv[0]))
+    totals = {op: int(v) for op, v in zip(ops, np.asarray(counts).sum(axis=0).tolist())}
+    summary: Dict[str, Any] = {
+        "rows": n,
+        "msv_version": msv_version,
+        "source_file": source_file,
+        "tau_counts": tau_counts,
+        "tau_shares": shares_from_counts(tau_counts, n),
+        "top_noise_reasons": [[a, b] for a, b in noise],
+        "operator_totals": totals,
+        "operator_avg_per_row": avg_ops(totals, n),
+        "generated_at": iso_now_local(),
+        "nk_ops_tau_version": NK_OPS_TAU_VERSION,
+    }
+    if extra:
+        summary.update(extra)
+    return summary
+
+
+def preview_metrics(ops: Sequence[str]) -> list:
+    return [f"tau_{t}" for t in TAU_ORDER] + [f"avg_{op}" for op in ops]
+
+
+def metric_values(
+    counts: np.ndarray,
+    ops: Sequence[str],
+    rules: Optional[Dict[str, Any]] = None,
+    core_ops: Sequence[str] = OP_KEYS,
+) -> np.ndarray:
+    """(n, len(TAU_ORDER) + O) per-row values whose means are tau shares + operator averages."""
+    res, _ = dedup_classify(counts, ops, rules, core_ops)
+    return np.hstack([np.eye(len(TAU_ORDER))[res.tau_idx], np.asarray(counts, dtype=np.float64)])
+
+
+def rules_config(rules: Dict[str, Any], ops: Sequence[str]) -> str:
+    blob = json.dumps({"rules": rules, "ops": list(ops)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Vectorised tau-class + MSV A/C assignment over operator counts.")
+    ap.add_argument("--csv", required=True, help="CSV with operator count columns")
+    ap.add_argument("--outdir", required=True, help="Output directory")
+    ap.add_argument("--msv_version", required=True, help="MSV version, e.g. 0.1.3")
+    ap.add_argument("--rules", default=None, help="Rules JSON (weights + thresholds); default: built-in")
+    ap.add_argument("--author_col", default="", help="Author column for preview strata. If empty, auto-detect.")
+    add_preview_args(ap)
+    ap.add_argument("--quiet", action="store_true")
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args()
+
+    from nk_ops_corpus import detect_author_col, load_corpus, sniff_format
+
+    try:
+        csv_path = Path(args.csv)
+        outdir = ensure_dir(args.outdir)
+        rules = load_rules(args.rules)
+        fmt = sniff_format(csv_path)
+        df = load_corpus(csv_path, fmt=fmt)
+        ops = [c for c in OP_KEYS if c in df.columns]
+        if not ops:
+            raise RuntimeError(f"No operator columns found. Available: {fmt.columns[:60]}")
+        counts = df[ops].to_numpy()
+        if not args.quiet:
+            print(f"[OK] rows={len(df)} ops={len(ops)} rules={rules['version']} msv_version={args.msv_version}")
+
+        base = csv_path.name.split(".")[0]
+        cache = ExactCache(args.preview_cache or None)
+        preview = bool(args.preview or args.preview_width)
+        author_col = args.author_col.strip()
+        if not author_col and (preview or cache.enabled):
+            # only preview strata / cached per-author values use the author (detection is a full pass)
+            try:
+                author_col = detect_author_col(csv_path, fmt)
+            except RuntimeError:
+                author_col = ""
+        authors = df[author_col].astype(str).to_numpy() if author_col in df.columns else np.full(len(df), "all")
+        cache_key = ExactCache.key("nk_ops_tau", csv_path, rules_config(rules, ops))
+        metrics = preview_metrics(ops)
+
+        if preview:
+            sample = StratifiedSample.build(authors, df["sure"].to_numpy() if "sure" in df.columns else None,
+                                            seed=args.preview_seed)
+            rows = RowValues(len(df), lambda idx: metric_values(counts[idx], ops, rules))
+            log = None if args.quiet else (lambda m: print(f"[INFO] {m}"))
+            est = refine(sample, rows, metrics, args.preview or 0.01, args.preview_width, groups=[POOLED], log=log)
+            report = preview_report(est, cache.get(cache_key))
+            report.update({"source_file": str(args.csv), "msv_version": args.msv_version,
+                           "tau_rules_version": rules["version"], "seed": args.preview_seed,
+                           "generated_at": iso_now_local()})
+            out_json = outdir / f"nk_ops_tau_{base}_preview.json"
+            write_json(out_json, report)
+            print_pooled(report)
+            if not args.quiet:
+                print(f"[WROTE] {out_json}")
+            return 0
+
+        res, index = dedup_classify(counts, ops, rules)
+        if not args.quiet:
+            print(f"[INFO] {index.describe()}")
+        df["tau"] = res.tau
+        df["noise_reason"] = res.noise_reason
+        df["msv_A"] = res.msv[:, 0]
+        df["msv_B"] = res.msv[:, 1]
+        df["msv_C"] = res.msv[:, 2]
+
+        out_csv = outdir / f"nk_ops_tau_{base}.csv"
+        df.to_csv(out_csv, index=False, float_format="%.6f")
+        summary = summarize(res, counts, ops, source_file=str(args.csv), msv_version=args.msv_version,
+                            extra={"tau_rules_version": rules["version"], "signature_dedup": index.report()})
+        out_json = outdir / f"nk_ops_tau_{base}_summary.json"
+        write_json(out_json, summary)
+        if cache.enabled:
+            # exact per-author values for later previews of the same input + rules
+            codes, names = pd.factorize(pd.Series(authors), sort=True)
+            vals = np.hstack([np.eye(len(TAU_ORDER))[res.tau_idx], np.asarray(counts, dtype=np.float64)])
+            cache.put(cache_key, exact_values(list(names), metrics, group_means(codes, len(names), vals)))
+        if not args.quiet:
+            print(f"[WROTE] {out_csv}")
+            print(f"[WROTE] {out_json}")
+        print("[SUMMARY]")
+        print(json.dumps({k: summary[k] for k in ("rows", "tau_counts", "top_noise_reasons")}, ensure_ascii=False, indent=2))
+        return 0
+
+    except Exception as ex:
+        print(f"[ERR] {ex}")
+        if args.debug:
+            raise
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
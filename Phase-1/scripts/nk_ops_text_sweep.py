@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_ops_text_sweep.py — NK-Ops Phase-1 script
+
+Purpose:
+    Streaming operator sweep for long non-Qur'an texts (novels, article dumps).
+
+How it works:
+    - The input is read record by record (CSV) or line by line (plain text); nothing
+      holds the full text in memory.
+    - Long records / paragraphs are split into sentence segments on the fly and
+      filtered by min_len_chars. A paragraph is flushed at a blank line, or once it
+      passes PARA_MAX_CHARS (only complete sentences; the trailing one waits).
+    - Segments are tagged and tau-classified (nk_ops_tau) in fixed-size batches and
+      fed into bounded-memory summary accumulators (one for the running chapter,
+      one for the whole text).
+    - Per-segment rows and per-chapter summaries are written as the sweep goes; a
+      chapter summary is flushed as soon as the next chapter starts.
+
+Inputs:
+    --csv  CSV with a text column (+ optional id columns, e.g. id, chapter), or
+    --txt  plain UTF-8 text; chapters start at lines matching --chapter_regex
+           (default: chapter/bölüm/kısım/part + a number or roman numeral, alone on
+           the line or followed by . : ) or a dash)
+    (.gz / .xz / .zst inputs are decompressed on the fly)
+
+Outputs:
+    nk_ops_sweep_{input_basename}.csv               (per segment: ids + tau + MSV A/C + operator counts)
+    nk_ops_sweep_{input_basename}_chapters.jsonl    (one summary per chapter)
+    nk_ops_sweep_{input_basename}_summary.json      (whole text)
+
+Run:
+    python scripts/nk_ops_text_sweep.py --csv book.csv --outdir results --msv_version 0.1.3 \
+        --config configs/config_text_sweep_template.json
+
+Notes:
+    - Deterministic outputs (no randomness)
+    - Logs: [OK]/[WROTE]/[INFO]/[WARN]/[ERR]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+from nk_ops_tagger import OperatorTagger, load_adapter, open_token_cache
+from nk_ops_tau import classify, load_rules
+from nk_ops_utils import SummaryAccumulator, ensure_dir, open_any, sniff_csv, write_json
+
+# a heading word, a number or upper-case roman numeral (case-sensitive, or "Part civil war"
+# would match), then end of line or heading punctuation ("Part 2 of the plan" is prose)
+DEFAULT_CHAPTER_REGEX = r"^\s*(chapter|bölüm|kısım|part)\s+(\d+|(?-i:[IVXLC]+))\s*([.:)\-–—]|$)"
+# a text without blank lines is flushed once its paragraph buffer passes this size
+PARA_MAX_CHARS = 64_000
+_SENT_SPLIT_RX = re.compile(r"(?<=[.!?…])\s+")
+
+
+@dataclass
+class Segment:
+    chapter: str
+    seg_id: str
+    text: str
+
+
+@dataclass
+class SweepConfig:
+    text_col: str = "text"
+    id_cols: List[str] = field(default_factory=lambda: ["id", "chapter"])
+    min_len_chars: int = 15
+
+
+def load_config(path: Optional[str], args: argparse.Namespace) -> SweepConfig:
+    cfg = SweepConfig()
+    if path:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        cfg.text_col = data.get("text_col", cfg.text_col)
+        cfg.id_cols = list(data.get("id_cols", cfg.id_cols))
+        cfg.min_len_chars = int(data.get("min_len_chars", cfg.min_len_chars))
+    # explicit CLI args win over config
+    if args.text_col:
+        cfg.text_col = args.text_col
+    if args.min_len_chars is not None:
+        cfg.min_len_chars = args.min_len_chars
+    return cfg
+
+
+# ---------------------------
+# Streaming segmenters
+# ---------------------------
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENT_SPLIT_RX.split(text or "") if s.strip()]
+
+
+def iter_csv_segments(path: Path, cfg: SweepConfig, sep: Optional[str] = None) -> Iterator[Segment]:
+    encoding, sep_detected = sniff_csv(path)
+    csv.field_size_limit(min(sys.maxsize, 2**31 - 1))  # article dumps carry very long fields
+    with open_any(path, "r", encoding=encoding, errors="replace", newline="") as f:
+        reader = csv.DictReader(f, delimiter=sep or sep_detected)
+        fields = list(reader.fieldnames or [])
+        if cfg.text_col not in fields:
+            raise RuntimeError(f"missing text_col='{cfg.text_col}'. Available: {fields[:60]}")
+        id_cols = [c for c in cfg.id_cols if c in fields]
+        chapter_col = "chapter" if "chapter" in id_cols else None
+        for i, r in enumerate(reader):
+            chapter = (r.get(chapter_col) or "").strip() if chapter_col else ""
+            rid = ":".join((r.get(c) or "").strip() for c in id_cols if c != chapter_col) or str(i)
+            sents = split_sentences(r.get(cfg.text_col) or "")
+            for k, s in enumerate(sents):
+                yield Segment(chapter=chapter, seg_id=rid if len(sents) == 1 else f"{rid}.{k}", text=s)
+
+
+def iter_txt_segments(path: Path, chapter_regex: str = DEFAULT_CHAPTER_REGEX) -> Iterator[Segment]:
+    rx = re.compile(chapter_regex, re.IGNORECASE)
+    chapter = "0"
+    n_chapter = 0
+    para: List[str] = []
+    size = 0
+    k = 0
+
+    def flush(partial: bool = False) -> Iterator[Segment]:
+        # partial: the paragraph goes on, so the last (maybe unfinished) sentence stays
+        # buffered -- unless it alone is over the cap
+        nonlocal k, size
+        sents = split_sentences(" ".join(para))
+        para.clear()
+        size = 0
+        if partial and sents and len(sents[-1]) <= PARA_MAX_CHARS:
+            para.append(sents.pop())
+            size = len(para[0])
+        for s in sents:
+            yield Segment(chapter=chapter, seg_id=f"{n_chapter}.{k}", text=s)
+            k += 1
+
+    with open_any(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if rx.match(line):
+                yield from flush()
+                n_chapter += 1
+                chapter = line.strip() or str(n_chapter)
+                k = 0
+            elif line.strip():
+                para.append(line.strip())
+                size += len(para[-1]) + 1
+                if size > PARA_MAX_CHARS:
+                    yield from flush(partial=True)
+            else:
+                yield from flush()
+        yield from flush()
+
+
+def filter_min_len(segments: Iterator[Segment], min_len_chars: int) -> Iterator[Segment]:
+    for seg in segments:
+        if len(seg.text) >= min_len_chars:
+            yield seg
+
+
+def iter_batches(segments: Iterator[Segment], batch_size: int) -> Iterator[List[Segment]]:
+    batch: List[Segment] = []
+    for seg in segments:
+        batch.append(seg)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------------------
+# Sweep
+# ---------------------------
+
+class ChapterSink:
+    """Holds the running chapter's accumulator; flushes its summary when the chapter changes."""
+
+    def __init__(self, ops: Sequence[str], out_jsonl: Path, source_file: str, msv_version: str):
+        self.ops = list(ops)
+        self.source_file = source_file
+        self.msv_version = msv_version
+        self.f = open_any(out_jsonl, "w", encoding="utf-8")
+        self.current: Optional[str] = None
+        self.acc: Optional[SummaryAccumulator] = None
+        self.seen: set = set()
+        self.flushed = 0
+        self.revisited: List[str] = []
+
+    def add(
+        self,
+        chapter: str,
+        counts: Sequence[Sequence[int]],
+        taus: Sequence[str],
+        noise_reasons: Sequence[str],
+    ) -> None:
+        if chapter != self.current:
+            self.flush()
+            if chapter in self.seen:
+                self.revisited.append(chapter)
+            self.seen.add(chapter)
+            self.current = chapter
+            self.acc = SummaryAccumulator(op_keys=self.ops)
+        assert self.acc is not None
+        self.acc.add_batch(counts, taus, noise_reasons)
+
+    def flush(self) -> None:
+        if self.acc is None:
+            return
+        s = self.acc.summary(source_file=self.source_file, msv_version=self.msv_version,
+                             extra={"chapter": self.current})
+        self.f.write(json.dumps(s, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.flushed += 1
+        self.acc = None
+
+    def close(self) -> None:
+        self.flush()
+        self.f.close()
+
+
+def run_sweep(
+    segments: Iterator[Segment],
+    tagger: OperatorTagger,
+    out_csv: Path,
+    chapters: ChapterSink,
+    total: SummaryAccumulator,
+    batch_size: int,
+    rules: Optional[dict] = None,
+) -> int:
+    n = 0
+    with open_any(out_csv, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["seg_id", "chapter", "n_chars", "tau", "noise_reason", "msv_A", "msv_C"] + tagger.ops)
+        for batch in iter_batches(segments, batch_size):
+            arr = tagger.tag([s.text for s in batch])
+            res = classify(arr, tagger.ops, rules)
+            counts = arr.tolist()
+            taus = res.tau.tolist()
+            reasons = res.noise_reason.tolist()
+            total.add_batch(counts, taus, reasons)
+            # contiguous runs of one chapter go to the chapter accumulator together
+            start = 0
+            for i in range(1, len(batch) + 1):
+                if i == len(batch) or batch[i].chapter != batch[start].chapter:
+                    chapters.add(batch[start].chapter, counts[start:i], taus[start:i], reasons[start:i])
+                    start = i
+            w.writerows(
+                [s.seg_id, s.chapter, len(s.text), t, nr, f"{m[0]:.6f}", f"{m[2]:.6f}"] + c
+                for s, t, nr, m, c in zip(batch, taus, reasons, res.msv.tolist(), counts)
+            )
+            n += len(batch)
+    return n
+
+
+def log(prefix: str, msg: str, quiet: bool = False) -> None:
+    if not quiet:
+        print(f"[{prefix}] {msg}")
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Streaming NK-Ops sweep for long texts.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--csv", help="Input CSV (text column + optional id columns)")
+    src.add_argument("--txt", help="Plain UTF-8 text input")
+    ap.add_argument("--outdir", required=True, help="Output directory")
+    ap.add_argument("--msv_version", required=True, help="MSV version, e.g. 0.1.3")
+    ap.add_argument("--config", default=None, help="Optional config JSON (text_col, id_cols, min_len_chars)")
+    ap.add_argument("--text_col", default=None, help="Text column name (default: config or 'text')")
+    ap.add_argument("--sep", default=None, help="CSV separator override")
+    ap.add_argument("--min_len_chars", type=int, default=None, help="Drop segments shorter than this")
+    ap.add_argument("--chapter_regex", default=DEFAULT_CHAPTER_REGEX, help="Chapter heading regex (--txt)")
+    ap.add_argument("--adapter", default=None, help="Operator adapter JSON (default: built-in 'tr')")
+    ap.add_argument("--rules", default=None, help="Tau rules JSON (default: built-in, see nk_ops_tau.py)")
+    ap.add_argument("--token_cache", default=None, help="On-disk token cache (sqlite)")
+    ap.add_argument("--batch_size", type=int, default=20_000, help="Segments per tagging batch")
+    ap.add_argument("--quiet", action="store_true")
+    ap.add_argument("--debug", action="store_true")
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    outdir = ensure_dir(args.outdir)
+
+    try:
+        cfg = load_config(args.config, args)
+        in_path = Path(args.csv or args.txt)
+        if not in_path.exists():
+            raise RuntimeError(f"input not found: {in_path}")
+        base = in_path.name.split(".")[0]
+
+        adapter = load_adapter(args.adapter)
+        cache = open_token_cache(adapter, args.token_cache)
+        tagger = OperatorTagger(adapter, cache=cache)
+        rules = load_rules(args.rules)
+
+        if args.csv:
+            raw = iter_csv_segments(in_path, cfg, sep=args.sep)
+        else:
+            raw = iter_txt_segments(in_path, args.chapter_regex)
+        segments = filter_min_len(raw, cfg.min_len_chars)
+        log("OK", f"input={in_path} text_col='{cfg.text_col}' min_len_chars={cfg.min_len_chars} "
+                  f"adapter={tagger.version} msv_version={args.msv_version}", args.quiet)
+
+        out_csv = outdir / f"nk_ops_sweep_{base}.csv"
+        out_chapters = outdir / f"nk_ops_sweep_{base}_chapters.jsonl"
+        chapters = ChapterSink(tagger.ops, out_chapters, str(args.csv or args.txt), args.msv_version)
+        total = SummaryAccumulator(op_keys=tagger.ops)
+        try:
+            n = run_sweep(segments, tagger, out_csv, chapters, total, args.batch_size, rules)
+        finally:
+            chapters.close()
+            cache.close()
+        log("WROTE", str(out_csv), args.quiet)
+        log("WROTE", f"{out_chapters} (chapters={chapters.flushed})", args.quiet)
+        if chapters.revisited:
+            log("WARN", f"chapters not contiguous, summarised in several parts: {chapters.revisited[:10]}", args.quiet)
+        if n == 0:
+            raise RuntimeError("input has 0 segments after min_len_chars filtering")
+
+        summary = total.summary(
+            source_file=str(args.csv or args.txt),
+            msv_version=args.msv_version,
+            extra={
+                "row_count": n,
+                "text_col": cfg.text_col,
+                "min_len_chars": cfg.min_len_chars,
+                "chapters": chapters.flushed,
+                "adapter": tagger.version,
+                "tau_rules_version": rules["version"],
+                "token_cache": cache.stats.as_dict(),
+            },
+        )
+        summary_path = outdir / f"nk_ops_sweep_{base}_summary.json"
+        write_json(summary_path, summary)
+        log("WROTE", str(summary_path), args.quiet)
+
+        print("[SUMMARY]")
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return 0
+
+    except Exception as ex:
+        log("ERR", str(ex), quiet=False)
+        if args.debug:
+            raise
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+# nk_ops_token_cache.py
+# NK-Ops Phase-1 — per-token operator analysis cache (in-process LRU + optional on-disk store)
+# v0.1 (utility module; keep deterministic)
+#
+# Keys are (adapter version, normalized token). The token is normalized exactly like the
+# tagger does (Turkish-aware lowercasing, apostrophes removed); it is NOT ASCII-folded,
+# because folding (ç->c, ı->i) would merge tokens that the suffix rules tell apart.
+# Values are the operator bitmasks produced by OperatorTagger.analyze, so a cached
+# result is identical to a fresh one and caching never changes outputs.
+
+from __future__ import annotations
+
+import sqlite3
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from nk_ops_utils import ensure_dir
+
+# sqlite default limit on bound parameters is 999
+_SQL_CHUNK = 900
+
+
+@dataclass
+class CacheStats:
+    lookups: int = 0
+    mem_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.mem_hits + self.disk_hits) / self.lookups if self.lookups else 0.0
+
+    def merge(self, other: Dict[str, int]) -> None:
+        for k in ("lookups", "mem_hits", "disk_hits", "misses"):
+            setattr(self, k, getattr(self, k) + int(other.get(k, 0)))
+
+    def as_dict(self) -> Dict[str, float]:
+        d: Dict[str, float] = dict(asdict(self))
+        d["hit_rate"] = self.hit_rate
+        return d
+
+
+class TokenCache:
+    """
+    token -> operator bitmask, scoped to one adapter version.
+    Lookups go LRU -> disk store (if any) -> analyze(); only unseen tokens are analysed.
+    """
+
+    def __init__(self, version: str, maxsize: int = 200_000, path: Optional[str | Path] = None):
+        self.version = version
+        self.maxsize = maxsize
+        self.path = Path(path) if path else None
+        self.stats = CacheStats()
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if self.path is not None:
+            ensure_dir(self.path.parent)
+            self._db = sqlite3.connect(str(self.path), timeout=60)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS token_ops ("
+                " version TEXT NOT NULL, token TEXT NOT NULL, mask INTEGER NOT NULL,"
+                " PRIMARY KEY (version, token))"
+            )
+            self._db.commit()
+
+    def spec(self) -> Tuple[str, int, Optional[str]]:
+        """Constructor args, so worker processes can open their own cache."""
+        return self.version, self.maxsize, str(self.path) if self.path else None
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def _remember(self, token: str, mask: int) -> None:
+        self._lru[token] = mask
+        self._lru.move_to_end(token)
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def _disk_get(self, tokens: Sequence[str]) -> Dict[str, int]:
+        found: Dict[str, int] = {}
+        if self._db is None or not tokens:
+            return found
+        for i in range(0, len(tokens), _SQL_CHUNK):
+            chunk = list(tokens[i:i + _SQL_CHUNK])
+            q = "SELECT token, mask FROM token_ops WHERE version = ? AND token IN (%s)" % ",".join("?" * len(chunk))
+            for tok, mask in self._db.execute(q, [self.version] + chunk):
+                found[tok] = int(mask)
+        return found
+
+    def _disk_put(self, items: Sequence[Tuple[str, int]]) -> None:
+        if self._db is None or not items:
+            return
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO token_ops (version, token, mask) VALUES (?, ?, ?)",
+                [(self.version, t, m) for t, m in items],
+            )
+
+    def get_many(self, tokens: Sequence[str], analyze: Callable[[str], int]) -> List[int]:
+        """Masks for distinct tokens, in the same order."""
+        out: List[Optional[int]] = [None] * len(tokens)
+        pending: List[int] = []
+        self.stats.lookups += len(tokens)
+        for i, tok in enumerate(tokens):
+            mask = self._lru.get(tok)
+            if mask is None:
+                pending.append(i)
+            else:
+                self._lru.move_to_end(tok)
+                out[i] = mask
+        self.stats.mem_hits += len(tokens) - len(pending)
+
+        if pending:
+            on_disk = self._disk_get([tokens[i] for i in pending])
+            fresh: List[Tuple[str, int]] = []
+            for i in pending:
+                tok = tokens[i]
+                mask = on_disk.get(tok)
+                if mask is None:
+                    mask = analyze(tok)
+                    fresh.append((tok, mask))
+                out[i] = mask
+                self._remember(tok, mask)
+            self.stats.disk_hits += len(on_disk)
+            self.stats.misses += len(fresh)
+            self._disk_put(fresh)
+
+        return [int(m) for m in out]  # type: ignore[arg-type]
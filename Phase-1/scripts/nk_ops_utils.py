@@ -0,0 +1,457 @@
+# nk_ops_utils.py
+# NK-Ops Phase-1 — shared utilities (IO, logging, schema helpers)
+# v0.1 (utility module; keep deterministic)
+
+from __future__ import annotations
+
+import codecs
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ---------------------------
+# Versioning
+# ---------------------------
+
+NK_OPS_UTILS_VERSION = "0.1.0"
+
+
+# ---------------------------
+# Small helpers
+# ---------------------------
+
+def iso_now_local() -> str:
+    """ISO timestamp in local time (no timezone conversion); SOURCE_DATE_EPOCH pins it."""
+    # We intentionally keep local clock semantics (reproducible enough for logs).
+    # Reproducibility checks set SOURCE_DATE_EPOCH so repeated runs write identical bytes.
+    epoch = os.environ.get("SOURCE_DATE_EPOCH", "").strip()
+    if epoch:
+        return datetime.fromtimestamp(int(epoch), tz=timezone.utc).replace(tzinfo=None).isoformat()
+    return datetime.now().replace(microsecond=0).isoformat()
+
+
+def ensure_dir(p: str | Path) -> Path:
+    pp = Path(p)
+    pp.mkdir(parents=True, exist_ok=True)
+    return pp
+
+
+def as_int(x: Any, default: int = 0) -> int:
+    try:
+        return int(x)
+    except Exception:
+        return default
+
+
+def as_float(x: Any, default: float = 0.0) -> float:
+    try:
+        return float(x)
+    except Exception:
+        return default
+
+
+# ---------------------------
+# Compressed IO (.gz / .xz / .zst, chosen by suffix)
+# ---------------------------
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".xz": "xz", ".zst": "zstd"}
+
+# speed-oriented defaults (traces are repetitive; higher levels buy little)
+_GZIP_LEVEL = 6
+_XZ_PRESET = 6
+_ZSTD_LEVEL = 3
+
+
+def compression_of(path: str | Path) -> Optional[str]:
+    return COMPRESSION_SUFFIXES.get(Path(path).suffix.lower())
+
+
+def strip_compression_suffix(path: str | Path) -> Path:
+    """results/trace.csv.gz -> results/trace.csv (uncompressed paths unchanged)."""
+    p = Path(path)
+    return p.with_suffix("") if compression_of(p) else p
+
+
+def open_any(
+    path: str | Path,
+    mode: str = "r",
+    encoding: Optional[str] = "utf-8",
+    errors: Optional[str] = None,
+    newline: Optional[str] = None,
+) -> IO[Any]:
+    """
+    open() that streams (de)compression for .gz / .xz / .zst paths (plain open otherwise).
+    mode: "r", "w", "a", "rb", "wb", "ab". Only the bytes actually read are decompressed,
+    so reading a head sample stays cheap. .zst needs the optional `zstandard` package.
+    """
+    p = Path(path)
+    comp = compression_of(p)
+    binary = "b" in mode
+    raw_mode = mode.replace("t", "").replace("b", "") + "b"
+    if comp is None:
+        if binary:
+            return p.open(raw_mode)
+        return p.open(mode, encoding=encoding, errors=errors, newline=newline)
+
+    if comp == "gzip":
+        f: IO[bytes] = gzip.open(p, raw_mode, compresslevel=_GZIP_LEVEL)  # type: ignore[assignment]
+    elif comp == "xz":
+        if "r" in raw_mode:
+            f = lzma.open(p, raw_mode)  # type: ignore[assignment]
+        else:
+            f = lzma.open(p, raw_mode, preset=_XZ_PRESET)  # type: ignore[assignment]
+    else:
+        try:
+            import zstandard
+        except ImportError as ex:
+            raise RuntimeError(f"{p}: .zst needs the 'zstandard' package ({ex})") from ex
+        if "r" in raw_mode:
+            f = zstandard.open(p, raw_mode, dctx=zstandard.ZstdDecompressor())
+        else:
+            f = zstandard.open(p, raw_mode, cctx=zstandard.ZstdCompressor(level=_ZSTD_LEVEL))
+    if binary:
+        return f
+    return io.TextIOWrapper(f, encoding=encoding, errors=errors, newline=newline)  # type: ignore[arg-type]
+
+
+# ---------------------------
+# CSV / JSON IO
+# ---------------------------
+
+def _read_head(path: str | Path, sample_bytes: int) -> bytes:
+    # decompresses only the head of .gz/.xz/.zst files
+    with open_any(path, "rb") as f:
+        return f.read(sample_bytes)
+
+
+def _sniff_sep_text(text: str) -> str:
+    # drop a trailing partial line so the sniffer sees whole records only
+    if "\n" in text:
+        text = text[: text.rindex("\n")]
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=[",", "\t", ";", "|"])
+        return dialect.delimiter
+    except Exception:
+        return ","
+
+
+def sniff_encoding(raw: bytes) -> str:
+    """
+    Pick an encoding from a byte sample: utf-8-sig (BOM), utf-8, cp1254, latin1.
+    The sample may end mid-character, so utf-8 is checked incrementally.
+    latin1 never fails and is the last resort.
+    """
+    if raw.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(raw, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        raw.decode("cp1254")
+        return "cp1254"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+def detect_sep(path: str | Path, sample_bytes: int = 64_000) -> str:
+    """
+    Try to detect separator using csv.Sniffer.
+    Falls back to comma if detection fails.
+    """
+    raw = _read_head(path, sample_bytes)
+    # decode permissively
+    return _sniff_sep_text(raw.decode("utf-8", errors="replace"))
+
+
+def sniff_csv(path: str | Path, sample_bytes: int = 64_000) -> Tuple[str, str]:
+    """
+    Detect (encoding, separator) from the first `sample_bytes` of a file.
+    Only the sample is read; the caller parses the file once with the result.
+    """
+    raw = _read_head(path, sample_bytes)
+    encoding = sniff_encoding(raw)
+    return encoding, _sniff_sep_text(raw.decode(encoding, errors="replace"))
+
+
+def read_csv_rows(
+    path: str | Path,
+    sep: Optional[str] = None,
+    encoding: str = "utf-8",
+) -> Tuple[List[Dict[str, str]], str, List[str]]:
+    """
+    Read CSV into list-of-dicts (all values as strings).
+    Returns: (rows, sep_used, fieldnames)
+    """
+    p = Path(path)
+    sep_used = sep or detect_sep(p)
+    with open_any(p, "r", encoding=encoding, errors="replace", newline="") as f:
+        reader = csv.DictReader(f, delimiter=sep_used)
+        rows: List[Dict[str, str]] = []
+        for r in reader:
+            if r is None:
+                continue
+            rows.append({k: (v if v is not None else "") for k, v in r.items()})
+        fieldnames = list(reader.fieldnames or [])
+    return rows, sep_used, fieldnames
+
+
+def write_csv(path: str | Path, rows: Sequence[Dict[str, Any]], fieldnames: Sequence[str]) -> None:
+    # bulk writer; same bytes as csv.DictWriter (see nk_ops_table_io.py)
+    from nk_ops_table_io import columns_from_rows, write_csv_columns
+
+    write_csv_columns(path, columns_from_rows(rows, fieldnames), decimals=None)
+
+
+def write_json(path: str | Path, obj: Any) -> None:
+    p = Path(path)
+    ensure_dir(p.parent)
+    with open_any(p, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+
+
+def write_jsonl(path: str | Path, rows: Iterable[Dict[str, Any]]) -> None:
+    p = Path(path)
+    ensure_dir(p.parent)
+    with open_any(p, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+
+# ---------------------------
+# Schema helpers for Phase-1 outputs
+# ---------------------------
+
+TAU_ORDER = ["NOISE", "LOW_OPS", "A", "C", "AC", "AB", "BC", "ABC"]
+
+OP_KEYS = [
+    "neg", "dat", "acc", "invoke", "anchor",
+    "past", "evid", "fut", "prog",
+    "abst", "imp", "barrier",
+]
+
+
+def count_tau(rows: Sequence[Dict[str, Any]], tau_key: str = "tau") -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for r in rows:
+        t = str(r.get(tau_key, "")).strip() or "NOISE"
+        counts[t] = counts.get(t, 0) + 1
+    return order_tau_counts(counts)
+
+
+def order_tau_counts(counts: Dict[str, int]) -> Dict[str, int]:
+    # keep deterministic ordering downstream
+    ordered: Dict[str, int] = {}
+    for k in TAU_ORDER:
+        if k in counts:
+            ordered[k] = counts[k]
+    for k in sorted(counts.keys()):
+        if k not in ordered:
+            ordered[k] = counts[k]
+    return ordered
+
+
+def shares_from_counts(counts: Dict[str, int], total: int) -> Dict[str, float]:
+    if total <= 0:
+        return {k: 0.0 for k in counts}
+    return {k: counts[k] / total for k in counts}
+
+
+def sum_ops(rows: Sequence[Dict[str, Any]], op_keys: Sequence[str] = OP_KEYS) -> Dict[str, int]:
+    totals = {k: 0 for k in op_keys}
+    for r in rows:
+        for k in op_keys:
+            totals[k] += as_int(r.get(k, 0), 0)
+    return totals
+
+
+def avg_ops(totals: Dict[str, int], n: int) -> Dict[str, float]:
+    if n <= 0:
+        return {k: 0.0 for k in totals}
+    return {k: totals[k] / n for k in totals}
+
+
+def top_k_counts(items: Iterable[str], k: int = 10) -> List[Tuple[str, int]]:
+    m: Dict[str, int] = {}
+    for x in items:
+        if not x:
+            continue
+        m[x] = m.get(x, 0) + 1
+    return sorted(m.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+
+
+def build_summary(
+    rows: Sequence[Dict[str, Any]],
+    *,
+    source_file: Optional[str] = None,
+    msv_version: Optional[str] = None,
+    tau_key: str = "tau",
+    noise_reason_key: str = "noise_reason",
+    op_keys: Sequence[str] = OP_KEYS,
+    extra: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Generic Phase-1 summary schema. Works for author sweeps and non-Qur'an text sweeps.
+    """
+    n = len(rows)
+    tau_counts = count_tau(rows, tau_key=tau_key)
+    tau_shares = shares_from_counts(tau_counts, n)
+
+    noise_reasons = top_k_counts((str(r.get(noise_reason_key, "")).strip() for r in rows), k=10)
+    # Convert to list-of-lists to be JSON-stable (avoid tuple vs list differences)
+    noise_reasons_ll = [[a, b] for a, b in noise_reasons]
+
+    op_totals = sum_ops(rows, op_keys=op_keys)
+    op_avg = avg_ops(op_totals, n)
+
+    summary: Dict[str, Any] = {
+        "rows": n,
+        "msv_version": msv_version,
+        "source_file": source_file,
+        "tau_counts": tau_counts,
+        "tau_shares": tau_shares,
+        "top_noise_reasons": noise_reasons_ll,
+        "operator_totals": op_totals,
+        "operator_avg_per_row": op_avg,
+        "generated_at": iso_now_local(),
+        "nk_ops_utils_version": NK_OPS_UTILS_VERSION,
+    }
+    if extra:
+        summary.update(extra)
+    return summary
+
+
+class SummaryAccumulator:
+    """
+    Streaming counterpart of build_summary: memory is constant in the number of rows
+    (tau / noise-reason tallies + operator totals only), so very long texts can be
+    summarised chunk by chunk. add(row) mirrors build_summary exactly; add_batch()
+    takes operator-count rows directly and only tallies tau when taus are given.
+    """
+
+    def __init__(
+        self,
+        op_keys: Sequence[str] = OP_KEYS,
+        tau_key: str = "tau",
+        noise_reason_key: str = "noise_reason",
+    ):
+        self.op_keys = list(op_keys)
+        self.tau_key = tau_key
+        self.noise_reason_key = noise_reason_key
+        self.n = 0
+        self.tau_counts: Dict[str, int] = {}
+        self.noise_counts: Dict[str, int] = {}
+        self.op_totals: Dict[str, int] = {k: 0 for k in self.op_keys}
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.n += 1
+        t = str(row.get(self.tau_key, "")).strip() or "NOISE"
+        self.tau_counts[t] = self.tau_counts.get(t, 0) + 1
+        nr = str(row.get(self.noise_reason_key, "")).strip()
+        if nr:
+            self.noise_counts[nr] = self.noise_counts.get(nr, 0) + 1
+        for k in self.op_keys:
+            self.op_totals[k] += as_int(row.get(k, 0), 0)
+
+    def add_batch(
+        self,
+        counts: Sequence[Sequence[int]],
+        taus: Optional[Sequence[str]] = None,
+        noise_reasons: Optional[Sequence[str]] = None,
+    ) -> None:
+        """counts: one row per segment, columns in op_keys order."""
+        self.n += len(counts)
+        for c in counts:
+            for k, v in zip(self.op_keys, c):
+                self.op_totals[k] += int(v)
+        for t in taus or ():
+            t = str(t).strip() or "NOISE"
+            self.tau_counts[t] = self.tau_counts.get(t, 0) + 1
+        for nr in noise_reasons or ():
+            nr = str(nr).strip()
+            if nr:
+                self.noise_counts[nr] = self.noise_counts.get(nr, 0) + 1
+
+    def summary(
+        self,
+        *,
+        source_file: Optional[str] = None,
+        msv_version: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        tau_counts = order_tau_counts(self.tau_counts)
+        noise_reasons = sorted(self.noise_counts.items(), key=lambda kv: (-kv[1], kv[0]))[:10]
+        summary: Dict[str, Any] = {
+            "rows": self.n,
+            "msv_version": msv_version,
+            "source_file": source_file,
+            "tau_counts": tau_counts,
+            "tau_shares": shares_from_counts(tau_counts, self.n),
+            "top_noise_reasons": [[a, b] for a, b in noise_reasons],
+            "operator_totals": dict(self.op_totals),
+            "operator_avg_per_row": avg_ops(self.op_totals, self.n),
+            "generated_at": iso_now_local(),
+            "nk_ops_utils_version": NK_OPS_UTILS_VERSION,
+        }
+        if extra:
+            summary.update(extra)
+        return summary
+
+
+# ---------------------------
+# Fieldname utilities
+# ---------------------------
+
+def pick_existing_col(fieldnames: Sequence[str], candidates: Sequence[str]) -> Optional[str]:
+    fn = set(fieldnames)
+    for c in candidates:
+        if c in fn:
+            return c
+    return None
+
+
+def require_cols(fieldnames: Sequence[str], required: Sequence[str]) -> None:
+    missing = [c for c in required if c not in set(fieldnames)]
+    if missing:
+        raise RuntimeError(f"Missing required columns: {missing}. Available: {list(fieldnames)[:60]}")
+
+
+# ---------------------------
+# Convenience: safe filename
+# ---------------------------
+
+def author_slug(s: str) -> str:
+    """
+    Author key of the sweep outputs (file names and the all_authors_* tables):
+    filesystem-friendly but stable; Unicode letters are kept.
+    """
+    s = str(s).strip()
+    s = s.replace("\\", "_").replace("/", "_").replace(" ", "_")
+    s = "".join(ch for ch in s if ch.isalnum() or ch in ("_", "-", "."))
+    return s[:120] if len(s) > 120 else s
+
+
+def slugify_ascii(s: str) -> str:
+    """
+    Simple ASCII slugifier (no Turkish chars) — aligns with your filename convention.
+    """
+    import re
+    s = s.strip().lower()
+    # Replace Turkish chars and common diacritics crudely
+    repl = str.maketrans({
+        "ç":"c","ğ":"g","ı":"i","ö":"o","ş":"s","ü":"u",
+        "â":"a","î":"i","û":"u",
+        "’":"", "'":"",
+    })
+    s = s.translate(repl)
+    s = re.sub(r"[^a-z0-9]+", "_", s)
+    s = re.sub(r"_+", "_", s).strip("_")
+    return s or "untitled"
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nk_phase2_window_cooc.py — NK-Ops Phase-2 sliding-window operator co-occurrence (NPMI)
+
+Purpose:
+    Phase-2 interaction graphs are segment-level. Some interactions (ABL-driven causal
+    chains) span neighbouring ayets, so this engine builds NPMI co-occurrence graphs over
+    windows of w consecutive ayets within a sure, per author and pooled, for several w.
+
+How it works:
+    - Per author, segment operator counts are folded into binary ayet presence on the
+      canonical 6236-ayet axis, operators as columns, plus a coverage mask of the ayets
+      the author has rows for.
+    - One running (prefix) count of operator-bearing ayets is built per author. The count
+      of a window is that of the previous window plus the entering ayet minus the leaving
+      one, i.e. S[t + w] - S[t]; an operator is present in the window when its count > 0.
+      The single prefix pass serves every window size, so each extra w costs one
+      subtraction and one matrix product (linear in ayets, nothing quadratic in w).
+    - Windows never cross a sure boundary; sures shorter than w give no window.
+    - Only windows whose ayets are all covered by the author count (a second prefix sum
+      over coverage): an ayet without rows is unknown, not an ayet without operators,
+      so gaps would inflate N and bias NPMI upward. The pooled "ALL" graph sums these.
+    - Per window size: N windows, n_i windows with operator i, n_ij windows with both
+      (presence.T @ presence). NPMI_ij = log(p_ij / (p_i p_j)) / -log(p_ij)
+      (-1 if the pair never co-occurs, 1 if both are in every window).
+    - w = 1 is the ayet-level graph (window = one ayet).
+
+Inputs:
+    Per-segment CSV with author, sure, ayet and operator count columns (nk_ops_tagger output).
+    Default operators: the Phase-2 tags present (CASE.ABL, PAST.DI, ...), else the
+    Phase-1 operator keys present. --ablate drops operators (ablation runs).
+
+Outputs (under --outdir):
+    window_cooc_edges.csv   (author, window, op_a, op_b, n_a, n_b, n_ab, n_windows, npmi)
+                            author "ALL" = counts pooled over authors
+    window_cooc_summary.json
+
+Run:
+    python Phase-2/scripts/nk_phase2_window_cooc.py --csv tags_all.csv --outdir results --windows 1,2,3,5,8
+
+Notes:
+    - Deterministic (authors sorted, operator pairs in column order)
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Phase-1" / "scripts"))
+from nk_ops_corpus import detect_author_col, load_corpus, sniff_format  # noqa: E402
+from nk_ops_divergence_index import N_AYETS, SURE_OFFSETS, positions_of  # noqa: E402
+from nk_ops_table_io import write_table  # noqa: E402
+from nk_ops_tagger import ADAPTER_TR  # noqa: E402
+from nk_ops_utils import OP_KEYS, ensure_dir, iso_now_local, write_json  # noqa: E402
+
+NK_PHASE2_WINDOW_COOC_VERSION = "0.1.0"
+
+PHASE2_TAGS = [op for op in ADAPTER_TR["operators"] if "." in op]
+
+# sure index (0-based) of every canonical ayet position
+_SURE_OF = np.repeat(np.arange(len(SURE_OFFSETS) - 1), np.diff(SURE_OFFSETS))
+
+
+def ayet_presence(pos: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (N_AYETS, K) bool: operator present in any segment of the ayet, and
+    (N_AYETS,) bool: the ayet has at least one segment (coverage).
+    """
+    acc = np.zeros((N_AYETS, counts.shape[1]), dtype=np.int64)
+    np.add.at(acc, pos, counts.astype(np.int64))
+    covered = np.zeros(N_AYETS, dtype=bool)
+    covered[pos] = True
+    return acc > 0, covered
+
+
+def window_counts(
+    presence: np.ndarray,
+    windows: Sequence[int],
+    covered: Optional[np.ndarray] = None,
+) -> Dict[int, Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    {w: (n_windows, n_i (K,), n_ij (K, K))} for windows of w consecutive ayets within a sure,
+    all of them covered (default: every ayet covered).
+    One prefix sum over the ayet axis (and one over coverage) serves every w.
+    """
+    K = presence.shape[1]
+    S = np.zeros((N_AYETS + 1, K), dtype=np.int32)
+    np.cumsum(presence, axis=0, out=S[1:])
+    C = np.zeros(N_AYETS + 1, dtype=np.int32)
+    np.cumsum(np.ones(N_AYETS, dtype=bool) if covered is None else covered, out=C[1:])
+    out: Dict[int, Tuple[int, np.ndarray, np.ndarray]] = {}
+    for w in windows:
+        starts = np.arange(0, N_AYETS - w + 1)
+        starts = starts[(_SURE_OF[starts] == _SURE_OF[starts + w - 1]) & (C[starts + w] - C[starts] == w)]
+        P = (S[starts + w] - S[starts]) > 0          # (n_windows, K) presence per window
+        Pf = P.astype(np.float64)
+        out[w] = (len(starts), P.sum(axis=0).astype(np.int64), (Pf.T @ Pf).astype(np.int64))
+    return out
+
+
+def npmi(n: int, n_i: np.ndarray, n_ij: np.ndarray) -> np.ndarray:
+    """(K, K) NPMI from window counts."""
+    if n == 0:
+        return np.full(n_ij.shape, np.nan)
+    p_i = n_i / n
+    p_ij = n_ij / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pmi = np.log(p_ij) - np.log(p_i)[:, None] - np.log(p_i)[None, :]
+        out = pmi / -np.log(p_ij)
+    out = np.where(p_ij == 0, -1.0, out)
+    out = np.where(p_ij == 1, 1.0, out)
+    return out
+
+
+def edge_columns(
+    author: str,
+    counts: Dict[int, Tuple[int, np.ndarray, np.ndarray]],
+    ops: Sequence[str],
+    min_count: int,
+) -> Dict[str, List[Any]]:
+    cols: Dict[str, List[Any]] = {k: [] for k in ("author", "window", "op_a", "op_b", "n_a", "n_b", "n_ab", "n_windows", "npmi")}
+    iu, ju = np.triu_indices(len(ops), k=1)
+    for w, (n, n_i, n_ij) in counts.items():
+        m = npmi(n, n_i, n_ij)
+        keep = n_ij[iu, ju] >= min_count
+        a, b = iu[keep], ju[keep]
+        k = int(keep.sum())
+        cols["author"] += [author] * k
+        cols["window"] += [w] * k
+        cols["op_a"] += [ops[i] for i in a]
+        cols["op_b"] += [ops[j] for j in b]
+        cols["n_a"] += n_i[a].tolist()
+        cols["n_b"] += n_i[b].tolist()
+        cols["n_ab"] += n_ij[a, b].tolist()
+        cols["n_windows"] += [n] * k
+        cols["npmi"] += m[a, b].tolist()
+    return cols
+
+
+def pick_ops(columns: Sequence[str], ops_arg: str, ablate: Sequence[str]) -> List[str]:
+    if ops_arg:
+        ops = [o.strip() for o in ops_arg.split(",") if o.strip()]
+        missing = [o for o in ops if o not in columns]
+        if missing:
+            raise RuntimeError(f"operator columns not found: {missing}")
+    else:
+        ops = [c for c in PHASE2_TAGS if c in columns] or [c for c in OP_KEYS if c in columns]
+    ops = [o for o in ops if o not in set(ablate)]
+    if len(ops) < 2:
+        raise RuntimeError(f"need at least 2 operator columns, got {ops}")
+    return ops
+
+
+def parse_windows(spec: str) -> List[int]:
+    ws = sorted({int(x) for x in spec.split(",") if x.strip()})
+    if not ws or ws[0] < 1:
+        raise RuntimeError(f"bad --windows {spec!r} (positive integers, e.g. 1,2,3,5)")
+    return ws
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Sliding-window (consecutive ayets) operator co-occurrence NPMI graphs.")
+    ap.add_argument("--csv", required=True, help="Per-segment CSV with author, sure, ayet, operator counts")
+    ap.add_argument("--outdir", required=True, help="Output directory")
+    ap.add_argument("--author_col", default="", help="Author column name. If empty, auto-detect.")
+    ap.add_argument("--windows", default="1,2,3,5,8", help="Window sizes in ayets, e.g. 1,2,3,5,8")
+    ap.add_argument("--ops", default="", help="Comma-separated operator columns (default: Phase-2 tags present)")
+    ap.add_argument("--ablate", default="", help="Comma-separated operators to remove (ablation)")
+    ap.add_argument("--min_count", type=int, default=1, help="Keep edges with n_ab >= this")
+    ap.add_argument("--no_pooled", action="store_true", help="Skip the pooled 'ALL' graph")
+    ap.add_argument("--npmi_edge", type=float, default=0.1, help="NPMI above which an edge counts in the summary")
+    ap.add_argument("--debug", action="store_true")
+    args = ap.parse_args()
+
+    try:
+        outdir = ensure_dir(args.outdir)
+        windows = parse_windows(args.windows)
+        fmt = sniff_format(args.csv)
+        author_col = args.author_col.strip() or detect_author_col(args.csv, fmt)
+        ablate = [o.strip() for o in args.ablate.split(",") if o.strip()]
+        ops = pick_ops(fmt.columns, args.ops, ablate)
+        df = load_corpus(args.csv, columns=["sure", "ayet"] + ops, author_col=author_col, fmt=fmt)
+        df = df.dropna(subset=[author_col, "sure", "ayet"])
+
+        pos = positions_of(df["sure"].to_numpy(dtype=np.int64), df["ayet"].to_numpy(dtype=np.int64))
+        bad = int((pos < 0).sum())
+        if bad:
+            print(f"[WARN] {bad} rows outside the canonical ayet range skipped")
+        X = df[ops].fillna(0).to_numpy(dtype=np.int64)
+        author = df[author_col].astype(str).to_numpy()
+        authors = sorted(a for a in set(author.tolist()) if a.strip())
+        print(f"[OK] rows={len(df)} authors={len(authors)} ops={len(ops)} windows={windows}"
+              + (f" ablate={ablate}" if ablate else ""))
+
+        edges: Dict[str, List[Any]] = {}
+        summary_rows: Dict[str, Any] = {}
+        pooled: Optional[Dict[int, Tuple[int, np.ndarray, np.ndarray]]] = None
+        for a in authors:
+            sel = (author == a) & (pos >= 0)
+            presence, covered = ayet_presence(pos[sel], X[sel])
+            counts = window_counts(presence, windows, covered)
+            if not args.no_pooled:
+                if pooled is None:
+                    pooled = {w: (n, ni.copy(), nij.copy()) for w, (n, ni, nij) in counts.items()}
+                else:
+                    pooled = {w: (pooled[w][0] + n, pooled[w][1] + ni, pooled[w][2] + nij)
+                              for w, (n, ni, nij) in counts.items()}
+            _extend(edges, edge_columns(a, counts, ops, args.min_count))
+            summary_rows[a] = _summarize(counts, args.npmi_edge)
+        if pooled is not None:
+            _extend(edges, edge_columns("ALL", pooled, ops, args.min_count))
+            summary_rows["ALL"] = _summarize(pooled, args.npmi_edge)
+
+        out_csv = outdir / "window_cooc_edges.csv"
+        n_edges = write_table(out_csv, [
+            ("author", edges.get("author", [])), ("window", np.asarray(edges.get("window", []), dtype=np.int64)),
+            ("op_a", edges.get("op_a", [])), ("op_b", edges.get("op_b", [])),
+            ("n_a", np.asarray(edges.get("n_a", []), dtype=np.int64)),
+            ("n_b", np.asarray(edges.get("n_b", []), dtype=np.int64)),
+            ("n_ab", np.asarray(edges.get("n_ab", []), dtype=np.int64)),
+            ("n_windows", np.asarray(edges.get("n_windows", []), dtype=np.int64)),
+            ("npmi", np.asarray(edges.get("npmi", []), dtype=np.float64)),
+        ])
+        out_json = outdir / "window_cooc_summary.json"
+        write_json(out_json, {
+            "generated_at": iso_now_local(),
+            "source_file": str(args.csv),
+            "ops": ops,
+            "ablate": ablate,
+            "windows": windows,
+            "min_count": args.min_count,
+            "npmi_edge": args.npmi_edge,
+            "per_author": summary_rows,
+            "nk_phase2_window_cooc_version": NK_PHASE2_WINDOW_COOC_VERSION,
+        })
+        print(f"[WROTE] {out_csv} (edges={n_edges})")
+        print(f"[WROTE] {out_json}")
+        return 0
+
+    except Exception as ex:
+        print(f"[ERR] {ex}")
+        if args.debug:
+            raise
+        return 1
+
+
+def _extend(acc: Dict[str, List[Any]], cols: Dict[str, List[Any]]) -> None:
+    for k, v in cols.items():
+        acc.setdefault(k, []).extend(v)
+
+
+def _summarize(counts: Dict[int, Tuple[int, np.ndarray, np.ndarray]], edge_thr: float) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for w, (n, n_i, n_ij) in counts.items():
+        m = npmi(n, n_i, n_ij)
+        iu, ju = np.triu_indices(len(n_i), k=1)
+        vals = m[iu, ju]
+        co = n_ij[iu, ju] > 0
+        out[str(w)] = {
+            "n_windows": int(n),
+            "edges_npmi_above": int((vals > edge_thr).sum()),
+            "mean_npmi_cooccurring": float(vals[co].mean()) if co.any() else None,
+        }
+    return out
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
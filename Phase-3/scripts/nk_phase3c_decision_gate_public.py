@@ -22,6 +22,17 @@ Outputs
 -------
 --out-csv   : per-segment final metrics + decision
 --trace-csv : optional per-step trace for selected ayet(s) or segment_id(s)
+--out-format: csv (default; public results/ format) | parquet | feather (needs pyarrow)
+--preview   : estimate decision rates (overall and per class, per meal and pooled) from a
+              stratified meal x sure sample with 95% CIs instead of running every segment;
+              writes <out-csv>.preview.json only. --preview-width W doubles the sample until
+              the pooled CIs are narrower than W. With --preview-cache PATH, full runs store
+              their exact rates there and later previews with the same input and parameters
+              report error / CI coverage against them (nothing is written without it).
+CSV paths ending in .gz / .xz / .zst are read and written compressed (streamed; .zst needs zstandard).
+The gate is a pure function of (ABL_score, DAT_score, sart_flag, class gates), so it is
+evaluated once per distinct input signature and broadcast to segments (--no-dedup: per segment;
+output is identical either way).
 
 Example (Windows CMD / PowerShell)
 ---------------------------------
@@ -30,6 +41,13 @@ py nk_phase3c_decision_gate_public.py ^
   --out-csv "C:\NK\NK-CORPUS\scores\phase3\4C\phase3c_decision.csv" ^
   --steps 12
 
+Quick preview while tuning thresholds (2% sample, refined until CIs < 0.01):
+py nk_phase3c_decision_gate_public.py ^
+  --in-csv "..." ^
+  --out-csv "..." ^
+  --theta-on 1.1 --preview 0.02 --preview-width 0.01 ^
+  --preview-cache "C:\NK\NK-CORPUS\scores\phase3\4C\phase3c_preview_cache.json"
+
 Trace sample for 8:53, 7:96, 2:10:
 py nk_phase3c_decision_gate_public.py ^
   --in-csv "..." ^
@@ -41,15 +59,52 @@ py nk_phase3c_decision_gate_public.py ^
 
 import argparse
 import csv
+import json
 import re
+import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-
-
-def read_csv_any_delim(path: Path) -> Tuple[List[str], List[Dict[str, str]]]:
-    text = path.read_text(encoding="utf-8", errors="ignore")
-    first = text.splitlines()[0] if text else ""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# shared NK-Ops utilities live in Phase-1/scripts
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Phase-1" / "scripts"))
+from nk_ops_preview import (  # noqa: E402
+    POOLED,
+    ExactCache,
+    RowValues,
+    StratifiedSample,
+    add_preview_args,
+    exact_values,
+    group_means,
+    preview_report,
+    print_pooled,
+    refine,
+    row_keys,
+)
+from nk_ops_table_io import with_suffix_format, write_table  # noqa: E402
+from nk_ops_signature import SignatureIndex  # noqa: E402
+from nk_ops_utils import iso_now_local, open_any  # noqa: E402
+
+OUT_COLS = [
+    "segment_id", "meal_slug", "sure", "ayet", "class", "cond_sart_flag",
+    "A0_ABL_score", "T0_DAT_score", "Pi0_static", "D0_static",
+    "steps", "B_final", "T_final", "Pi_final", "D_final", "params",
+]
+TRACE_COLS = [
+    "t", "segment_id", "meal_slug", "sure", "ayet", "class", "cond",
+    "A0_ABL_score", "T0_DAT_score", "B_abl", "T_teleo", "Pi", "D_c",
+]
+# columns written as numbers (floats -> %.6f, ints as-is); everything else is text
+FLOAT_COLS = {"A0_ABL_score", "T0_DAT_score", "Pi0_static", "B_final", "T_final", "Pi_final", "B_abl", "T_teleo", "Pi"}
+INT_COLS = {"cond_sart_flag", "D0_static", "steps", "D_final", "t", "cond", "D_c"}
+
+
+def sniff_delim(path: Path) -> str:
+    # sniff on the first line only; .gz/.xz/.zst inputs are decompressed while streaming
+    with open_any(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        first = f.readline().rstrip("\r\n")
     delims = [",", ";", "\t"]
     best = ","
     best_cols = -1
@@ -58,7 +113,12 @@ def read_csv_any_delim(path: Path) -> Tuple[List[str], List[Dict[str, str]]]:
         if cols > best_cols:
             best_cols = cols
             best = d
-    with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
+    return best
+
+
+def read_csv_any_delim(path: Path) -> Tuple[List[str], List[Dict[str, str]]]:
+    best = sniff_delim(path)
+    with open_any(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
         reader = csv.DictReader(f, delimiter=best)
         rows: List[Dict[str, str]] = []
         for r in reader:
@@ -123,16 +183,136 @@ def sigma_teleo(cls: str) -> float:
     return 1.0 if cls in ("teleological_surface", "dat_dominant") else 0.0
 
 
-def pi_value(B: float, T: float, cond: int, G: float, p: Params) -> float:
-    return (p.wB * B) - (p.wT * T) - (p.wCond * float(cond)) - (p.wG * G)
+def teleo_gate(cls: str) -> float:
+    return 1.0 if (sigma_teleo(cls) == 1.0 or (cls or "").strip().lower() == "mixed") else 0.0
+
+
+def pi_value(B, T, cond, G: float, p: Params):
+    # scalars or arrays (element-wise); cond is 0/1
+    return (p.wB * B) - (p.wT * T) - (p.wCond * cond) - (p.wG * G)
+
+
+def hysteresis(prev, Pi, p: Params):
+    # scalars or arrays (element-wise)
+    return np.where(Pi >= p.theta_on, 1, np.where(Pi <= p.theta_off, 0, prev))
+
+
+@dataclass
+class GateInputs:
+    """Per-segment gate inputs (one entry per unique segment_id, input order)."""
+    seg: List[str]
+    meal: List[str]
+    sure: List[str]
+    ayet: List[str]
+    cls: List[str]
+    A0: np.ndarray      # float64
+    T0: np.ndarray      # float64
+    cond: np.ndarray    # int64 0/1
+
+    def __len__(self) -> int:
+        return len(self.seg)
+
+    def gates(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(sigma_abl, teleo_gate) per segment; computed once per distinct class label."""
+        labels = {c: (sigma_abl(c), teleo_gate(c)) for c in set(self.cls)}
+        sA = np.fromiter((labels[c][0] for c in self.cls), dtype=np.float64, count=len(self.cls))
+        gT = np.fromiter((labels[c][1] for c in self.cls), dtype=np.float64, count=len(self.cls))
+        return sA, gT
+
+
+def inputs_from_rows(rows: List[Dict[str, str]], fields: List[str]) -> GateInputs:
+    col_seg = pick_col(fields, ["segment_id", "id", "seg_id", "segment"]) or "segment_id"
+    col_meal = pick_col(fields, ["meal_slug", "author", "score_author"]) or "meal_slug"
+    col_sure = pick_col(fields, ["sure", "score_sure"]) or pick_col_regex(fields, r"\bsure\b") or "sure"
+    col_ayet = pick_col(fields, ["ayet", "score_ayet"]) or pick_col_regex(fields, r"\bayet\b") or "ayet"
+
+    col_A = pick_col(fields, ["ABL_score", "abl_score"]) or pick_col_regex(fields, r"\babl[_ ]?score\b") or "ABL_score"
+    col_T = pick_col(fields, ["DAT_score", "dat_score"]) or pick_col_regex(fields, r"\bdat[_ ]?score\b") or "DAT_score"
+    col_cond = pick_col(fields, ["sart_flag", "cond_flag"]) or pick_col_regex(fields, r"sart") or "sart_flag"
+    col_cls = pick_col(fields, ["class", "cls", "label"]) or "class"
+
+    seg_l: List[str] = []
+    meal_l: List[str] = []
+    sure_l: List[str] = []
+    ayet_l: List[str] = []
+    cls_l: List[str] = []
+    A0_l: List[float] = []
+    T0_l: List[float] = []
+    cond_l: List[int] = []
+    seen = set()
+    for r in rows:
+        seg = (r.get(col_seg, "") or "").strip()
+        if not seg or seg in seen:
+            continue
+        seen.add(seg)
+        seg_l.append(seg)
+        sure_l.append((r.get(col_sure, "") or "").strip())
+        ayet_l.append((r.get(col_ayet, "") or "").strip())
+        meal_l.append((r.get(col_meal, "") or "").strip())
+        cls_l.append((r.get(col_cls, "") or "").strip())
+        A0_l.append(to_float(r.get(col_A, "0"), 0.0))
+        T0_l.append(to_float(r.get(col_T, "0"), 0.0))
+        cond_l.append(norm_flag(r.get(col_cond, "0")))
+    return GateInputs(
+        seg=seg_l, meal=meal_l, sure=sure_l, ayet=ayet_l, cls=cls_l,
+        A0=np.asarray(A0_l, dtype=np.float64), T0=np.asarray(T0_l, dtype=np.float64),
+        cond=np.asarray(cond_l, dtype=np.int64),
+    )
+
+
+def subset_inputs(inp: GateInputs, idx: np.ndarray) -> GateInputs:
+    """Gate inputs of the segments at positions idx (in idx order)."""
+    return GateInputs(
+        seg=[inp.seg[i] for i in idx], meal=[inp.meal[i] for i in idx], sure=[inp.sure[i] for i in idx],
+        ayet=[inp.ayet[i] for i in idx], cls=[inp.cls[i] for i in idx],
+        A0=inp.A0[idx], T0=inp.T0[idx], cond=inp.cond[idx],
+    )
 
 
-def hysteresis(prev: int, Pi: float, p: Params) -> int:
-    if Pi >= p.theta_on:
-        return 1
-    if Pi <= p.theta_off:
-        return 0
-    return prev
+# inf * 0 / inf - inf give NaN silently, as in the per-segment (Python float) gate
+@np.errstate(invalid="ignore", over="ignore")
+def run_dynamics(
+    A0: np.ndarray,
+    T0: np.ndarray,
+    cond: np.ndarray,
+    sA: np.ndarray,
+    gT: np.ndarray,
+    p: Params,
+    steps: int,
+    trace_of: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Static + dynamic gate over arrays (element-wise; same float operations as the
+    per-segment recurrence). trace_of: positions whose per-step (B, T, Pi, D) to keep,
+    returned as (steps, len(trace_of)) arrays under trace_B / trace_T / trace_Pi / trace_D.
+    """
+    G = p.G_const
+    c = cond.astype(np.float64)
+    Pi0 = pi_value(B=A0, T=T0, cond=c, G=G, p=p)
+    D0 = (Pi0 >= p.theta_on).astype(np.int64)  # static
+
+    B = np.zeros_like(A0)
+    T = np.zeros_like(T0)
+    D = np.zeros(len(A0), dtype=np.int64)
+    drive_B = A0 * sA
+    drive_T = T0 * gT
+    keep = trace_of is not None
+    tr: Dict[str, List[np.ndarray]] = {k: [] for k in ("trace_B", "trace_T", "trace_Pi", "trace_D")}
+    for _ in range(steps):
+        B = (1.0 - p.k_dec) * B + p.k_gen * drive_B
+        T = (1.0 - p.kT_dec) * T + p.kT_gen * drive_T
+        Pi = pi_value(B=B, T=T, cond=c, G=G, p=p)
+        D = hysteresis(D, Pi, p)
+        if keep:
+            for k, v in (("trace_B", B), ("trace_T", T), ("trace_Pi", Pi), ("trace_D", D)):
+                tr[k].append(v[trace_of])
+
+    out = {"Pi0": Pi0, "D0": D0, "B": B, "T": T, "Pi": pi_value(B=B, T=T, cond=c, G=G, p=p), "D": D}
+    if keep:
+        k_tr = len(trace_of)
+        for k, v in tr.items():
+            out[k] = np.stack(v) if v else np.zeros((0, k_tr))
+    return out
 
 
 def parse_trace_filter(spec: str) -> Tuple[set, set]:
@@ -150,12 +330,122 @@ def parse_trace_filter(spec: str) -> Tuple[set, set]:
     return pairs, segids
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--in-csv", required=True, help="Phase-3B/4B v2 CSV (with ABL_score/DAT_score/class/sart_flag)")
-    ap.add_argument("--out-csv", required=True, help="Output decision CSV")
-    ap.add_argument("--trace-csv", default="", help="Optional output trace CSV")
+def to_columns(cols: Dict[str, List[Any]], names: List[str]) -> List[Tuple[str, Any]]:
+    out: List[Tuple[str, Any]] = []
+    for c in names:
+        if c in FLOAT_COLS:
+            out.append((c, np.asarray(cols[c], dtype=np.float64)))
+        elif c in INT_COLS:
+            out.append((c, np.asarray(cols[c], dtype=np.int64)))
+        else:
+            out.append((c, cols[c]))
+    return out
+
+
+def evaluate_gate(
+    inp: GateInputs,
+    p: Params,
+    steps: int,
+    params_str: str,
+    traced: Optional[List[int]] = None,
+    dedup: bool = True,
+) -> Tuple[Dict[str, Any], Dict[str, Any], SignatureIndex]:
+    """
+    Decision + trace columns for all segments. The gate is a pure function of
+    (A0, T0, cond, sigma_abl, teleo_gate), so it runs once per distinct signature and
+    results are broadcast back to segments (dedup=False: once per segment).
+    """
+    sA, gT = inp.gates()
+    sig_cols = [inp.A0, inp.T0, inp.cond, sA, gT]
+    index = SignatureIndex.build(sig_cols) if dedup else SignatureIndex.identity(len(inp), sig_cols)
+    A0u, T0u, condu, sAu, gTu = index.unique_columns()
+    traced = traced or []
+    traced_sig = index.inverse[np.asarray(traced, dtype=np.int64)]
+    tr_u, tr_pos = np.unique(traced_sig, return_inverse=True)
+    res = run_dynamics(A0u, T0u, condu, sAu, gTu, p, steps, trace_of=tr_u)
+
+    n = len(inp)
+    out_cols: Dict[str, Any] = {
+        "segment_id": inp.seg, "meal_slug": inp.meal, "sure": inp.sure, "ayet": inp.ayet, "class": inp.cls,
+        "cond_sart_flag": inp.cond, "A0_ABL_score": inp.A0, "T0_DAT_score": inp.T0,
+        "Pi0_static": index.broadcast(res["Pi0"]), "D0_static": index.broadcast(res["D0"]),
+        "steps": np.full(n, steps, dtype=np.int64),
+        "B_final": index.broadcast(res["B"]), "T_final": index.broadcast(res["T"]),
+        "Pi_final": index.broadcast(res["Pi"]), "D_final": index.broadcast(res["D"]),
+        "params": [params_str] * n,
+    }
+
+    # trace rows: traced segments in input order, steps inner
+    trace_cols: Dict[str, List[Any]] = {c: [] for c in TRACE_COLS}
+    for j, i in enumerate(traced):
+        u = int(tr_pos[j])
+        for t in range(steps):
+            for c, v in (
+                ("t", t), ("segment_id", inp.seg[i]), ("meal_slug", inp.meal[i]), ("sure", inp.sure[i]),
+                ("ayet", inp.ayet[i]), ("class", inp.cls[i]), ("cond", int(inp.cond[i])),
+                ("A0_ABL_score", float(inp.A0[i])), ("T0_DAT_score", float(inp.T0[i])),
+                ("B_abl", float(res["trace_B"][t, u])), ("T_teleo", float(res["trace_T"][t, u])),
+                ("Pi", float(res["trace_Pi"][t, u])), ("D_c", int(res["trace_D"][t, u])),
+            ):
+                trace_cols[c].append(v)
+    return out_cols, trace_cols, index
+
+
+def decision_metrics(classes: List[str]) -> List[str]:
+    return ["decision_rate"] + [f"decided_{c or 'unlabeled'}" for c in classes]
+
+
+def decision_values(D: np.ndarray, cls: List[str], classes: List[str]) -> np.ndarray:
+    """(n, 1 + C): D_final, then D_final * [class == c] (means = decision shares, x rows = counts)."""
+    D = np.asarray(D, dtype=np.float64)
+    lab = np.asarray(cls, dtype=object)
+    return np.column_stack([D] + [D * (lab == c) for c in classes])
+
+
+def preview_gate(
+    inp: GateInputs,
+    p: Params,
+    steps: int,
+    frac: float,
+    width: Optional[float],
+    seed: int,
+    exact: Optional[Dict[str, Dict[str, float]]] = None,
+) -> Dict[str, Any]:
+    """Decision rates from a stratified meal x sure sample; only sampled segments run the gate."""
+    classes = sorted(set(inp.cls))
+    metrics = decision_metrics(classes)
+
+    def compute(idx: np.ndarray) -> np.ndarray:
+        sub = subset_inputs(inp, idx)
+        out_cols, _, _ = evaluate_gate(sub, p, steps, "")
+        return decision_values(out_cols["D_final"], sub.cls, classes)
+
+    sample = StratifiedSample.build(inp.meal, inp.sure, keys=row_keys(len(inp), inp.seg), seed=seed)
+    est = refine(sample, RowValues(len(inp), compute), metrics, frac, width, groups=[POOLED],
+                 log=lambda m: print(f"[INFO] {m}"))
+    report = preview_report(est, exact)
+    # pooled decision counts: shares x segments (same CIs, scaled)
+    counts = est.scaled(est.n_rows.astype(np.float64))
+    lo, hi = counts.ci()
+    g = est.groups.index(POOLED)
+    report["pooled_counts"] = {
+        m: {"estimate": round(float(counts.mean[g, j]), 1), "ci_lo": round(float(lo[g, j]), 1),
+            "ci_hi": round(float(hi[g, j]), 1)}
+        for j, m in enumerate(metrics)
+    }
+    return report
+
+
+def add_gate_args(ap: argparse.ArgumentParser) -> None:
+    """Gate parameters + trace / output options shared by the gate and the fused pipeline."""
     ap.add_argument("--trace-filter", default="", help='e.g. "8:53,7:96,2:10" or "segment_id=..."')
+    ap.add_argument("--out-format", default="csv", choices=["csv", "parquet", "feather"],
+                    help="Table format for --out-csv/--trace-csv (parquet/feather need pyarrow)")
+    add_param_args(ap)
+
+
+def add_param_args(ap: argparse.ArgumentParser) -> None:
+    """Dynamics / threshold parameters (--steps, weights, thresholds, rates, --no-dedup)."""
     ap.add_argument("--steps", type=int, default=12)
 
     ap.add_argument("--wB", type=float, default=1.0)
@@ -171,10 +461,12 @@ def main():
     ap.add_argument("--kT-dec", type=float, default=0.15)
 
     ap.add_argument("--G-const", type=float, default=0.0)
+    ap.add_argument("--no-dedup", action="store_true",
+                    help="Evaluate the gate per segment instead of once per distinct input signature")
 
-    args = ap.parse_args()
 
-    p = Params(
+def params_from_args(args: argparse.Namespace) -> Params:
+    return Params(
         wB=args.wB, wT=args.wT, wCond=args.wCond, wG=args.wG,
         theta_on=args.theta_on, theta_off=args.theta_off,
         k_gen=args.k_gen, k_dec=args.k_dec,
@@ -182,6 +474,45 @@ def main():
         G_const=args.G_const,
     )
 
+
+def params_string(p: Params) -> str:
+    return f"wB={p.wB},wT={p.wT},wCond={p.wCond},wG={p.wG},theta_on={p.theta_on},theta_off={p.theta_off},k_gen={p.k_gen},k_dec={p.k_dec},kT_gen={p.kT_gen},kT_dec={p.kT_dec},G={p.G_const}"
+
+
+def traced_positions(inp: GateInputs, trace_pairs: set, trace_segids: set) -> List[int]:
+    return [i for i, (seg, sure, ayet) in enumerate(zip(inp.seg, inp.sure, inp.ayet))
+            if (seg in trace_segids) or (trace_pairs and (sure, ayet) in trace_pairs)]
+
+
+def write_gate_outputs(
+    out_path: Path,
+    trace_path: Optional[Path],
+    out_cols: Dict[str, Any],
+    trace_cols: Dict[str, Any],
+    out_format: str = "csv",
+) -> None:
+    # columns are formatted in bulk (%.6f floats); csv bytes match the former DictWriter output
+    out_path = with_suffix_format(out_path, out_format)
+    n_out = write_table(out_path, to_columns(out_cols, OUT_COLS), fmt=out_format)
+    print(f"[OK] wrote {n_out} rows -> {out_path}")
+
+    if trace_path is not None:
+        trace_path = with_suffix_format(trace_path, out_format)
+        n_trace = write_table(trace_path, to_columns(trace_cols, TRACE_COLS), fmt=out_format)
+        print(f"[OK] wrote trace rows={n_trace} -> {trace_path}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--in-csv", required=True, help="Phase-3B/4B v2 CSV (with ABL_score/DAT_score/class/sart_flag)")
+    ap.add_argument("--out-csv", required=True, help="Output decision CSV")
+    ap.add_argument("--trace-csv", default="", help="Optional output trace CSV")
+    add_gate_args(ap)
+    add_preview_args(ap, dash="-")
+    args = ap.parse_args()
+
+    p = params_from_args(args)
+
     in_path = Path(args.in_csv)
     out_path = Path(args.out_csv)
     trace_path = Path(args.trace_csv) if args.trace_csv else None
@@ -191,116 +522,36 @@ def main():
         raise SystemExit(f"[ERR] input not found: {in_path}")
 
     fields, rows = read_csv_any_delim(in_path)
-
-    col_seg = pick_col(fields, ["segment_id", "id", "seg_id", "segment"]) or "segment_id"
-    col_meal = pick_col(fields, ["meal_slug", "author", "score_author"]) or "meal_slug"
-    col_sure = pick_col(fields, ["sure", "score_sure"]) or pick_col_regex(fields, r"\bsure\b") or "sure"
-    col_ayet = pick_col(fields, ["ayet", "score_ayet"]) or pick_col_regex(fields, r"\bayet\b") or "ayet"
-
-    col_A = pick_col(fields, ["ABL_score", "abl_score"]) or pick_col_regex(fields, r"\babl[_ ]?score\b") or "ABL_score"
-    col_T = pick_col(fields, ["DAT_score", "dat_score"]) or pick_col_regex(fields, r"\bdat[_ ]?score\b") or "DAT_score"
-    col_cond = pick_col(fields, ["sart_flag", "cond_flag"]) or pick_col_regex(fields, r"sart") or "sart_flag"
-    col_cls = pick_col(fields, ["class", "cls", "label"]) or "class"
-
-    out_rows: List[Dict[str, str]] = []
-    trace_rows: List[Dict[str, str]] = []
-
-    seen = set()
-    for r in rows:
-        seg = (r.get(col_seg, "") or "").strip()
-        if not seg or seg in seen:
-            continue
-        seen.add(seg)
-
-        sure = (r.get(col_sure, "") or "").strip()
-        ayet = (r.get(col_ayet, "") or "").strip()
-        meal = (r.get(col_meal, "") or "").strip()
-        cls = (r.get(col_cls, "") or "").strip()
-
-        A0 = to_float(r.get(col_A, "0"), 0.0)
-        T0 = to_float(r.get(col_T, "0"), 0.0)
-        cond = norm_flag(r.get(col_cond, "0"))
-        G = p.G_const
-
-        Pi0 = pi_value(B=A0, T=T0, cond=cond, G=G, p=p)
-        D0 = 1 if Pi0 >= p.theta_on else 0  # static
-
-        B = 0.0
-        T = 0.0
-        D = 0
-        sA = sigma_abl(cls)
-        sTeleo = sigma_teleo(cls)
-
-        for t in range(args.steps):
-            B = (1.0 - p.k_dec) * B + p.k_gen * (A0 * sA)
-
-            teleo_gate = 1.0 if (sTeleo == 1.0 or cls.strip().lower() == "mixed") else 0.0
-            T = (1.0 - p.kT_dec) * T + p.kT_gen * (T0 * teleo_gate)
-
-            Pi = pi_value(B=B, T=T, cond=cond, G=G, p=p)
-            D = hysteresis(D, Pi, p)
-
-            if trace_path is not None:
-                trace_this = (seg in trace_segids) or (trace_pairs and (sure, ayet) in trace_pairs)
-                if trace_this:
-                    trace_rows.append({
-                        "t": str(t),
-                        "segment_id": seg,
-                        "meal_slug": meal,
-                        "sure": sure,
-                        "ayet": ayet,
-                        "class": cls,
-                        "cond": str(cond),
-                        "A0_ABL_score": f"{A0:.6f}",
-                        "T0_DAT_score": f"{T0:.6f}",
-                        "B_abl": f"{B:.6f}",
-                        "T_teleo": f"{T:.6f}",
-                        "Pi": f"{Pi:.6f}",
-                        "D_c": str(D),
-                    })
-
-        out_rows.append({
-            "segment_id": seg,
-            "meal_slug": meal,
-            "sure": sure,
-            "ayet": ayet,
-            "class": cls,
-            "cond_sart_flag": str(cond),
-            "A0_ABL_score": f"{A0:.6f}",
-            "T0_DAT_score": f"{T0:.6f}",
-            "Pi0_static": f"{Pi0:.6f}",
-            "D0_static": str(D0),
-            "steps": str(args.steps),
-            "B_final": f"{B:.6f}",
-            "T_final": f"{T:.6f}",
-            "Pi_final": f"{pi_value(B=B, T=T, cond=cond, G=G, p=p):.6f}",
-            "D_final": str(D),
-            "params": f"wB={p.wB},wT={p.wT},wCond={p.wCond},wG={p.wG},theta_on={p.theta_on},theta_off={p.theta_off},k_gen={p.k_gen},k_dec={p.k_dec},kT_gen={p.kT_gen},kT_dec={p.kT_dec},G={p.G_const}",
-        })
-
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with out_path.open("w", encoding="utf-8", newline="") as f:
-        cols = [
-            "segment_id","meal_slug","sure","ayet","class","cond_sart_flag",
-            "A0_ABL_score","T0_DAT_score","Pi0_static","D0_static",
-            "steps","B_final","T_final","Pi_final","D_final","params"
-        ]
-        w = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
-        w.writeheader()
-        for rr in out_rows:
-            w.writerow(rr)
-
-    print(f"[OK] wrote {len(out_rows)} rows -> {out_path}")
-
-    if trace_path is not None:
-        trace_path.parent.mkdir(parents=True, exist_ok=True)
-        with trace_path.open("w", encoding="utf-8", newline="") as f:
-            cols = ["t","segment_id","meal_slug","sure","ayet","class","cond","A0_ABL_score","T0_DAT_score","B_abl","T_teleo","Pi","D_c"]
-            w = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
-            w.writeheader()
-            for rr in trace_rows:
-                w.writerow(rr)
-        print(f"[OK] wrote trace rows={len(trace_rows)} -> {trace_path}")
+    inp = inputs_from_rows(rows, fields)
+    del rows
+
+    cache = ExactCache(args.preview_cache or None)
+    cache_key = ExactCache.key("phase3c_decision_gate", in_path, f"steps={args.steps},{params_string(p)}")
+    if args.preview or args.preview_width:
+        report = preview_gate(inp, p, args.steps, args.preview or 0.01, args.preview_width,
+                              args.preview_seed, cache.get(cache_key))
+        report.update({"source_file": str(in_path), "steps": args.steps, "params": params_string(p),
+                       "seed": args.preview_seed, "generated_at": iso_now_local()})
+        out_json = out_path.with_name(out_path.name + ".preview.json")
+        out_json.parent.mkdir(parents=True, exist_ok=True)
+        out_json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print_pooled(report)
+        print(f"[OK] wrote preview -> {out_json}")
+        return
+
+    traced = traced_positions(inp, trace_pairs, trace_segids) if trace_path is not None else []
+    out_cols, trace_cols, index = evaluate_gate(inp, p, args.steps, params_string(p),
+                                                traced=traced, dedup=not args.no_dedup)
+    print(f"[INFO] {index.describe()}")
+    write_gate_outputs(out_path, trace_path, out_cols, trace_cols, args.out_format)
+
+    if cache.enabled:
+        # exact per-meal decision rates for later previews of the same input + parameters
+        classes = sorted(set(inp.cls))
+        names, codes = np.unique(np.asarray(inp.meal, dtype=object).astype(str), return_inverse=True)
+        vals = decision_values(out_cols["D_final"], inp.cls, classes)
+        cache.put(cache_key, exact_values([str(x) for x in names], decision_metrics(classes),
+                                          group_means(codes.ravel(), len(names), vals)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+r"""Phase-3C (Public Release) — fused ABL/DAT scoring + Decision Gate (no intermediate CSV)
+
+Purpose
+-------
+nk_phase3c_decision_gate_public.py reads a precomputed Phase-3B/4B v2 CSV
+(ABL_score, DAT_score, sart_flag, class). This script derives those fields from
+per-segment operator tags and feeds them to the same gate in memory, batch by batch,
+so a new translation can be gated as soon as it is tagged. The 4B table is written
+only when --write-4b is given.
+
+Scoring (Phase-3A / 3B; rules in DEFAULT_SCORING, override with --scoring JSON)
+---------------------------------------------------------------------------------
+counts per segment: abl = CASE.ABL, dat = CASE.DAT, and the marker operators
+P3.COND (conditional), P3.TELEO (purpose clause), P3.RHET (rhetorical question)
+- false causality (Phase-3A):
+    rhetorical   : RHET marker or "?" in the segment -> its ablatives carry no cause
+    teleological : each purpose marker absorbs one ablative and counts as DAT
+    conditional  : COND marker -> sart_flag = 1 (the gate's condition veto)
+- ABL_score = abl_eff / (abl_eff + dat_eff), DAT_score = dat_eff / (abl_eff + dat_eff)
+- class (Phase-3B dominance, margin = dominance_margin):
+    unknown / conditional_only  : no ABL/DAT evidence (conditional_only if COND)
+    ABL_dominant                : ABL_score - DAT_score >= margin
+    conditional_only            : no effective ABL, COND present, no purpose marker
+    teleological_surface        : DAT_score - ABL_score >= margin
+    mixed                       : otherwise
+
+Inputs (one of)
+---------------
+--text-csv : segments with a text column (tagged in memory with the NK-Ops tagger;
+             adapter + Phase-3 marker operators)
+--tags-csv : already tagged segments (CASE.ABL / CASE.DAT [+ P3.* marker] count columns)
+Both need segment_id, meal_slug, sure, ayet (auto-mapped like the gate).
+
+Outputs
+-------
+--out-csv / --trace-csv : same tables as nk_phase3c_decision_gate_public.py
+--write-4b              : optional Phase-3B/4B v2 table (scores written exactly, so the
+                          gate run on it reproduces --out-csv)
+
+Example
+-------
+py nk_phase3c_fused_gate.py ^
+  --text-csv "C:\NK\NK-CORPUS\segments\all_meals.csv" ^
+  --out-csv  "C:\NK\NK-CORPUS\scores\phase3\4C\phase3c_decision.csv" ^
+  --trace-csv "C:\NK\NK-CORPUS\scores\phase3\4C\phase3c_trace.csv" ^
+  --trace-filter "8:53,7:96,2:10" ^
+  --steps 12
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Phase-1" / "scripts"))
+from nk_ops_table_io import write_table  # noqa: E402
+from nk_ops_tagger import OperatorTagger, load_adapter, open_token_cache  # noqa: E402
+from nk_ops_utils import open_any  # noqa: E402
+
+from nk_phase3c_decision_gate_public import (  # noqa: E402
+    OUT_COLS,
+    TRACE_COLS,
+    GateInputs,
+    add_gate_args,
+    evaluate_gate,
+    params_from_args,
+    params_string,
+    parse_trace_filter,
+    pick_col,
+    sniff_delim,
+    traced_positions,
+    write_gate_outputs,
+)
+
+NK_PHASE3_FUSED_VERSION = "0.1.0"
+
+_COND_SA = [
+    "ırsa", "irse", "ursa", "ürse", "arsa", "erse",
+    "dıysa", "diyse", "duysa", "düyse", "tıysa", "tiyse", "tuysa", "tüyse",
+    "mışsa", "mişse", "muşsa", "müşse", "acaksa", "ecekse", "yorsa",
+    "mazsa", "mezse", "saydı", "seydi",
+    "ırsanız", "irseniz", "ursanız", "ürseniz", "arsanız", "erseniz", "yorsanız",
+]
+
+DEFAULT_SCORING: Dict[str, Any] = {
+    "version": "0.1.1",
+    "abl_op": "CASE.ABL",
+    "dat_op": "CASE.DAT",
+    # marker operators added to the tagger adapter (same schema as adapter operators)
+    "markers": {
+        # conditional -sA only after a verb stem / tense (aorist, past, evidential, future,
+        # progressive, negative aorist): a bare "sa"/"se" ending would veto "Musa", "kasa", ...
+        "P3.COND": {"suffixes": _COND_SA,
+                    "lexemes": ["eğer", "şayet", "ise", "yoksa", "madem", "mademki", "olsa", "olsaydı", "değilse"]},
+        "P3.TELEO": {"suffixes": [], "lexemes": ["için", "diye", "üzere", "amacıyla", "maksadıyla"]},
+        "P3.RHET": {"suffixes": [], "lexemes": ["acaba", "nasıl", "niçin", "mı", "mi", "mu", "mü"]},
+    },
+    "question_mark_is_rhetorical": True,
+    "teleo_weight": 1.0,
+    "dominance_margin": 0.2,
+}
+
+COND_OP, TELEO_OP, RHET_OP = "P3.COND", "P3.TELEO", "P3.RHET"
+
+SCORE_COLS = [
+    "segment_id", "meal_slug", "sure", "ayet", "ABL_score", "DAT_score", "sart_flag", "class",
+    "n_abl", "n_dat", "n_cond", "n_teleo", "n_rhet", "false_causality",
+]
+
+
+def load_scoring(path: Optional[str | Path] = None) -> Dict[str, Any]:
+    if not path:
+        return copy.deepcopy(DEFAULT_SCORING)
+    scoring = copy.deepcopy(DEFAULT_SCORING)
+    scoring.update(json.loads(Path(path).read_text(encoding="utf-8")))
+    return scoring
+
+
+def scoring_adapter(adapter: Dict[str, Any], scoring: Dict[str, Any]) -> Dict[str, Any]:
+    """Tagger adapter + the Phase-3 marker operators (one pass tags both)."""
+    out = copy.deepcopy(adapter)
+    for op in (scoring["abl_op"], scoring["dat_op"]):
+        if op not in out["operators"]:
+            raise RuntimeError(f"adapter {adapter.get('name')}: missing operator '{op}'")
+    out["operators"].update(copy.deepcopy(scoring["markers"]))
+    out["version"] = f"{adapter['version']}+p3-{scoring['version']}"
+    return out
+
+
+def score_segments(
+    abl: np.ndarray,
+    dat: np.ndarray,
+    cond: np.ndarray,
+    teleo: np.ndarray,
+    rhet: np.ndarray,
+    scoring: Dict[str, Any],
+) -> Dict[str, np.ndarray]:
+    """Phase-3A/3B fields from per-segment counts (element-wise; rhet may include '?')."""
+    abl = abl.astype(np.float64)
+    dat = dat.astype(np.float64)
+    teleo = teleo.astype(np.float64)
+    has_abl = abl > 0
+    is_rhet = rhet > 0
+    has_cond = cond > 0
+
+    abl_eff = np.where(is_rhet, 0.0, abl)
+    abl_eff = np.maximum(abl_eff - teleo, 0.0)
+    dat_eff = dat + float(scoring["teleo_weight"]) * teleo
+    tot = abl_eff + dat_eff
+    nz = tot > 0
+    safe = np.where(nz, tot, 1.0)
+    A = np.where(nz, abl_eff / safe, 0.0)
+    T = np.where(nz, dat_eff / safe, 0.0)
+
+    m = float(scoring["dominance_margin"])
+    cls = np.select(
+        [~nz, A - T >= m, (abl_eff == 0) & has_cond & (teleo == 0), T - A >= m],
+        [np.where(has_cond, "conditional_only", "unknown"), "ABL_dominant", "conditional_only",
+         "teleological_surface"],
+        default="mixed",
+    ).astype(object)
+    false_c = np.select(
+        [has_abl & is_rhet, has_abl & (teleo > 0), has_abl & has_cond],
+        ["rhetorical", "teleological", "conditional"],
+        default="",
+    ).astype(object)
+    return {"ABL_score": A, "DAT_score": T, "sart_flag": has_cond.astype(np.int64),
+            "class": cls, "false_causality": false_c}
+
+
+# ---------------------------
+# Streaming input
+# ---------------------------
+
+def iter_batches(path: Path, batch_size: int) -> Tuple[List[str], Iterator[List[Dict[str, str]]]]:
+    f = open_any(path, "r", encoding="utf-8", errors="ignore", newline="")
+    reader = csv.DictReader(f, delimiter=sniff_delim(path))
+    fields = list(reader.fieldnames or [])
+
+    def gen() -> Iterator[List[Dict[str, str]]]:
+        try:
+            batch: List[Dict[str, str]] = []
+            for r in reader:
+                batch.append(r)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            f.close()
+
+    return fields, gen()
+
+
+def _col(rows: List[Dict[str, str]], name: Optional[str]) -> List[str]:
+    if not name:
+        return [""] * len(rows)
+    return [(r.get(name, "") or "").strip() for r in rows]
+
+
+def _counts(rows: List[Dict[str, str]], name: Optional[str]) -> np.ndarray:
+    if not name:
+        return np.zeros(len(rows), dtype=np.int64)
+    out = np.zeros(len(rows), dtype=np.int64)
+    for i, r in enumerate(rows):
+        v = (r.get(name, "") or "").strip()
+        if v:
+            try:
+                out[i] = int(float(v))
+            except ValueError:
+                pass
+    return out
+
+
+class Scorer:
+    """Turns one batch of input rows into gate inputs + 4B score columns."""
+
+    def __init__(self, fields: List[str], scoring: Dict[str, Any], tagger: Optional[OperatorTagger],
+                 text_col: str = "text"):
+        self.scoring = scoring
+        self.tagger = tagger
+        self.col_seg = pick_col(fields, ["segment_id", "id", "seg_id", "segment"])
+        self.col_meal = pick_col(fields, ["meal_slug", "author", "score_author"])
+        self.col_sure = pick_col(fields, ["sure", "score_sure"])
+        self.col_ayet = pick_col(fields, ["ayet", "score_ayet"])
+        self.text_col = text_col
+        if tagger is not None:
+            if text_col not in fields:
+                raise RuntimeError(f"text column '{text_col}' not found. Available: {fields[:60]}")
+            self.op_pos = {op: i for i, op in enumerate(tagger.ops)}
+        else:
+            self.count_cols = {}
+            for op in (scoring["abl_op"], scoring["dat_op"], COND_OP, TELEO_OP, RHET_OP):
+                self.count_cols[op] = pick_col(fields, [op])
+            for op in (scoring["abl_op"], scoring["dat_op"]):
+                if not self.count_cols[op]:
+                    raise RuntimeError(f"tags CSV has no '{op}' column. Available: {fields[:60]}")
+            for op in (COND_OP, TELEO_OP, RHET_OP):
+                if not self.count_cols[op]:
+                    print(f"[WARN] tags CSV has no '{op}' column; counted as 0")
+        self.seen: set = set()
+        self.row_no = 0
+
+    def batch(self, rows: List[Dict[str, str]]) -> Tuple[GateInputs, Dict[str, Any]]:
+        segs = _col(rows, self.col_seg)
+        if not self.col_seg:
+            # no id column: 1-based input row number
+            segs = [str(self.row_no + i + 1) for i in range(len(rows))]
+        self.row_no += len(rows)
+        keep = []
+        for i, seg in enumerate(segs):
+            if seg and seg not in self.seen:
+                self.seen.add(seg)
+                keep.append(i)
+        rows = [rows[i] for i in keep]
+
+        sc = self.scoring
+        if self.tagger is not None:
+            texts = [r.get(self.text_col, "") or "" for r in rows]
+            X = self.tagger.tag(texts)
+            get = lambda op: X[:, self.op_pos[op]].astype(np.int64)  # noqa: E731
+            abl, dat = get(sc["abl_op"]), get(sc["dat_op"])
+            cond, teleo, rhet = get(COND_OP), get(TELEO_OP), get(RHET_OP)
+            if sc.get("question_mark_is_rhetorical", True):
+                rhet = rhet + np.fromiter(("?" in t for t in texts), dtype=np.int64, count=len(texts))
+        else:
+            abl, dat = _counts(rows, self.count_cols[sc["abl_op"]]), _counts(rows, self.count_cols[sc["dat_op"]])
+            cond = _counts(rows, self.count_cols[COND_OP])
+            teleo = _counts(rows, self.count_cols[TELEO_OP])
+            rhet = _counts(rows, self.count_cols[RHET_OP])
+
+        s = score_segments(abl, dat, cond, teleo, rhet, sc)
+        inp = GateInputs(
+            seg=[segs[i] for i in keep], meal=_col(rows, self.col_meal), sure=_col(rows, self.col_sure),
+            ayet=_col(rows, self.col_ayet), cls=s["class"].tolist(),
+            A0=s["ABL_score"], T0=s["DAT_score"], cond=s["sart_flag"],
+        )
+        scores = {
+            "segment_id": inp.seg, "meal_slug": inp.meal, "sure": inp.sure, "ayet": inp.ayet,
+            "ABL_score": inp.A0, "DAT_score": inp.T0, "sart_flag": inp.cond, "class": inp.cls,
+            "n_abl": abl, "n_dat": dat, "n_cond": cond, "n_teleo": teleo, "n_rhet": rhet,
+            "false_causality": s["false_causality"].tolist(),
+        }
+        return inp, scores
+
+
+def concat_columns(parts: List[Dict[str, Any]], names: List[str]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for c in names:
+        vals = [pt[c] for pt in parts]
+        if vals and all(isinstance(v, np.ndarray) for v in vals):
+            out[c] = np.concatenate(vals)
+        else:
+            out[c] = [x for v in vals for x in (v.tolist() if isinstance(v, np.ndarray) else v)]
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fused Phase-3A/3B scoring + Phase-3C decision gate.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--text-csv", help="Segments CSV with a text column (tagged in memory)")
+    src.add_argument("--tags-csv", help="Tagged segments CSV (CASE.ABL / CASE.DAT / P3.* counts)")
+    ap.add_argument("--text-col", default="text", help="Text column (--text-csv)")
+    ap.add_argument("--adapter", default=None, help="Tagger adapter JSON (default: built-in 'tr')")
+    ap.add_argument("--scoring", default=None, help="Scoring rules JSON (default: DEFAULT_SCORING)")
+    ap.add_argument("--token-cache", default=None, help="On-disk token cache (sqlite)")
+    ap.add_argument("--batch-size", type=int, default=50_000, help="Segments per batch")
+    ap.add_argument("--out-csv", required=True, help="Output decision CSV")
+    ap.add_argument("--trace-csv", default="", help="Optional output trace CSV")
+    ap.add_argument("--write-4b", default="", help="Optional Phase-3B/4B v2 score table")
+    add_gate_args(ap)
+    args = ap.parse_args()
+
+    p = params_from_args(args)
+    params_str = params_string(p)
+    in_path = Path(args.text_csv or args.tags_csv)
+    out_path = Path(args.out_csv)
+    trace_path = Path(args.trace_csv) if args.trace_csv else None
+    trace_pairs, trace_segids = parse_trace_filter(args.trace_filter)
+    if not in_path.exists():
+        raise SystemExit(f"[ERR] input not found: {in_path}")
+
+    scoring = load_scoring(args.scoring)
+    tagger = None
+    if args.text_csv:
+        adapter = scoring_adapter(load_adapter(args.adapter), scoring)
+        cache = open_token_cache(adapter, args.token_cache) if args.token_cache else None
+        tagger = OperatorTagger(adapter, cache=cache)
+
+    fields, batches = iter_batches(in_path, args.batch_size)
+    scorer = Scorer(fields, scoring, tagger, text_col=args.text_col)
+    out_parts: List[Dict[str, Any]] = []
+    trace_parts: List[Dict[str, Any]] = []
+    score_parts: List[Dict[str, Any]] = []
+    n_rows = n_unique = 0
+    for rows in batches:
+        inp, scores = scorer.batch(rows)
+        if args.write_4b:
+            score_parts.append(scores)
+        traced = traced_positions(inp, trace_pairs, trace_segids) if trace_path is not None else []
+        out_cols, trace_cols, index = evaluate_gate(inp, p, args.steps, params_str,
+                                                    traced=traced, dedup=not args.no_dedup)
+        out_parts.append(out_cols)
+        trace_parts.append(trace_cols)
+        n_rows += index.n_rows
+        n_unique += index.n_unique
+        print(f"[INFO] batch segments={len(inp)} total={n_rows} ({index.describe()})")
+
+    write_gate_outputs(out_path, trace_path, concat_columns(out_parts, OUT_COLS),
+                       concat_columns(trace_parts, TRACE_COLS), args.out_format)
+    if args.write_4b:
+        cols = concat_columns(score_parts, SCORE_COLS)
+        # scores as repr (exact round trip), so the standalone gate reproduces these decisions
+        n4 = write_table(args.write_4b, [(c, cols[c]) for c in SCORE_COLS], decimals=None)
+        print(f"[OK] wrote 4B rows={n4} -> {args.write_4b}")
+    print(f"[INFO] segments={n_rows} gate evaluations={n_unique} scoring={scoring['version']} "
+          f"fused={NK_PHASE3_FUSED_VERSION}")
+
+
+if __name__ == "__main__":
+    main()
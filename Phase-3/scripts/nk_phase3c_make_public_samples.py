@@ -31,9 +31,15 @@ py nk_phase3c_make_public_samples.py ^
 
 import argparse
 import csv
+import sys
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+# shared NK-Ops utilities live in Phase-1/scripts
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Phase-1" / "scripts"))
+from nk_ops_table_io import columns_from_rows, write_table  # noqa: E402
+from nk_ops_utils import open_any  # noqa: E402
+
 
 def parse_pairs(spec: str) -> List[Tuple[str, str]]:
     items = [x.strip() for x in (spec or "").split(",") if x.strip()]
@@ -47,19 +53,15 @@ def parse_pairs(spec: str) -> List[Tuple[str, str]]:
 
 
 def read_csv(path: Path) -> Tuple[List[str], List[Dict[str, str]]]:
-    with path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
+    with open_any(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
         r = csv.DictReader(f)
         rows = list(r)
         return list(r.fieldnames or []), rows
 
 
 def write_csv(path: Path, fieldnames: List[str], rows: List[Dict[str, str]]):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
-        w.writeheader()
-        for rr in rows:
-            w.writerow(rr)
+    # cells are already strings: written as-is, same bytes as csv.DictWriter
+    write_table(path, columns_from_rows(rows, fieldnames), fmt="csv", decimals=None)
 
 
 def main():
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+r"""Phase-3C (Public Release) — exact decision-count curves over theta_on (per theta_off)
+
+Purpose
+-------
+How many segments end with D_final = 1 for EVERY theta_on, per class and per meal,
+without re-running the gate on a grid. Shows the margin behind the published decision
+counts (e.g. how far theta_on can move before a teleological_surface segment decides).
+
+How it works
+------------
+With the B / T dynamics fixed, each distinct input signature's Pi trajectory
+Pi_0..Pi_{steps-1} is computed once (same recurrence and float operations as the gate).
+For theta_on > theta_off the hysteresis has a closed form:
+    L = last step with Pi_t <= theta_off (-1 if none; D is 0 at L)
+    c = max(Pi_t for t > L)               (-inf if L is the last step)
+    D_final = 1  <=>  theta_on <= c
+so one critical value c per segment and theta_off decides every theta_on. Counts are
+#{c >= theta_on}: one sort per group, then each curve breakpoint / query is a searchsorted.
+A NaN Pi_t (unparseable ABL_score / DAT_score) neither sets nor resets D in the gate, so it
+is skipped in both L and c; an all-NaN trajectory gets c = -inf (never decides), as in the gate.
+
+Inputs
+------
+--in-csv : Phase-3B/4B v2 CSV (same as nk_phase3c_decision_gate_public.py)
+
+Outputs
+-------
+--out-csv  : curve table (csv / .parquet / .feather by suffix), one row per breakpoint
+             (group_by, group, theta_off, theta_on_max, decisions, n_segments):
+             `decisions` segments decide for any theta_on in (next theta_on_max, theta_on_max]
+             of the same group (and 0 above the first breakpoint)
+--out-json : per group and theta_off: decisions at --theta-on and the theta_on interval
+             over which that count holds (margin)
+--check    : also run the gate at --theta-on / --theta-off and compare its per-class and
+             per-meal decision counts with the curves (exit 1 on any mismatch)
+
+Example
+-------
+py nk_phase3c_threshold_curves.py ^
+  --in-csv  "C:\NK\NK-CORPUS\scores\phase3\4B\phase3_4b_abl_vs_dat_v2.csv" ^
+  --out-csv "C:\NK\NK-CORPUS\scores\phase3\4C\phase3c_threshold_curves.csv" ^
+  --theta-off-grid "0.2:1.0:0.1"
+
+Notes
+-----
+- theta_on <= theta_off is not a hysteresis band (D_final = [Pi_last >= theta_on]); curve
+  rows are only emitted for theta_on > theta_off.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Phase-1" / "scripts"))
+from nk_ops_signature import SignatureIndex  # noqa: E402
+from nk_ops_table_io import write_table  # noqa: E402
+from nk_ops_utils import write_json  # noqa: E402
+
+from nk_phase3c_decision_gate_public import (  # noqa: E402
+    add_param_args,
+    evaluate_gate,
+    inputs_from_rows,
+    params_from_args,
+    params_string,
+    read_csv_any_delim,
+    run_dynamics,
+)
+
+NK_PHASE3_CURVES_VERSION = "0.1.0"
+
+
+def pi_trajectories(inp, p, steps: int, dedup: bool = True) -> Tuple[np.ndarray, SignatureIndex]:
+    """(steps, U) Pi per distinct signature + the index mapping segments to signatures."""
+    sA, gT = inp.gates()
+    cols = [inp.A0, inp.T0, inp.cond, sA, gT]
+    index = SignatureIndex.build(cols) if dedup else SignatureIndex.identity(len(inp), cols)
+    A0u, T0u, condu, sAu, gTu = index.unique_columns()
+    res = run_dynamics(A0u, T0u, condu, sAu, gTu, p, steps, trace_of=np.arange(index.n_unique))
+    return res["trace_Pi"], index
+
+
+def critical_on(Pi: np.ndarray, theta_off: float) -> np.ndarray:
+    """(U,) c such that D_final = 1 <=> theta_on <= c (for theta_on > theta_off)."""
+    steps, U = Pi.shape
+    if steps == 0:
+        return np.full(U, -np.inf)
+    low = Pi <= theta_off
+    # last step with Pi <= theta_off (-1 if none)
+    last = np.where(low.any(axis=0), steps - 1 - np.argmax(low[::-1], axis=0), -1)
+    after = (np.arange(steps)[:, None] > last[None, :]) & ~np.isnan(Pi)
+    return np.where(after, Pi, -np.inf).max(axis=0)
+
+
+def count_at(c_sorted: np.ndarray, theta_on: float) -> int:
+    """#{c >= theta_on} on an ascending array."""
+    return int(len(c_sorted) - np.searchsorted(c_sorted, theta_on, side="left"))
+
+
+def curve(c_sorted: np.ndarray, theta_off: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Breakpoints (descending theta_on_max) and decisions for theta_on in (next, this]."""
+    v = c_sorted[c_sorted > theta_off]
+    if not len(v):
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    uniq, mult = np.unique(v, return_counts=True)
+    return uniq[::-1], np.cumsum(mult[::-1]).astype(np.int64)
+
+
+def margin(c_sorted: np.ndarray, theta_on: float, theta_off: float) -> Dict[str, Any]:
+    """Decisions at theta_on and the theta_on interval (lo, hi] with the same count."""
+    n_dec = count_at(c_sorted, theta_on)
+    i = int(np.searchsorted(c_sorted, theta_on, side="left"))
+    hi = float(c_sorted[i]) if i < len(c_sorted) else None          # count drops above this
+    lo = float(c_sorted[i - 1]) if i > 0 and np.isfinite(c_sorted[i - 1]) else None
+    if lo is None or lo < theta_off:
+        lo = theta_off
+    return {"decisions": n_dec, "theta_on_lo_exclusive": lo, "theta_on_hi_inclusive": hi}
+
+
+def check_against_gate(inp, p, steps: int, c_seg: np.ndarray, groups) -> List[str]:
+    """Mismatches between #{c >= theta_on} and D_final of a real gate run, per group."""
+    out_cols, _, _ = evaluate_gate(inp, p, steps, params_string(p))
+    D = np.asarray(out_cols["D_final"], dtype=np.int64)
+    bad = []
+    for by, g, sel in groups:
+        want = int(D[sel].sum())
+        got = count_at(np.sort(c_seg[sel]), p.theta_on)
+        if got != want:
+            bad.append(f"{by}={g}: curves={got} gate={want}")
+    return bad
+
+
+def parse_grid(spec: str, default: float) -> List[float]:
+    if not spec:
+        return [default]
+    if ":" in spec:
+        a, b, st = (float(x) for x in spec.split(":"))
+        n = int(np.floor((b - a) / st + 1e-9)) + 1
+        return [round(a + i * st, 10) for i in range(n)]
+    return [float(x) for x in spec.split(",") if x.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Exact decision-count curves over theta_on (per theta_off).")
+    ap.add_argument("--in-csv", required=True, help="Phase-3B/4B v2 CSV (with ABL_score/DAT_score/class/sart_flag)")
+    ap.add_argument("--out-csv", required=True, help="Output curve table")
+    ap.add_argument("--out-json", default="", help="Optional margin summary JSON")
+    ap.add_argument("--theta-off-grid", default="", help='theta_off values: "a:b:step" or "0.4,0.6" (default: --theta-off)')
+    ap.add_argument("--no-meal", action="store_true", help="Curves per class only (skip per-meal curves)")
+    ap.add_argument("--check", action="store_true",
+                    help="Compare counts at --theta-on/--theta-off with a full gate run (exit 1 on mismatch)")
+    add_param_args(ap)
+    args = ap.parse_args()
+
+    p = params_from_args(args)
+    in_path = Path(args.in_csv)
+    if not in_path.exists():
+        raise SystemExit(f"[ERR] input not found: {in_path}")
+    fields, rows = read_csv_any_delim(in_path)
+    inp = inputs_from_rows(rows, fields)
+    del rows
+
+    Pi, index = pi_trajectories(inp, p, args.steps, dedup=not args.no_dedup)
+    print(f"[INFO] segments={len(inp)} {index.describe()} steps={args.steps}")
+
+    groups: List[Tuple[str, str, np.ndarray]] = [("all", "all", np.arange(len(inp)))]
+    for by, labels in (("class", inp.cls), ("meal", inp.meal)):
+        if by == "meal" and args.no_meal:
+            continue
+        lab = np.asarray(labels, dtype=object)
+        for g in sorted(set(labels)):
+            groups.append((by, g, np.flatnonzero(lab == g)))
+
+    offs = parse_grid(args.theta_off_grid, p.theta_off)
+    table: Dict[str, List[Any]] = {k: [] for k in ("group_by", "group", "theta_off", "theta_on_max", "decisions", "n_segments")}
+    summary: Dict[str, Any] = {}
+    for off in offs:
+        c_seg = index.broadcast(critical_on(Pi, off))
+        key = f"{off:g}"
+        summary[key] = {}
+        for by, g, sel in groups:
+            cs = np.sort(c_seg[sel])
+            th, dec = curve(cs, off)
+            n = len(th)
+            table["group_by"] += [by] * n
+            table["group"] += [g] * n
+            table["theta_off"] += [off] * n
+            table["theta_on_max"] += th.tolist()
+            table["decisions"] += dec.tolist()
+            table["n_segments"] += [len(sel)] * n
+            if p.theta_on > off:
+                m = margin(cs, p.theta_on, off)
+                m["n_segments"] = int(len(sel))
+                summary[key].setdefault(by, {})[g] = m
+
+    out_path = Path(args.out_csv)
+    cols = [
+        ("group_by", table["group_by"]), ("group", table["group"]),
+        ("theta_off", np.asarray(table["theta_off"], dtype=np.float64)),
+        ("theta_on_max", np.asarray(table["theta_on_max"], dtype=np.float64)),
+        ("decisions", np.asarray(table["decisions"], dtype=np.int64)),
+        ("n_segments", np.asarray(table["n_segments"], dtype=np.int64)),
+    ]
+    # thresholds as repr: breakpoints are exact Pi values
+    n_out = write_table(out_path, cols, decimals=None)
+    print(f"[OK] wrote {n_out} curve rows ({len(offs)} theta_off x {len(groups)} groups) -> {out_path}")
+
+    if p.theta_on > p.theta_off and f"{p.theta_off:g}" in summary:
+        for g, m in sorted(summary[f"{p.theta_off:g}"].get("class", {}).items()):
+            print(f"  {g:24s} decisions={m['decisions']:6d} / {m['n_segments']:6d}  "
+                  f"theta_on in ({m['theta_on_lo_exclusive']:.6g}, {m['theta_on_hi_inclusive']}]")
+    if args.out_json:
+        write_json(Path(args.out_json), {
+            "source_file": str(in_path),
+            "params": params_string(p),
+            "steps": args.steps,
+            "theta_off_grid": offs,
+            "margins": summary,
+            "nk_phase3_curves_version": NK_PHASE3_CURVES_VERSION,
+        })
+        print(f"[OK] wrote margins -> {args.out_json}")
+
+    if args.check:
+        if p.theta_on <= p.theta_off:
+            raise SystemExit("[ERR] --check needs theta_on > theta_off")
+        bad = check_against_gate(inp, p, args.steps, index.broadcast(critical_on(Pi, p.theta_off)), groups)
+        if bad:
+            for b in bad:
+                print(f"[ERR] {b}")
+            raise SystemExit(1)
+        print(f"[OK] check: counts match the gate for {len(groups)} groups")
+
+
+if __name__ == "__main__":
+    main()